@@ -0,0 +1,382 @@
+# api.py
+"""
+API HTTP Local de Consulta (Query API).
+
+Servicio HTTP pequeño (librería estándar, sin dependencias nuevas) para que
+otras herramientas internas consulten las facturas priorizadas sin pasar por
+la interfaz de Streamlit.
+
+El conjunto de datos se carga UNA vez al arrancar (lectura paralela + caché de
+ingesta + reglas + estado de fila) y queda en memoria, compartido por todos los
+hilos del servidor y tratado como de sólo lectura: cada petición sólo calcula
+máscaras sobre él.
+
+Endpoints (cuerpo y respuesta JSON salvo que se pida Arrow):
+- GET  /health              Estado, nº de filas y columnas.
+- GET  /columns             Columnas y su tipo en el esquema.
+- POST /filter              {"filters": [...], "columns": [...], "offset": 0, "limit": 1000, "format": "json"|"arrow"}
+                            Los filtros usan la semántica de aplicar_filtros_dinamicos
+                            ({"columna", "valor", "operator"}).
+- POST /groupby             {"column": "Vendor Name", "filters": [...]}  (agregados de la vista agrupada)
+- POST /rules/evaluate      {"rules": [...] (opcional), "filters": [...], "as_of": "AAAA-MM-DD" (opcional),
+                            "offset", "limit", "format"}
+                            Evalúa reglas (las indicadas o las cargadas al arrancar) y
+                            devuelve Priority / Priority_Reason de cada fila y el conteo por motivo.
+                            Sin "as_of" se usa la fecha de referencia de la carga (--as-of),
+                            la misma con la que se priorizaron los datos al arrancar.
+
+Las respuestas paginadas se envían en formato columnar ({"data": {columna: [valores]}})
+o como stream Arrow IPC (format=arrow o cabecera Accept: application/vnd.apache.arrow.stream),
+con Transfer-Encoding: chunked para no serializar resultados grandes de una vez.
+
+Uso:
+    python api.py "datos/*.xlsx" --rules config.json --port 8502 --as-of 2025-06-30
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cli import collect_input_files, load_rules_file, read_clean_workbook, prioritize_frame
+from modules.loader import MAX_INGEST_WORKERS
+from modules.schema import concat_frames, get_column_kind
+from modules.filters import construir_mascara_filtros, resumen_agrupado
+from modules.rules_service import apply_priority_rules, rule_condition_groups, resolve_as_of
+from modules.merge_service import DEFAULT_MERGE_KEYS, MERGE_POLICY_KEEP_LATEST
+
+DEFAULT_PAGE_ROWS = 1000
+# Valores por trozo en la respuesta JSON columnar / filas por lote Arrow
+STREAM_CHUNK_VALUES = 50000
+ARROW_MIME = "application/vnd.apache.arrow.stream"
+
+
+# --- 1. CACHÉ DEL CONJUNTO DE DATOS ---
+
+class DatasetCache:
+    """Conjunto de datos priorizado compartido (sólo lectura) por todas las peticiones."""
+
+    def __init__(self):
+        self.df = None
+        self.rules = []
+        self.lang = "es"
+        # Fecha de referencia (ISO) de las reglas de fecha relativas usada al cargar
+        self.as_of = None
+        self.sources = []
+        self.loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self, paths: list, rules: list, lang: str = "es", merge_keys: list = None,
+             policy: str = MERGE_POLICY_KEEP_LATEST, workers: int = MAX_INGEST_WORKERS,
+             use_cache: bool = True, as_of: str = None):
+        """
+        Lee (en paralelo), limpia y prioriza los libros indicados.
+
+        'as_of' (por defecto, hoy) se fija aquí y se conserva: las
+        evaluaciones posteriores sin fecha usan la misma que la carga.
+        """
+        as_of = resolve_as_of(as_of).date().isoformat()
+        if workers > 1 and len(paths) > 1:
+            ctx = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=ctx) as pool:
+                frames = list(pool.map(read_clean_workbook, paths, [False] * len(paths), [use_cache] * len(paths)))
+        else:
+            frames = [read_clean_workbook(p, False, use_cache) for p in paths]
+
+        df, _ = prioritize_frame(concat_frames(frames), rules, lang, merge_keys, policy, as_of)
+        with self._lock:
+            self.df = df
+            self.rules = rules
+            self.lang = lang
+            self.as_of = as_of
+            self.sources = list(paths)
+            self.loaded_at = time.strftime("%Y-%m-%d %H:%M:%S")
+
+
+DATASET = DatasetCache()
+
+
+# --- 2. SERIALIZACIÓN ---
+
+def _page_slice(offset: int, limit: int) -> slice:
+    """Posiciones [offset, offset + limit) de una página (limit < 0 = hasta el final)."""
+    offset = max(0, int(offset or 0))
+    if limit is None:
+        limit = DEFAULT_PAGE_ROWS
+    limit = int(limit)
+    return slice(offset, None) if limit < 0 else slice(offset, offset + limit)
+
+
+
+def _json_values(series: pd.Series) -> list:
+    """Valores de una columna listos para json.dumps (fechas ISO, nulos como null)."""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        text = series.dt.strftime("%Y-%m-%dT%H:%M:%S")
+        return text.astype(object).where(series.notna(), None).tolist()
+    values = series.astype(object).where(series.notna(), None).tolist()
+    return [None if isinstance(v, float) and math.isnan(v) else v for v in values]
+
+
+def _iter_columnar_json(df: pd.DataFrame, meta: dict):
+    """Genera el cuerpo JSON columnar por trozos (una columna en varios trozos si es grande)."""
+    head = dict(meta)
+    head["columns"] = list(df.columns)
+    yield (json.dumps(head, default=str)[:-1] + ', "data": {').encode("utf-8")
+    for i, col in enumerate(df.columns):
+        yield ((", " if i else "") + json.dumps(str(col)) + ": [").encode("utf-8")
+        series = df[col]
+        for start in range(0, len(series), STREAM_CHUNK_VALUES):
+            part = json.dumps(_json_values(series.iloc[start:start + STREAM_CHUNK_VALUES]), default=str)[1:-1]
+            if part:
+                yield ((", " if start else "") + part).encode("utf-8")
+        yield b"]"
+    yield b"}}"
+
+
+class _ChunkedWriter:
+    """Objeto tipo archivo que envía cada escritura como un trozo HTTP (chunked)."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        self.closed = True
+
+
+# --- 3. LÓGICA DE LOS ENDPOINTS ---
+
+def query_filter(df: pd.DataFrame, body: dict) -> tuple:
+    """
+    Filtra y pagina. Devuelve (página, metadatos).
+
+    Sólo se copian las filas de la página (posiciones de la máscara), nunca
+    el resultado filtrado completo.
+    """
+    mask = construir_mascara_filtros(df, body.get("filters") or [])
+    positions = np.flatnonzero(np.asarray(mask))
+    columns = [c for c in (body.get("columns") or df.columns) if c in df.columns]
+    page = df.iloc[positions[_page_slice(body.get("offset"), body.get("limit"))]][columns]
+    return page, {"total": len(positions), "offset": int(body.get("offset") or 0), "rows": len(page)}
+
+
+def query_groupby(df: pd.DataFrame, body: dict) -> pd.DataFrame:
+    """Agregados por grupo sobre las filas filtradas."""
+    column = body.get("column")
+    if column not in df.columns:
+        raise ValueError(f"Columna de agrupación desconocida: {column}")
+    mask = construir_mascara_filtros(df, body.get("filters") or [])
+    return resumen_agrupado(df[mask], column).reset_index()
+
+
+def query_rules(df: pd.DataFrame, body: dict, default_rules: list, default_as_of: str = None) -> tuple:
+    """
+    Evalúa reglas sobre las filas filtradas.
+
+    Sólo se copian las columnas que usan las condiciones (más 'Priority'),
+    nunca el conjunto completo; la salida sólo se construye para las filas
+    de la página.
+    """
+    rules = body.get("rules")
+    if rules is None:
+        rules = default_rules
+    if not isinstance(rules, list):
+        raise ValueError("'rules' debe ser una lista de reglas.")
+
+    mask = construir_mascara_filtros(df, body.get("filters") or [])
+    positions = np.flatnonzero(np.asarray(mask))
+    used = {c.get("column") for r in rules for g in rule_condition_groups(r) for c in g}
+    cols = ["Priority"] + [c for c in df.columns if c in used and c != "Priority"]
+    df_eval = df.iloc[positions, df.columns.get_indexer(cols)].copy()
+    # Partir de la prioridad de entrada: sólo se conservan los ingresos manuales,
+    # no el resultado de las reglas aplicadas al cargar.
+    if "Priority_Reason" in df.columns:
+        manual = df["Priority_Reason"].iloc[positions] == "Ingreso Manual"
+        df_eval["Priority"] = df_eval["Priority"].where(manual.to_numpy(), "")
+    # Fecha de referencia de las reglas de fecha relativas (por defecto, la de la carga)
+    df_eval = apply_priority_rules(df_eval, rules, as_of=body.get("as_of", default_as_of))
+
+    summary = df_eval["Priority_Reason"].value_counts().to_dict() if "Priority_Reason" in df_eval else {}
+    out_cols = [c for c in ["Invoice #"] if c in df.columns]
+    page_slice = _page_slice(body.get("offset"), body.get("limit"))
+    page = df.iloc[positions[page_slice]][out_cols].copy()
+    for col in ["Priority", "Priority_Reason"]:
+        page[col] = df_eval[col].iloc[page_slice].to_numpy()
+    return page, {"total": len(df_eval), "offset": int(body.get("offset") or 0), "rows": len(page), "summary": summary}
+
+
+# --- 4. SERVIDOR HTTP ---
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """Manejador de peticiones de la API (un hilo por petición)."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "FacturasAPI/1.0"
+
+    def log_message(self, format, *args):
+        print(f"[api] {self.address_string()} {format % args}")
+
+    # --- Respuestas ---
+    def _send_json(self, payload, status: int = 200):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str):
+        self._send_json({"error": message}, status)
+
+    def _start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_frame(self, df: pd.DataFrame, meta: dict, body: dict):
+        """Envía un resultado tabular como JSON columnar o Arrow IPC, por trozos."""
+        wants_arrow = body.get("format") == "arrow" or ARROW_MIME in (self.headers.get("Accept") or "")
+        if wants_arrow:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            self._start_chunked(ARROW_MIME)
+            writer = _ChunkedWriter(self.wfile)
+            with pa.ipc.new_stream(writer, table.schema) as stream:
+                for batch in table.to_batches(max_chunksize=STREAM_CHUNK_VALUES):
+                    stream.write_batch(batch)
+            self._end_chunked()
+            return
+        self._start_chunked("application/json; charset=utf-8")
+        writer = _ChunkedWriter(self.wfile)
+        for piece in _iter_columnar_json(df, meta):
+            writer.write(piece)
+        self._end_chunked()
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        data = json.loads(self.rfile.read(length).decode("utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError("El cuerpo debe ser un objeto JSON.")
+        return data
+
+    # --- Rutas ---
+    def do_GET(self):
+        path = urlparse(self.path).path.rstrip("/")
+        df = DATASET.df
+        if path == "/health":
+            self._send_json({
+                "status": "ok" if df is not None else "empty",
+                "rows": 0 if df is None else len(df),
+                "columns": 0 if df is None else len(df.columns),
+                "sources": len(DATASET.sources),
+                "loaded_at": DATASET.loaded_at,
+                "as_of": DATASET.as_of,
+            })
+        elif path == "/columns":
+            if df is None:
+                return self._send_error(503, "No hay datos cargados.")
+            self._send_json({"columns": [{"name": c, "kind": get_column_kind(c)} for c in df.columns]})
+        else:
+            self._send_error(404, f"Ruta desconocida: {path}")
+
+    def do_POST(self):
+        path = urlparse(self.path).path.rstrip("/")
+        df = DATASET.df
+        if df is None:
+            return self._send_error(503, "No hay datos cargados.")
+        try:
+            body = self._read_body()
+            if path == "/filter":
+                page, meta = query_filter(df, body)
+                self._send_frame(page, meta, body)
+            elif path == "/groupby":
+                res = query_groupby(df, body)
+                self._send_frame(res, {"total": len(res), "offset": 0, "rows": len(res)}, body)
+            elif path == "/rules/evaluate":
+                page, meta = query_rules(df, body, DATASET.rules, DATASET.as_of)
+                self._send_frame(page, meta, body)
+            else:
+                self._send_error(404, f"Ruta desconocida: {path}")
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_error(400, str(e))
+        except Exception as e:
+            print(f"Error en {path}: {e}")
+            self._send_error(500, str(e))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="API HTTP local de consulta de facturas priorizadas.")
+    parser.add_argument("inputs", nargs="+", help="Directorios o patrones glob de archivos .xlsx.")
+    parser.add_argument("-r", "--rules", help="JSON de reglas (lista o configuración exportada por la app).")
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz de escucha (por defecto sólo local).")
+    parser.add_argument("-p", "--port", type=int, default=8502, help="Puerto (por defecto 8502).")
+    parser.add_argument("-w", "--workers", type=int, default=MAX_INGEST_WORKERS, help="Procesos para la carga inicial.")
+    parser.add_argument("--lang", choices=["es", "en"], default="es", help="Idioma de la columna 'Row Status'.")
+    parser.add_argument("--merge-keys", nargs="*", default=list(DEFAULT_MERGE_KEYS),
+                        help="Columnas clave para eliminar facturas repetidas (sin valores: no deduplicar).")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de ingesta en disco.")
+    parser.add_argument("--as-of", help="Fecha de referencia (AAAA-MM-DD) de las reglas de fecha relativas. Por defecto: hoy (al arrancar).")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    paths = collect_input_files(args.inputs)
+    if not paths:
+        print("No se encontraron archivos .xlsx.", file=sys.stderr)
+        return 1
+    try:
+        rules = load_rules_file(args.rules)
+    except Exception as e:
+        print(f"Error cargando reglas: {e}", file=sys.stderr)
+        return 1
+    try:
+        as_of = resolve_as_of(args.as_of).date().isoformat()
+    except ValueError as e:
+        print(f"Error en --as-of: {e}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    DATASET.load(paths, rules, args.lang, args.merge_keys, workers=args.workers, use_cache=not args.no_cache,
+                 as_of=as_of)
+    print(f"{len(DATASET.df)} filas cargadas desde {len(paths)} archivo(s) en {time.perf_counter() - start:.1f}s.")
+
+    server = ThreadingHTTPServer((args.host, args.port), QueryHandler)
+    print(f"API escuchando en http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
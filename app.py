@@ -5,7 +5,7 @@ import streamlit as st
 import pandas as pd
 from modules.utils import initialize_session_state, load_custom_css, load_and_process_files, clear_state_and_prepare_reload
 from modules.gui_sidebar import render_sidebar
-from modules.gui_views import render_active_filters, render_kpi_dashboard, render_detailed_view, render_grouped_view
+from modules.gui_views import render_active_filters, render_kpi_dashboard, render_detailed_view, render_grouped_view, render_streaming_status
 from modules.gui_rules_editor import render_rules_editor
 from modules.gui_chatbot import render_chatbot # NUEVO
 from modules.filters import aplicar_filtros_dinamicos
@@ -67,6 +67,10 @@ if uploaded and st.session_state.df_staging is None:
     load_and_process_files(uploaded, lang)
     st.rerun()
 
+# Carga en streaming en curso: avance y cierre automático al terminar
+if st.session_state.get('streaming_load'):
+    render_streaming_status(lang)
+
 # Lógica Principal
 if st.session_state.df_staging is not None:
     try:
@@ -0,0 +1,226 @@
+# benchmarks/run_benchmarks.py
+"""
+Micro-benchmarks del Motor de Reglas y de Filtros.
+
+Mide apply_priority_rules (3 / 50 / 500 reglas, mixtas y "una por
+proveedor"), _evaluate_condition (un
+operador de cada tipo) y aplicar_filtros_dinamicos sobre datos sintéticos de
+10k / 100k / 1M filas (ver synthetic.py). Para cada caso registra el mejor
+tiempo de varias repeticiones, el rendimiento (filas/s), el pico de memoria
+(tracemalloc, en una ejecución aparte para no distorsionar el tiempo) y una
+huella del resultado.
+
+Los resultados se comparan con las referencias guardadas (baselines.json):
+- Huella distinta: el resultado del motor ha cambiado (error).
+- Tiempo por encima de la referencia más la tolerancia (y más de
+  --min-delta segundos, para no marcar el ruido de los casos muy rápidos):
+  regresión.
+
+Uso:
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --rows 10000 100000 --rules 3 50
+    python -m benchmarks.run_benchmarks --save-baseline
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from pandas.util import hash_pandas_object
+
+from modules.rules_service import apply_priority_rules
+from modules.rules_engine import _evaluate_condition
+from modules.filters import aplicar_filtros_dinamicos
+from benchmarks.synthetic import generate_invoices, generate_rules, generate_vendor_rules, generate_filters, vendor_names
+
+DEFAULT_ROWS = [10_000, 100_000, 1_000_000]
+DEFAULT_RULES = [3, 50, 500]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Una condición por tipo de evaluación (regex, igualdad, prefijo, lista, numérica, rango)
+CONDITION_CASES = {
+    "contains": {"column": "Pay Group", "operator": "contains", "value": r"PAY\s*GROUP [1-7](?!\d)"},
+    "is": {"column": "Vendor Name", "operator": "is", "value": "Vendor 00001 LLC"},
+    "starts_with": {"column": "Description", "operator": "starts_with", "value": "Servicio 1"},
+    "in": {"column": "Vendor Name", "operator": "in", "value": vendor_names(200)[::2]},
+    "numeric": {"column": "Total", "operator": ">", "value": 10000},
+    "between": {"column": "Total", "operator": "between", "value": [1000, 10000]},
+}
+
+
+def _fingerprint(obj) -> str:
+    """Huella estable de un resultado (DataFrame o Serie)."""
+    return format(int(hash_pandas_object(obj, index=False).sum()), "x")
+
+
+def _measure(fn, repeat: int, memory: bool) -> tuple:
+    """
+    Ejecuta fn() 'repeat' veces.
+
+    Returns:
+        tuple: (mejor tiempo en s, pico de memoria en MB o None, último resultado).
+    """
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        fn()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return best, peak_mb, result
+
+
+def run_suite(rows_list: list, rules_list: list, repeat: int = 3, seed: int = 0, memory: bool = True) -> list:
+    """
+    Ejecuta todos los casos.
+
+    Returns:
+        list: Un dict por caso {'benchmark', 'rows', 'rules', 'seconds',
+              'rows_per_s', 'peak_mb', 'fingerprint'}.
+    """
+    results = []
+
+    def _record(benchmark, n_rows, n_rules, seconds, peak_mb, fingerprint):
+        entry = {
+            "benchmark": benchmark, "rows": n_rows, "rules": n_rules,
+            "seconds": round(seconds, 5),
+            "rows_per_s": round(n_rows / seconds) if seconds > 0 else None,
+            "peak_mb": round(peak_mb, 1) if peak_mb is not None else None,
+            "fingerprint": fingerprint,
+        }
+        results.append(entry)
+        print(_format_row(entry), flush=True)
+
+    for n_rows in rows_list:
+        df = generate_invoices(n_rows, seed)
+        manual = df["Priority"].copy()
+
+        for n_rules in rules_list:
+            for benchmark, rules in (
+                ("apply_priority_rules", generate_rules(n_rules, n_rows, seed)),
+                ("apply_priority_rules[vendor]", generate_vendor_rules(n_rules, n_rows, seed)),
+            ):
+                def _apply():
+                    # Se restaura la prioridad de entrada (el motor la reescribe)
+                    df["Priority"] = manual
+                    return apply_priority_rules(df, rules)
+
+                seconds, peak_mb, out = _measure(_apply, repeat, memory)
+                _record(benchmark, n_rows, n_rules, seconds, peak_mb,
+                        _fingerprint(out[["Priority", "Priority_Reason"]]))
+
+        for name, condition in CONDITION_CASES.items():
+            seconds, peak_mb, mask = _measure(lambda: _evaluate_condition(df, condition), repeat, memory)
+            _record(f"_evaluate_condition[{name}]", n_rows, 1, seconds, peak_mb, str(int(mask.sum())))
+
+        filters = generate_filters()
+        seconds, peak_mb, out = _measure(lambda: aplicar_filtros_dinamicos(df, filters), repeat, memory)
+        _record("aplicar_filtros_dinamicos", n_rows, len(filters), seconds, peak_mb,
+                f"{len(out)}:{_fingerprint(out['Invoice #'])}")
+
+        del df, manual
+    return results
+
+
+def _case_key(entry: dict) -> str:
+    return f"{entry['benchmark']}|{entry['rows']}|{entry['rules']}"
+
+
+def _format_row(entry: dict) -> str:
+    mem = f"{entry['peak_mb']:>9.1f}" if entry.get("peak_mb") is not None else f"{'-':>9}"
+    rate = f"{entry['rows_per_s']:>14,}" if entry.get("rows_per_s") else f"{'-':>14}"
+    return f"{entry['benchmark']:<36}{entry['rows']:>10,}{entry['rules']:>7}{entry['seconds']:>11.4f}{rate}{mem}"
+
+
+def compare_with_baseline(results: list, baseline: dict, tolerance: float, min_delta: float = 0.05) -> tuple:
+    """
+    Compara con la referencia.
+
+    Returns:
+        tuple: (líneas de informe, número de huellas distintas, número de regresiones).
+    """
+    stored = baseline.get("results", {})
+    lines, mismatches, regressions = [], 0, 0
+    for entry in results:
+        ref = stored.get(_case_key(entry))
+        if ref is None:
+            lines.append(f"  NUEVO      {_case_key(entry)}")
+            continue
+        ratio = entry["seconds"] / ref["seconds"] if ref["seconds"] else 1.0
+        if ref.get("fingerprint") != entry["fingerprint"]:
+            mismatches += 1
+            lines.append(f"  RESULTADO  {_case_key(entry)}: huella {entry['fingerprint']} != {ref.get('fingerprint')}")
+        elif ratio > 1 + tolerance and entry["seconds"] - ref["seconds"] > min_delta:
+            regressions += 1
+            lines.append(f"  REGRESIÓN  {_case_key(entry)}: {entry['seconds']:.4f}s vs {ref['seconds']:.4f}s (x{ratio:.2f})")
+        else:
+            lines.append(f"  OK         {_case_key(entry)}: x{ratio:.2f}")
+    return lines, mismatches, regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmarks del motor de reglas y filtros sobre facturas sintéticas.")
+    parser.add_argument("--rows", type=int, nargs="+", default=DEFAULT_ROWS, help="Tamaños de datos (filas).")
+    parser.add_argument("--rules", type=int, nargs="+", default=DEFAULT_RULES, help="Tamaños de los conjuntos de reglas.")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por caso (se guarda el mejor tiempo).")
+    parser.add_argument("--seed", type=int, default=0, help="Semilla del generador.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Archivo de referencias.")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como nuevas referencias.")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="Margen de tiempo aceptado sobre la referencia (0.5 = +50%%).")
+    parser.add_argument("--min-delta", type=float, default=0.05, help="Diferencia mínima en segundos para considerar regresión.")
+    parser.add_argument("--no-memory", action="store_true", help="No medir el pico de memoria.")
+    parser.add_argument("--output", help="Guardar también los resultados en este archivo JSON.")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    print(f"{'benchmark':<36}{'filas':>10}{'reglas':>7}{'segundos':>11}{'filas/s':>14}{'pico MB':>9}")
+    results = run_suite(args.rows, args.rules, args.repeat, args.seed, memory=not args.no_memory)
+
+    meta = {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+
+    if args.save_baseline:
+        baseline = {"meta": meta, "results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline["results"] = json.load(f).get("results", {})
+        baseline["results"].update({_case_key(e): e for e in results})
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False)
+        print(f"Referencias guardadas en {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("Sin referencias: ejecuta con --save-baseline para crearlas.")
+        return 0
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    lines, mismatches, regressions = compare_with_baseline(results, baseline, args.tolerance, args.min_delta)
+    print("\nComparación con referencias:")
+    print("\n".join(lines))
+    print(f"{mismatches} resultado(s) distinto(s), {regressions} regresión(es).")
+    return 1 if mismatches or regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+# benchmarks/synthetic.py
+"""
+Generador Sintético de Facturas (Benchmarks).
+
+Genera DataFrames de facturas con semilla fija que siguen el esquema real de
+columnas (COLUMN_TRANSLATIONS / schema.py) y distribuciones parecidas a las
+exportaciones reales:
+
+- 'Pay Group': patrones que usan las reglas del sistema ('PAY GROUP 3',
+  'PAYGROUP 7', 'PAY GROUP 10', 'DIST-B', 'INTERCOMPANY X', 'RENTS'...).
+- 'Vendor Name': cardinalidad creciente con el volumen y reparto tipo Zipf
+  (pocos proveedores concentran muchas facturas).
+- 'Total': distribución log-normal (muchas facturas pequeñas, cola larga).
+- Fechas coherentes entre sí y antigüedades calculadas a una fecha de corte.
+
+También genera conjuntos de reglas y de filtros de tamaño configurable.
+"""
+
+import numpy as np
+import pandas as pd
+
+from modules.translator import COLUMN_TRANSLATIONS
+from modules.schema import get_column_kind, enforce_schema, KIND_NUMERIC, KIND_DATE, KIND_CATEGORY
+from modules.rules_service import get_default_rules
+
+# Fecha de corte de las antigüedades (fija para que los datos sean reproducibles)
+AS_OF = pd.Timestamp("2025-06-30")
+
+PAY_GROUPS = (
+    [f"PAY GROUP {i}" for i in range(1, 13)]
+    + [f"PAYGROUP {i}" for i in range(1, 10)]
+    + [f"DIST-{c}" for c in "ABCDEF"]
+    + ["INTERCOMPANY X", "INTERCOMPANY Y", "PAYROLL", "RENTS", "SCF 1", "SCF 2"]
+    + [f"GROUP{c}{d}" for c in "lmnop" for d in "ABC"]
+)
+STATUSES = ["Pending", "Routed", "Fully Paid", "On Hold", "Terminated"]
+STATUS_WEIGHTS = [0.35, 0.3, 0.2, 0.1, 0.05]
+MANUAL_PRIORITIES = ["Alta", "Media", "Minima", "High", "Low"]
+VENDOR_SUFFIXES = ["Inc", "LLC", "Ltd", "S.A.", "GmbH", "Group", "Corp"]
+
+
+def vendor_cardinality(n_rows: int) -> int:
+    """Número de proveedores distintos para un volumen dado."""
+    return int(np.clip(n_rows // 40, 200, 25000))
+
+
+def vendor_names(n_vendors: int) -> list:
+    """Nombres de proveedor deterministas ('Vendor 00042 LLC')."""
+    return [f"Vendor {i:05d} {VENDOR_SUFFIXES[i % len(VENDOR_SUFFIXES)]}" for i in range(n_vendors)]
+
+
+def _zipf_choice(rng: np.random.Generator, values: list, n: int, exponent: float = 1.1) -> np.ndarray:
+    weights = 1.0 / np.arange(1, len(values) + 1) ** exponent
+    return rng.choice(np.asarray(values, dtype=object), size=n, p=weights / weights.sum())
+
+
+def _category_pool(column: str, size: int) -> list:
+    prefix = "".join(ch for ch in column.upper() if ch.isalpha())[:4]
+    return [f"{prefix}{i:03d}" for i in range(size)]
+
+
+def generate_invoices(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Genera n_rows facturas con todas las columnas conocidas, ya tipadas como
+    las deja la carga de la aplicación (categorías y datetime64).
+
+    Args:
+        n_rows (int): Número de filas.
+        seed (int): Semilla (mismos parámetros = mismos datos).
+
+    Returns:
+        pd.DataFrame: Facturas sintéticas (sin 'Priority_Reason' ni 'Row Status').
+    """
+    rng = np.random.default_rng(seed)
+    n = n_rows
+    invoice_date = AS_OF - pd.to_timedelta(rng.integers(0, 400, n), unit="D")
+    intake_date = invoice_date + pd.to_timedelta(rng.integers(0, 30, n), unit="D")
+    due_date = pd.Series(invoice_date + pd.to_timedelta(rng.choice([30, 45, 60, 90], n), unit="D"))
+    due_date[rng.random(n) < 0.08] = pd.NaT
+
+    special = {
+        "Invoice #": pd.Series(rng.permutation(n * 2)[:n]).map("INV{:08d}".format),
+        "System Invoice #": pd.Series(rng.integers(0, 10**8, n)).map("SYS{:08d}".format),
+        "PO": pd.Series(rng.integers(0, 10**8, n)).map("PO{:08d}".format),
+        "Description": pd.Series(rng.choice([f"Servicio {i} del periodo" for i in range(500)] + [None] * 50, n)),
+        "Status": rng.choice(STATUSES, n, p=STATUS_WEIGHTS),
+        "Pay Group": _zipf_choice(rng, PAY_GROUPS, n, exponent=0.6),
+        "Vendor Name": _zipf_choice(rng, vendor_names(vendor_cardinality(n)), n),
+        "Total": np.where(rng.random(n) < 0.01, 0.0, rng.lognormal(7.5, 1.4, n).round(2)),
+        "Invoice Date": invoice_date,
+        "Intake Date": intake_date,
+        "Due Date": due_date,
+        "Invoice Date Age": (AS_OF - invoice_date).days.to_numpy(),
+        "Intake Date Age": (AS_OF - intake_date).days.to_numpy(),
+        "Priority": np.where(rng.random(n) < 0.05, rng.choice(MANUAL_PRIORITIES, n), ""),
+    }
+
+    data = {}
+    for column in COLUMN_TRANSLATIONS:
+        if column in special:
+            data[column] = special[column]
+            continue
+        if column in ("Priority_Reason", "Row Status"):
+            continue
+        kind = get_column_kind(column)
+        if kind == KIND_NUMERIC:
+            data[column] = rng.integers(1, 10**9, n)
+        elif kind == KIND_DATE:
+            data[column] = AS_OF - pd.to_timedelta(rng.integers(0, 365, n), unit="D")
+        elif kind == KIND_CATEGORY:
+            data[column] = rng.choice(_category_pool(column, int(rng.integers(5, 200))), n)
+        else:
+            data[column] = pd.Series(rng.integers(0, 10**6, n)).map(f"{column[:3].upper()}{{:06d}}".format)
+
+    df = pd.DataFrame({c: np.asarray(v) if not isinstance(v, pd.Series) else v.to_numpy() for c, v in data.items()})
+    return enforce_schema(df)
+
+
+def generate_rules(n_rules: int, n_rows: int = 100_000, seed: int = 0) -> list:
+    """
+    Conjunto de reglas: las del sistema y, si n_rules es mayor, reglas
+    sintéticas con la mezcla habitual de operadores (regex sobre 'Pay Group',
+    proveedor exacto o por prefijo, rangos de importe y de antigüedad).
+
+    Args:
+        n_rules (int): Número total de reglas.
+        n_rows (int): Volumen de los datos (para elegir proveedores existentes).
+        seed (int): Semilla.
+    """
+    rules = get_default_rules()[:n_rules]
+    rng = np.random.default_rng(seed + 1)
+    vendors = vendor_names(vendor_cardinality(n_rows))
+    priorities = ["🚩 Maxima Prioridad", "Alta", "Media", "Minima"]
+    for i in range(len(rules), n_rules):
+        template = i % 6
+        if template == 0:
+            groups = rng.choice(PAY_GROUPS, int(rng.integers(1, 4)), replace=False)
+            conditions = [{"column": "Pay Group", "operator": "contains", "value": "|".join(groups)}]
+        elif template == 1:
+            conditions = [
+                {"column": "Vendor Name", "operator": "is", "value": str(rng.choice(vendors))},
+                {"column": "Total", "operator": ">", "value": int(rng.integers(100, 20000))},
+            ]
+        elif template == 2:
+            conditions = [{"column": "Vendor Name", "operator": "starts_with", "value": f"Vendor {int(rng.integers(0, 100)):03d}"}]
+        elif template == 3:
+            conditions = [
+                {"column": "Status", "operator": str(rng.choice(["is", "is_not"])), "value": str(rng.choice(STATUSES))},
+                {"column": "Invoice Date Age", "operator": ">=", "value": int(rng.integers(30, 365))},
+            ]
+        elif template == 4:
+            conditions = [
+                {"column": "Total", "operator": "<", "value": int(rng.integers(50, 5000))},
+                {"column": "Pay Group", "operator": "starts_with", "value": str(rng.choice(["PAY", "DIST", "GROUP"]))},
+            ]
+        else:
+            conditions = [{"column": "Description", "operator": "contains", "value": f"Servicio {int(rng.integers(0, 500))} "}]
+        rules.append({
+            "id": f"bench_{i:04d}",
+            "enabled": True,
+            "order": int(rng.integers(1, 100)),
+            "priority": str(rng.choice(priorities)),
+            "reason": f"Bench {i}",
+            "conditions": conditions,
+        })
+    return rules
+
+
+def generate_vendor_rules(n_rules: int, n_rows: int = 100_000, seed: int = 0) -> list:
+    """
+    Conjunto de reglas "una por proveedor" (igualdad exacta sobre 'Vendor Name'),
+    como las que mantienen algunas unidades de negocio.
+
+    Args:
+        n_rules (int): Número de reglas.
+        n_rows (int): Volumen de los datos (para elegir proveedores existentes).
+        seed (int): Semilla.
+    """
+    rng = np.random.default_rng(seed + 2)
+    vendors = vendor_names(vendor_cardinality(n_rows))
+    chosen = rng.choice(vendors, min(n_rules, len(vendors)), replace=False)
+    priorities = ["🚩 Maxima Prioridad", "Alta", "Media", "Minima"]
+    return [{
+        "id": f"vendor_{i:04d}",
+        "enabled": True,
+        "order": int(rng.integers(1, 100)),
+        "priority": str(rng.choice(priorities)),
+        "reason": f"Proveedor {vendor}",
+        "conditions": [{"column": "Vendor Name", "operator": "is", "value": str(vendor)}],
+    } for i, vendor in enumerate(chosen)]
+
+
+def generate_filters() -> list:
+    """Filtros típicos de la barra lateral (OR dentro de columna, AND entre columnas)."""
+    return [
+        {"columna": "Status", "valor": "Pending", "operator": "=="},
+        {"columna": "Status", "valor": "Routed", "operator": "=="},
+        {"columna": "Total", "valor": 5000, "operator": ">"},
+        {"columna": "Vendor Name", "valor": "Vendor 00", "operator": "contains"},
+    ]
@@ -0,0 +1,286 @@
+# cli.py
+"""
+Procesamiento por Lotes sin Interfaz (CLI).
+
+Ejecuta el mismo flujo que la carga de la aplicación (lectura -> limpieza ->
+deduplicación -> motor de reglas -> estado de fila) sobre un directorio o un
+patrón glob de libros Excel, y escribe un archivo priorizado (.xlsx o
+.parquet) por cada libro de entrada. Los archivos se procesan en un pool de
+procesos, de modo que un trabajo nocturno puede repriorizar cientos de
+archivos sin abrir el navegador.
+
+Uso:
+    python cli.py "entrada/*.xlsx" --rules config.json --output salida --format parquet
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from modules.loader import (
+    clean_invoice_frame, list_excel_sheets, read_excel_sheet, MAX_INGEST_WORKERS
+)
+from modules.schema import concat_frames
+from modules.cache_service import content_hash, load_cached_frame, store_cached_frame
+from modules.merge_service import deduplicate_frame, DEFAULT_MERGE_KEYS, MERGE_POLICIES, MERGE_POLICY_KEEP_LATEST
+from modules.rules_service import get_default_rules, apply_priority_rules, resolve_as_of
+from modules.utils import recalculate_row_status
+
+OUTPUT_FORMATS = ["xlsx", "parquet"]
+OUTPUT_SUFFIX = "_priorizado"
+
+
+def collect_input_files(patterns: list) -> list:
+    """
+    Expande directorios y patrones glob a una lista ordenada de libros .xlsx.
+
+    Se omiten los archivos temporales de Excel ('~$...').
+    """
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = glob.glob(os.path.join(pattern, "*.xlsx"))
+        else:
+            matches = glob.glob(pattern)
+        paths.extend(p for p in matches if os.path.isfile(p) and not os.path.basename(p).startswith("~$"))
+    # Sin duplicados y en orden estable
+    return sorted(set(os.path.abspath(p) for p in paths))
+
+
+def load_rules_file(path: str) -> list:
+    """
+    Carga las reglas desde un JSON: una lista de reglas o un archivo de
+    configuración de la aplicación (clave 'priority_rules').
+    Sin ruta se usan las reglas por defecto.
+    """
+    if not path:
+        return get_default_rules()
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = data.get("priority_rules") if isinstance(data, dict) else data
+    if not isinstance(rules, list):
+        raise ValueError(f"El archivo {path} no contiene una lista de reglas.")
+    return rules
+
+
+def read_clean_workbook(path: str, all_sheets: bool, use_cache: bool) -> pd.DataFrame:
+    """Lee y limpia un libro (con la caché de ingesta compartida con la aplicación)."""
+    with open(path, "rb") as f:
+        content = f.read()
+    key = content_hash(content, "all_sheets" if all_sheets else "")
+    if use_cache:
+        cached = load_cached_frame(key)
+        if cached is not None:
+            return cached
+    sheets = list_excel_sheets(content) if all_sheets else [0]
+    df = clean_invoice_frame(concat_frames([read_excel_sheet(content, sheet) for sheet in sheets]))
+    if use_cache:
+        store_cached_frame(key, df)
+    return df
+
+
+def prioritize_frame(df: pd.DataFrame, rules: list, lang: str = "es", merge_keys: list = None,
+                     policy: str = MERGE_POLICY_KEEP_LATEST, as_of: str = None) -> tuple:
+    """
+    Deduplicación, motor de reglas y estado de fila sobre datos ya limpios
+    (los mismos pasos que la carga de la aplicación).
+
+    Returns:
+        tuple: (DataFrame priorizado, número de filas duplicadas eliminadas).
+    """
+    df, n_dup = deduplicate_frame(df, DEFAULT_MERGE_KEYS if merge_keys is None else merge_keys, policy)
+    if n_dup:
+        df = df.reset_index(drop=True)
+
+    df = apply_priority_rules(df, rules, as_of=as_of)
+    df = recalculate_row_status(df, lang)
+    return df, n_dup
+
+
+def process_file(path: str, rules: list, output_dir: str, output_format: str = "xlsx",
+                 lang: str = "es", merge_keys: list = None, policy: str = MERGE_POLICY_KEEP_LATEST,
+                 all_sheets: bool = False, use_cache: bool = True, as_of: str = None,
+                 output_stem: str = None) -> dict:
+    """
+    Procesa un libro completo y escribe su versión priorizada.
+
+    Es una función de módulo para que pueda enviarse a los procesos del pool.
+
+    Args:
+        path (str): Ruta del libro de entrada.
+        rules (list): Reglas de prioridad a aplicar.
+        output_dir (str): Directorio de salida.
+        output_format (str): 'xlsx' o 'parquet'.
+        lang (str): Idioma de los textos de 'Row Status'.
+        merge_keys (list, optional): Columnas clave para eliminar facturas repetidas
+                                     ([] desactiva la deduplicación).
+        policy (str): Política de deduplicación ('keep_latest' / 'keep_first').
+        all_sheets (bool): Leer todas las hojas del libro.
+        use_cache (bool): Usar la caché de ingesta en disco.
+        as_of (str, optional): Fecha de referencia (ISO) de las reglas de fecha
+                               relativas (por defecto, hoy).
+        output_stem (str, optional): Nombre base del archivo de salida (por
+                               defecto, el del libro; ver unique_output_stems).
+
+    Returns:
+        dict: Resumen {'input', 'output', 'rows', 'duplicates', 'priorities'}.
+    """
+    df = read_clean_workbook(path, all_sheets, use_cache)
+
+    df, n_dup = prioritize_frame(df, rules, lang, merge_keys, policy, as_of)
+
+    stem = output_stem or os.path.splitext(os.path.basename(path))[0]
+    out_path = os.path.join(output_dir, f"{stem}{OUTPUT_SUFFIX}.{output_format}")
+    if output_format == "parquet":
+        df.to_parquet(out_path, index=False)
+    else:
+        with pd.ExcelWriter(out_path, engine="openpyxl") as writer:
+            df.to_excel(writer, index=False, sheet_name="Resultados")
+
+    priorities = df["Priority"].value_counts().to_dict() if "Priority" in df.columns else {}
+    return {"input": path, "output": out_path, "rows": len(df), "duplicates": n_dup, "priorities": priorities}
+
+
+def unique_output_stems(paths: list) -> dict:
+    """
+    Nombre base de salida de cada libro, sin colisiones en el directorio de salida.
+
+    Los libros con el mismo nombre en directorios distintos
+    ('2024/enero/facturas.xlsx', '2024/febrero/facturas.xlsx') se prefijan con
+    su directorio ('enero_facturas', 'febrero_facturas'); si aun así coinciden,
+    se numeran ('_2', '_3'...). La comparación ignora mayúsculas/minúsculas
+    (sistemas de archivos que no las distinguen).
+
+    Returns:
+        dict: {ruta: nombre base}.
+    """
+    stems = {p: os.path.splitext(os.path.basename(p))[0] for p in paths}
+    counts = {}
+    for stem in stems.values():
+        counts[stem.lower()] = counts.get(stem.lower(), 0) + 1
+
+    result, used = {}, set()
+    for path, stem in stems.items():
+        if counts[stem.lower()] > 1:
+            parent = os.path.basename(os.path.dirname(os.path.abspath(path)))
+            stem = f"{parent}_{stem}" if parent else stem
+        candidate, n = stem, 1
+        while candidate.lower() in used:
+            n += 1
+            candidate = f"{stem}_{n}"
+        used.add(candidate.lower())
+        result[path] = candidate
+    return result
+
+
+def run_batch(paths: list, workers: int, **options) -> tuple:
+    """
+    Procesa todos los libros (en paralelo si hay más de uno y más de un proceso).
+
+    Los nombres de salida se deciden antes de empezar (unique_output_stems),
+    para que dos libros con el mismo nombre no se sobrescriban entre sí.
+
+    Returns:
+        tuple: (lista de resúmenes correctos, lista de (ruta, error)).
+    """
+    results, errors = [], []
+    total = len(paths)
+    stems = unique_output_stems(paths)
+
+    def _report(done, path, summary=None, error=None):
+        name = os.path.basename(path)
+        if error is not None:
+            print(f"[{done}/{total}] Error procesando {name}: {error}", file=sys.stderr)
+        else:
+            print(f"[{done}/{total}] {name}: {summary['rows']} filas -> {summary['output']}")
+
+    if workers <= 1 or total <= 1:
+        for done, path in enumerate(paths, start=1):
+            try:
+                summary = process_file(path, output_stem=stems[path], **options)
+                results.append(summary)
+                _report(done, path, summary)
+            except Exception as e:
+                errors.append((path, e))
+                _report(done, path, error=e)
+        return results, errors
+
+    # 'spawn' para que cada proceso arranque limpio (igual que la carga paralela de la app)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, total), mp_context=ctx) as pool:
+        futures = {pool.submit(process_file, path, output_stem=stems[path], **options): path for path in paths}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            path = futures[fut]
+            try:
+                summary = fut.result()
+                results.append(summary)
+                _report(done, path, summary)
+            except Exception as e:
+                errors.append((path, e))
+                _report(done, path, error=e)
+    return results, errors
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Aplica limpieza, reglas de prioridad y estado de fila a libros de facturas sin interfaz."
+    )
+    parser.add_argument("inputs", nargs="+", help="Directorios o patrones glob de archivos .xlsx.")
+    parser.add_argument("-r", "--rules", help="JSON de reglas (lista o configuración exportada por la app). Por defecto: reglas del sistema.")
+    parser.add_argument("-o", "--output", default="salida", help="Directorio de salida (por defecto: ./salida).")
+    parser.add_argument("-f", "--format", choices=OUTPUT_FORMATS, default="xlsx", help="Formato de salida.")
+    parser.add_argument("-w", "--workers", type=int, default=MAX_INGEST_WORKERS, help="Número de procesos.")
+    parser.add_argument("--lang", choices=["es", "en"], default="es", help="Idioma de la columna 'Row Status'.")
+    parser.add_argument("--merge-keys", nargs="*", default=list(DEFAULT_MERGE_KEYS),
+                        help="Columnas clave para eliminar facturas repetidas (sin valores: no deduplicar).")
+    parser.add_argument("--policy", choices=MERGE_POLICIES, default=MERGE_POLICY_KEEP_LATEST,
+                        help="Qué fila conservar cuando una factura se repite.")
+    parser.add_argument("--all-sheets", action="store_true", help="Leer todas las hojas de cada libro.")
+    parser.add_argument("--no-cache", action="store_true", help="No usar la caché de ingesta en disco.")
+    parser.add_argument("--as-of", help="Fecha de referencia (AAAA-MM-DD) de las reglas de fecha relativas. Por defecto: hoy.")
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    paths = collect_input_files(args.inputs)
+    if not paths:
+        print("No se encontraron archivos .xlsx.", file=sys.stderr)
+        return 1
+    try:
+        rules = load_rules_file(args.rules)
+    except Exception as e:
+        print(f"Error cargando reglas: {e}", file=sys.stderr)
+        return 1
+    try:
+        # Una sola fecha de referencia para todos los archivos (y procesos)
+        as_of = resolve_as_of(args.as_of).date().isoformat()
+    except ValueError as e:
+        print(f"Error en --as-of: {e}", file=sys.stderr)
+        return 1
+    os.makedirs(args.output, exist_ok=True)
+
+    start = time.perf_counter()
+    results, errors = run_batch(
+        paths, args.workers,
+        rules=rules, output_dir=args.output, output_format=args.format, lang=args.lang,
+        merge_keys=args.merge_keys, policy=args.policy,
+        all_sheets=args.all_sheets, use_cache=not args.no_cache, as_of=as_of,
+    )
+    elapsed = time.perf_counter() - start
+
+    total_rows = sum(r["rows"] for r in results)
+    print(f"{len(results)} archivo(s) procesados, {total_rows} filas, {len(errors)} error(es) en {elapsed:.1f}s.")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
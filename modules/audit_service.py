@@ -12,6 +12,7 @@ import numpy as np
 from datetime import datetime
 import io
 import copy
+from modules.rules_engine import rule_condition_groups
 
 def _get_current_user() -> str:
     """Recupera el usuario activo de la sesión para atribuir los cambios.
@@ -72,6 +73,20 @@ def _format_conditions(conditions: list) -> str:
     
     return " Y ".join(descriptions)
 
+def _format_rule_conditions(rule: dict) -> str:
+    """Condiciones de una regla en texto: sus grupos (Y) unidos con O.
+
+    Args:
+        rule (dict): Regla con 'conditions' o 'condition_groups'.
+
+    Returns:
+        str: Representación en texto (ej. "([Total > 1000] Y [Vendor is ACME]) O ([Status is On Hold])").
+    """
+    groups = rule_condition_groups(rule)
+    if len(groups) <= 1:
+        return _format_conditions(groups[0] if groups else [])
+    return " O ".join(f"({_format_conditions(g)})" for g in groups)
+
 def log_rule_changes(reason: str, old_rules: list, new_rules: list):
     """Analiza y registra diferencias (deltas) entre dos estados de reglas.
 
@@ -90,7 +105,7 @@ def log_rule_changes(reason: str, old_rules: list, new_rules: list):
     for rule_id in new_map:
         if rule_id not in old_map:
             rule = new_map[rule_id]
-            conds_str = _format_conditions(rule.get('conditions', []))
+            conds_str = _format_rule_conditions(rule)
             
             log_general_change(
                 reason=reason,
@@ -118,7 +133,7 @@ def log_rule_changes(reason: str, old_rules: list, new_rules: list):
             changes = []
             
             # Atributos críticos a monitorear
-            keys_to_compare = ["enabled", "order", "priority", "reason", "conditions"]
+            keys_to_compare = ["enabled", "order", "priority", "reason"]
             
             for key in keys_to_compare:
                 val_old = str(old_rule.get(key, ""))
@@ -127,6 +142,12 @@ def log_rule_changes(reason: str, old_rules: list, new_rules: list):
                 if val_old != val_new:
                     changes.append(f"{key}: '{val_old}' -> '{val_new}'")
             
+            # Condiciones: se comparan ya formateadas (grupos O de condiciones Y)
+            conds_old = _format_rule_conditions(old_rule)
+            conds_new = _format_rule_conditions(new_rule)
+            if conds_old != conds_new:
+                changes.append(f"conditions: '{conds_old}' -> '{conds_new}'")
+            
             if changes:
                 log_general_change(
                     reason=reason,
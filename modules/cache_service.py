@@ -0,0 +1,122 @@
+# modules/cache_service.py
+"""
+Servicio de Caché de Ingesta (Cache Service).
+
+Guarda en disco, en formato columnar (Parquet), el resultado limpio y tipado
+de cada libro Excel cargado. La clave es el hash SHA-256 del contenido del
+archivo, de modo que volver a subir el mismo archivo (o que otro analista lo
+suba) evita el parseo con openpyxl y la conversión de tipos.
+
+Cada entrada guarda en los metadatos del archivo Parquet:
+- La versión de la lógica de limpieza (loader.LOADER_VERSION).
+- El esquema (columna -> dtype) del DataFrame almacenado.
+Si alguno no coincide con el actual, la entrada se considera obsoleta.
+"""
+
+import os
+import json
+import hashlib
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from modules.loader import LOADER_VERSION
+
+# Carpeta de la caché (configurable por variable de entorno)
+CACHE_DIR = os.environ.get(
+    "FACTURAS_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "ingest")
+)
+
+_META_VERSION = b"facturas_loader_version"
+_META_SCHEMA = b"facturas_schema"
+
+
+def content_hash(content: bytes, variant: str = "") -> str:
+    """
+    Calcula la clave de caché de un archivo a partir de su contenido.
+
+    Args:
+        content (bytes): Contenido binario del archivo.
+        variant (str): Sufijo opcional para distinguir modos de lectura
+                       (ej. 'all_sheets') del mismo archivo.
+
+    Returns:
+        str: Hash hexadecimal SHA-256.
+    """
+    h = hashlib.sha256(content)
+    if variant:
+        h.update(variant.encode("utf-8"))
+    return h.hexdigest()
+
+
+def _schema_of(df: pd.DataFrame) -> dict:
+    """Devuelve el esquema {columna: dtype} serializable de un DataFrame."""
+    return {str(col): str(dtype) for col, dtype in df.dtypes.items()}
+
+
+def _entry_path(key: str) -> str:
+    """Ruta del archivo Parquet asociado a una clave."""
+    return os.path.join(CACHE_DIR, f"{key}.parquet")
+
+
+def load_cached_frame(key: str):
+    """
+    Recupera un DataFrame limpio de la caché.
+
+    Args:
+        key (str): Clave devuelta por content_hash().
+
+    Returns:
+        pd.DataFrame | None: El DataFrame almacenado, o None si no existe,
+        pertenece a otra versión del loader o su esquema no coincide.
+    """
+    path = _entry_path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pq.read_table(path)
+        meta = table.schema.metadata or {}
+        if meta.get(_META_VERSION, b"").decode("utf-8") != str(LOADER_VERSION):
+            # Entrada generada con otra lógica de limpieza: se descarta
+            os.remove(path)
+            return None
+
+        df = table.to_pandas()
+        stored_schema = json.loads(meta.get(_META_SCHEMA, b"{}").decode("utf-8"))
+        if stored_schema != _schema_of(df):
+            os.remove(path)
+            return None
+        return df
+    except Exception as e:
+        print(f"Error leyendo caché '{key}': {e}")
+        return None
+
+
+def store_cached_frame(key: str, df: pd.DataFrame) -> bool:
+    """
+    Guarda un DataFrame limpio en la caché (escritura atómica).
+
+    Args:
+        key (str): Clave devuelta por content_hash().
+        df (pd.DataFrame): DataFrame limpio y tipado.
+
+    Returns:
+        bool: True si se guardó, False si hubo error (la caché es opcional y
+              nunca interrumpe la carga).
+    """
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        meta = dict(table.schema.metadata or {})
+        meta[_META_VERSION] = str(LOADER_VERSION).encode("utf-8")
+        meta[_META_SCHEMA] = json.dumps(_schema_of(df)).encode("utf-8")
+        table = table.replace_schema_metadata(meta)
+
+        path = _entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        return True
+    except Exception as e:
+        print(f"Error guardando caché '{key}': {e}")
+        return False
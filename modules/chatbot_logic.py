@@ -171,7 +171,7 @@ def generate_top_vendors(df: pd.DataFrame, lang: str):
     df_calc['Total'] = pd.to_numeric(df_calc['Total'], errors='coerce').fillna(0)
     
     # Agrupación y ordenamiento
-    top_5 = df_calc.groupby('Vendor Name')['Total'].sum().nlargest(5)
+    top_5 = df_calc.groupby('Vendor Name', observed=True)['Total'].sum().nlargest(5)
     
     if top_5.empty: return get_text(lang, "logic_msg_top_none"), None, []
     
@@ -261,7 +261,8 @@ def process_user_message(message: str, df: pd.DataFrame, lang: str) -> tuple:
             elif "grupo" in raw_msg or "pay" in raw_msg: target_col = "Pay Group"
         
         if target_col and target_col in df.columns:
-            counts = df[target_col].value_counts().head(10)
+            counts = df[target_col].value_counts()
+            counts = counts[counts > 0].head(10)  # Las categorías sin filas no se grafican
             col_ui = translate_column(lang, target_col)
             chart_data = {
                 "type": "bar", "data": counts,
@@ -0,0 +1,267 @@
+# modules/data_store.py
+"""
+Almacén de Datos Versionado (Data Store).
+
+Sustituye las tres copias completas del DataFrame (pristine, original y
+staging) por UNA sola copia de trabajo (df_staging) más un registro disperso
+de los cambios hechos desde el último commit:
+
+- Celdas editadas: {columna: {fila: valor_anterior}} (sólo la primera vez).
+- Filas insertadas: etiquetas de las filas nuevas.
+- Filas borradas: contenido de cada fila en el momento de borrarla.
+- Columnas calculadas (Priority, Priority_Reason, Row Status): instantánea
+  de sus valores en el punto de commit (el motor de reglas las recalcula
+  enteras, por lo que no se registran celda a celda).
+
+La versión estable (commit) es la base inmutable: no se guarda como copia
+porque se reconstruye deshaciendo el registro sobre la copia de trabajo.
+Así 'Confirmar' y 'Revertir' cuestan O(cambios) en lugar de O(filas x columnas)
+(salvo al revertir altas/bajas de filas, que reordenan el índice).
+
+Todo el código que modifica df_staging debe registrar el cambio ANTES de
+escribir (record_cells / record_insert / record_delete o write_cells).
+El índice se normaliza a texto para que las etiquetas de fila sean estables.
+
+Además se lleva un conjunto de filas 'sucias' (editadas o insertadas desde el
+último recálculo de prioridad) para que el motor de reglas pueda reevaluar
+sólo esas filas tras un guardado (ver take_dirty).
+"""
+
+import itertools
+import pandas as pd
+from modules.schema import add_categories, values_equal, concat_frames, enforce_schema
+
+# Columnas recalculadas por el motor de reglas / estado de fila
+DERIVED_COLUMNS = ["Priority", "Priority_Reason", "Row Status"]
+
+# Identificador único de cada almacén (distingue cargas distintas con la misma versión)
+_STORE_IDS = itertools.count(1)
+
+
+def normalize_index(df: pd.DataFrame) -> pd.DataFrame:
+    """Convierte (in situ) el índice de filas a texto."""
+    df.index = df.index.astype(str)
+    return df
+
+
+class DataStore:
+    """Registro de cambios (overlay) de df_staging respecto al último commit."""
+
+    def __init__(self, df: pd.DataFrame, source_key: str = None):
+        """
+        Args:
+            df (pd.DataFrame): Datos recién cargados (pasan a ser la versión estable).
+                               Su índice se normaliza a texto in situ.
+            source_key (str, optional): Huella del origen de los datos (archivos y
+                               opciones de carga). Dos cargas del mismo origen
+                               comparten versión mientras no se modifiquen, y
+                               con ella los resultados memorizados del motor.
+        """
+        normalize_index(df)
+        self.uid = next(_STORE_IDS)
+        self.source_key = source_key
+        self.version = 0
+        self._dirty = set()
+        self._snapshot(df)
+        self._clear_log()
+
+    # --- Estado interno ---
+    def _snapshot(self, df: pd.DataFrame):
+        """Guarda el orden de filas y las columnas calculadas del punto de commit."""
+        self._index = df.index
+        self._derived = {c: df[c].copy() for c in DERIVED_COLUMNS if c in df.columns}
+
+    def _clear_log(self):
+        self._cells = {}
+        self._inserted = set()
+        self._deleted = {}
+
+    def _bump(self):
+        self.version += 1
+
+    @property
+    def data_version(self) -> tuple:
+        """Versión de los datos (cambia con cualquier cambio registrado o recarga)."""
+        if self.version == 0 and self.source_key is not None:
+            return (self.source_key, 0)
+        return (self.uid, self.version)
+
+    def mark_dirty(self, labels):
+        """Marca filas para reevaluar sus columnas calculadas."""
+        self._dirty.update(labels)
+
+    def take_dirty(self) -> list:
+        """Devuelve (y olvida) las filas pendientes de reevaluar."""
+        dirty = list(self._dirty)
+        self._dirty.clear()
+        return dirty
+
+    @property
+    def has_changes(self) -> bool:
+        """True si hay cambios sin confirmar en celdas o filas."""
+        return bool(self._inserted or self._deleted or any(self._cells.values()))
+
+    def summary(self) -> dict:
+        """Tamaño del registro de cambios pendiente."""
+        return {
+            "cells": sum(len(v) for v in self._cells.values()),
+            "inserted": len(self._inserted),
+            "deleted": len(self._deleted),
+            "version": self.version,
+        }
+
+    # --- Registro de cambios ---
+    def record_cells(self, df: pd.DataFrame, column: str, labels):
+        """
+        Guarda el valor actual de las celdas (column, labels) antes de escribirlas.
+
+        Las filas insertadas desde el commit no se registran (al revertir se borran).
+        Las filas quedan marcadas como sucias (también al editar 'Priority' a mano).
+        """
+        if column not in df.columns:
+            return
+        self._dirty.update(labels)
+        if column in DERIVED_COLUMNS:
+            return
+        log = self._cells.setdefault(column, {})
+        pending = [l for l in labels if l not in log and l not in self._inserted]
+        if pending:
+            log.update(zip(pending, df.loc[pending, column].tolist()))
+        self._bump()
+
+    def record_insert(self, labels):
+        """Registra filas nuevas (añadidas desde el editor)."""
+        self._inserted.update(labels)
+        self._dirty.update(labels)
+        self._bump()
+
+    def record_delete(self, df: pd.DataFrame, labels):
+        """Guarda el contenido de las filas que se van a borrar."""
+        labels = [l for l in labels if l in df.index]
+        self._dirty.difference_update(labels)
+        new_rows = [l for l in labels if l in self._inserted]
+        self._inserted.difference_update(new_rows)
+        old_rows = [l for l in labels if l not in self._deleted and l not in new_rows]
+        if old_rows:
+            self._deleted.update(df.loc[old_rows].to_dict(orient="index"))
+        self._bump()
+
+    def write_cells(self, df: pd.DataFrame, column: str, labels, value):
+        """Registra y escribe un valor (escalar o alineado con 'labels') en una columna."""
+        labels = list(labels)
+        if not labels:
+            return
+        self.record_cells(df, column, labels)
+        add_categories(df, column, value if not isinstance(value, pd.Series) else value.tolist())
+        df.loc[labels, column] = value
+
+    def apply_frame_edits(self, df: pd.DataFrame, edited: pd.DataFrame) -> int:
+        """
+        Vuelca en df las celdas de 'edited' que realmente cambian (como df.update:
+        los valores nulos de 'edited' no sobrescriben).
+
+        Sólo compara las filas presentes en 'edited' (la vista del editor), no el
+        conjunto completo.
+
+        Returns:
+            int: Número de celdas escritas.
+        """
+        rows = edited.index.intersection(df.index)
+        if rows.empty:
+            return 0
+        written = 0
+        for column in edited.columns:
+            if column not in df.columns:
+                continue
+            new = edited.loc[rows, column]
+            old = df.loc[rows, column]
+            changed = new.notna().to_numpy() & ~values_equal(old.reset_index(drop=True), new.reset_index(drop=True))
+            if changed.any():
+                labels = rows[changed]
+                values = new[changed]
+                self.write_cells(df, column, labels, values.to_numpy() if not isinstance(df[column].dtype, pd.CategoricalDtype) else values.astype(str).to_numpy())
+                written += int(changed.sum())
+        return written
+
+    # --- Cambios de origen (carga incremental) ---
+    def absorb_source_rows(self, df_new: pd.DataFrame):
+        """Incorpora filas nuevas de una carga incremental a la versión estable."""
+        if df_new.empty:
+            return
+        normalize_index(df_new)
+        self._index = self._index.append(df_new.index)
+        for c in list(self._derived):
+            if c in df_new.columns:
+                self._derived[c] = pd.concat([self._derived[c], df_new[c]])
+        self._bump()
+
+    def pending_edits(self) -> dict:
+        """Ediciones sin confirmar: {columna: {fila: valor_confirmado}} (no modificar)."""
+        return {c: log for c, log in self._cells.items() if log}
+
+    def absorb_source_updates(self, df: pd.DataFrame, written_cells: dict, updated_labels=()):
+        """
+        Una fusión (keep_latest) deja en df el valor de origen de las celdas que
+        ha escrito: esas celdas pasan a la versión estable (se olvidan del
+        registro) y se refrescan las columnas calculadas de las filas actualizadas.
+
+        Args:
+            df (pd.DataFrame): Datos de trabajo ya fusionados.
+            written_cells (dict): {columna: etiquetas de las celdas escritas}
+                                  (merge_into 'written_cells').
+            updated_labels: Filas actualizadas.
+        """
+        for column, labels in written_cells.items():
+            log = self._cells.get(column)
+            if log:
+                for l in labels:
+                    log.pop(l, None)
+        updated_labels = list(updated_labels)
+        if updated_labels:
+            for c, snap in self._derived.items():
+                if c in df.columns:
+                    present = [l for l in updated_labels if l in snap.index]
+                    snap.loc[present] = df.loc[present, c].to_numpy()
+        self._bump()
+
+    # --- Commit / Revert ---
+    def commit(self, df: pd.DataFrame):
+        """El estado actual de df pasa a ser la versión estable. O(cambios) + columnas calculadas."""
+        normalize_index(df)
+        self._snapshot(df)
+        self._clear_log()
+        self._bump()
+
+    def revert(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Deshace los cambios pendientes y devuelve df en la versión estable.
+
+        Las celdas editadas se restauran in situ. Sólo si hubo altas o bajas de
+        filas se reconstruye el DataFrame con el orden de filas del commit.
+        """
+        rows_changed = bool(self._inserted or self._deleted)
+
+        if self._inserted:
+            df = df.drop(index=[l for l in self._inserted if l in df.index])
+        if self._deleted:
+            restored = pd.DataFrame.from_dict(self._deleted, orient="index")
+            restored = restored.reindex(columns=df.columns)
+            df = enforce_schema(concat_frames([df, restored], ignore_index=False))
+        if rows_changed:
+            df = df.reindex(self._index.intersection(df.index, sort=False))
+
+        for column, log in self._cells.items():
+            if not log or column not in df.columns:
+                continue
+            labels = [l for l in log if l in df.index]
+            values = [log[l] for l in labels]
+            add_categories(df, column, values)
+            df.loc[labels, column] = values
+
+        for c, snap in self._derived.items():
+            df[c] = snap.reindex(df.index)
+
+        self._clear_log()
+        self._dirty.clear()
+        self._bump()
+        return df
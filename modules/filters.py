@@ -4,26 +4,36 @@ Módulo de Filtrado Dinámico (Filters).
 
 Contiene la lógica de filtrado dinámico.
 Versión Mejorada: Soporta operadores lógicos (>, <, =, contains) para filtrado numérico y de texto.
+En columnas de fecha (datetime64) los operadores >, <, >=, <= y between comparan fechas.
+Los operadores de lista (in / not_in) usan búsqueda en conjunto hash en lugar de regex
+y, como en el motor de reglas, ignoran mayúsculas/minúsculas: se comparan en
+minúsculas tanto los valores de la columna (las categorías, en columnas
+categóricas) como los de la lista.
 """
 
 import pandas as pd
 from collections import defaultdict
 import numpy as np 
+from modules.schema import as_text, parse_list_value, parse_range_value
 
-def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
+def construir_mascara_filtros(df: pd.DataFrame, filtros: list) -> pd.Series:
     """
-    Aplica una lista de filtros al DataFrame con lógica 'OR' y 'AND'.
+    Calcula la máscara booleana de una lista de filtros sin copiar el DataFrame.
+
+    Misma semántica que aplicar_filtros_dinamicos: 'OR' entre los filtros de
+    una misma columna y 'AND' entre columnas. Los filtros sobre columnas
+    inexistentes (o que fallan) se ignoran.
 
     Args:
-        df (pd.DataFrame): El DataFrame original.
-        filtros (list): Lista de diccionarios. 
-                        Ej: [{'columna': 'Total', 'valor': 1000, 'operator': '>'}, ...]
+        df (pd.DataFrame): El DataFrame a evaluar (no se modifica).
+        filtros (list): Lista de diccionarios {'columna', 'valor', 'operator'}.
 
     Returns:
-        pd.DataFrame: El DataFrame filtrado.
+        pd.Series: Máscara booleana alineada con df.index.
     """
+    mascara_total = pd.Series(True, index=df.index)
     if not filtros:
-        return df.copy()
+        return mascara_total
 
     # 1. Agrupar Filtros por Columna (conservando el objeto filtro completo)
     filtros_agrupados = defaultdict(list)
@@ -32,25 +42,31 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
         if 'columna' in f:
             filtros_agrupados[f['columna']].append(f)
 
-    resultado = df.copy()
-
     # 2. Aplicar Lógica
     for columna, lista_filtros in filtros_agrupados.items():
-        if columna not in resultado.columns:
+        if columna not in df.columns:
             continue
             
         try:
             # Preparar datos de la columna para comparación rápida
-            series = resultado[columna]
+            series = df[columna]
             
-            # Versión numérica (forzando conversión, errores a NaN)
-            series_num = pd.to_numeric(series, errors='coerce')
-            # Versión string (para búsquedas de texto)
-            series_str = series.astype(str)
+            is_date_col = pd.api.types.is_datetime64_any_dtype(series.dtype)
+            # Versión numérica (forzando conversión, errores a NaN). En columnas de
+            # fecha se compara directamente la fecha (vectorizado, sin pasar por texto).
+            series_num = series if is_date_col else pd.to_numeric(series, errors='coerce')
+            # Versión string (para búsquedas de texto). Las columnas categóricas
+            # se comparan sobre sus categorías, sin expandirlas a texto fila a fila.
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                series_str = series
+            elif is_date_col:
+                series_str = as_text(series)
+            else:
+                series_str = series.astype(str)
 
             # Máscara acumulativa para la columna (Lógica OR entre valores de la misma columna)
             # Empezamos con todo Falso, para ir sumando coincidencias.
-            mascara_or_columna = pd.Series([False] * len(resultado), index=resultado.index)
+            mascara_or_columna = pd.Series(False, index=df.index)
 
             for f in lista_filtros:
                 val = f.get('valor')
@@ -58,17 +74,38 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
                 
                 mask_filtro = None
 
-                # --- Lógica Numérica ---
+                # --- Lógica Numérica (o de fechas) ---
                 if op in ['>', '<', '>=', '<=']:
                     try:
-                        val_num = float(val)
+                        val_num = pd.Timestamp(val) if is_date_col else float(val)
                         if op == '>': mask_filtro = series_num > val_num
                         elif op == '<': mask_filtro = series_num < val_num
                         elif op == '>=': mask_filtro = series_num >= val_num
                         elif op == '<=': mask_filtro = series_num <= val_num
                     except (ValueError, TypeError):
                         # Si el valor no es numérico, este filtro falla silenciosamente (todo False)
-                        mask_filtro = pd.Series([False] * len(resultado), index=resultado.index)
+                        mask_filtro = pd.Series(False, index=df.index)
+
+                # --- Rango (ambos límites incluidos, una sola comparación vectorizada) ---
+                elif op == 'between':
+                    try:
+                        lo, hi = parse_range_value(val)
+                        to_val = pd.Timestamp if is_date_col else float
+                        mask_filtro = series_num.between(to_val(lo), to_val(hi))
+                    except (ValueError, TypeError):
+                        mask_filtro = pd.Series(False, index=df.index)
+
+                # --- Lista de valores exactos (conjunto hash, sin distinguir mayúsculas) ---
+                elif op in ['in', 'not_in']:
+                    wanted = {v.lower() for v in parse_list_value(val)}
+                    if isinstance(series_str.dtype, pd.CategoricalDtype):
+                        # Sobre las categorías y difundido con los códigos (-1 = nulo, no coincide)
+                        hits = np.append(series_str.cat.categories.astype(str).str.lower().isin(wanted), False)
+                        mask_filtro = pd.Series(hits[series_str.cat.codes.to_numpy()], index=df.index)
+                    else:
+                        mask_filtro = series_str.str.lower().isin(wanted)
+                    if op == 'not_in':
+                        mask_filtro = ~mask_filtro
 
                 # --- Lógica Exacta ---
                 elif op == '==':
@@ -81,13 +118,57 @@ def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
 
                 # Acumular con OR (|)
                 if mask_filtro is not None:
-                    mascara_or_columna = mascara_or_columna | mask_filtro.fillna(False)
+                    mascara_or_columna = mascara_or_columna | mask_filtro.fillna(False).astype(bool)
 
-            # Aplicar la máscara de esta columna al resultado (Lógica AND entre columnas)
-            resultado = resultado[mascara_or_columna]
+            # Lógica AND entre columnas
+            mascara_total = mascara_total & mascara_or_columna
 
         except Exception as e:
             print(f"Error filtro en '{columna}': {e}")
             pass
     
-    return resultado
\ No newline at end of file
+    return mascara_total
+
+def aplicar_filtros_dinamicos(df: pd.DataFrame, filtros: list) -> pd.DataFrame:
+    """
+    Aplica una lista de filtros al DataFrame con lógica 'OR' y 'AND'.
+
+    Args:
+        df (pd.DataFrame): El DataFrame original.
+        filtros (list): Lista de diccionarios. 
+                        Ej: [{'columna': 'Total', 'valor': 1000, 'operator': '>'}, ...]
+
+    Returns:
+        pd.DataFrame: El DataFrame filtrado.
+    """
+    if not filtros:
+        return df.copy()
+    return df[construir_mascara_filtros(df, filtros)]
+
+def resumen_agrupado(df: pd.DataFrame, columna: str) -> pd.DataFrame:
+    """
+    Agregados por grupo (suma, conteo y media de 'Total'; media de antigüedad).
+
+    Es el cálculo de la vista agrupada, reutilizado por la API.
+
+    Args:
+        df (pd.DataFrame): Datos (normalmente ya filtrados).
+        columna (str): Columna por la que agrupar.
+
+    Returns:
+        pd.DataFrame: Una fila por grupo con columnas 'Total_sum', 'Total_count',
+                      'Total_mean' e 'Invoice Date Age_mean' (si existe).
+    """
+    cols = [columna] + [c for c in ['Total', 'Invoice Date Age'] if c in df.columns and c != columna]
+    d = df[cols].copy()
+    # Asegurar tipos numéricos para agregación
+    for c in ['Total', 'Invoice Date Age']:
+        if c in d and c != columna: d[c] = pd.to_numeric(d[c], errors='coerce')
+        
+    agg = {'Total': ['sum','count','mean']}
+    if 'Invoice Date Age' in d: agg['Invoice Date Age'] = ['mean']
+    
+    # Crear agrupación
+    res = d.groupby(columna, observed=True).agg(agg)
+    res.columns = ['_'.join(c).strip() for c in res.columns]
+    return res
@@ -15,8 +15,27 @@ import pandas as pd
 import uuid
 import copy
 from modules.audit_service import log_rule_changes
-from modules.rules_service import apply_priority_rules, get_default_rules
+from modules.rules_service import (
+    apply_priority_rules, get_default_rules, resolve_as_of, rule_condition_groups, LIST_OPERATORS, DATE_OPERATORS, RELATIVE_DATE_OPERATORS,
+    RULE_STATUS_OK, RULE_STATUS_DEAD, RULE_STATUS_SHADOWED, RULE_STATUS_ALWAYS_TRUE, RULE_STATUS_ERROR,
+    PROFILE_LEVEL_RULE, PROFILE_LEVEL_CONDITION
+)
+from modules.schema import parse_list_value
 from modules.translator import get_text
+from modules.utils import get_rule_mask_cache, get_rule_match_index, get_rules_profile, to_excel
+
+def _reapply_rules():
+    """
+    Recalcula las prioridades tras un cambio de reglas reutilizando las
+    máscaras cacheadas: sólo se evalúan las reglas nuevas o editadas.
+    Volver a un conjunto de reglas ya evaluado (p. ej. deshacer) reutiliza
+    el resultado memorizado por el motor.
+    """
+    if st.session_state.df_staging is not None:
+        mask_cache = get_rule_mask_cache()
+        st.session_state.df_staging = apply_priority_rules(
+            st.session_state.df_staging, mask_cache=mask_cache, data_version=mask_cache.data_version
+        )
 
 def _get_operator_labels(lang: str) -> dict:
     """
@@ -38,7 +57,14 @@ def _get_operator_labels(lang: str) -> dict:
             ">": "📈 Greater than (>) | Number is strictly higher",
             "<": "📉 Less than (<) | Number is strictly lower",
             ">=": "📐 Greater or equal (>=) | Number is higher or equal",
-            "<=": "📏 Less or equal (<=) | Number is lower or equal"
+            "<=": "📏 Less or equal (<=) | Number is lower or equal",
+            "between": "↔️ Between | Number within a range (limits included)",
+            "in": "📋 Is one of | Exact match against a list of values",
+            "not_in": "⛔ Is none of | Everything except the listed values",
+            "before": "⏮️ Before | Date earlier than...",
+            "after": "⏭️ After | Date later than...",
+            "within_next_days": "⏳ Within the next N days | Date between the reference date and N days later",
+            "older_than_days": "🗓️ Older than N days | Date more than N days before the reference date"
         }
     else: # Default Español
         return {
@@ -49,12 +75,69 @@ def _get_operator_labels(lang: str) -> dict:
             ">": "📈 Mayor que (>) | Comparación numérica",
             "<": "📉 Menor que (<) | Comparación numérica",
             ">=": "📐 Mayor o igual (>=) | Comparación numérica",
-            "<=": "📏 Menor o igual (<=) | Comparación numérica"
+            "<=": "📏 Menor o igual (<=) | Comparación numérica",
+            "between": "↔️ Entre | Número dentro de un rango (límites incluidos)",
+            "in": "📋 Es uno de | Coincidencia exacta con una lista de valores",
+            "not_in": "⛔ No es ninguno de | Todo menos los valores de la lista",
+            "before": "⏮️ Antes de | Fecha anterior a...",
+            "after": "⏭️ Después de | Fecha posterior a...",
+            "within_next_days": "⏳ En los próximos N días | Fecha entre la de referencia y N días después",
+            "older_than_days": "🗓️ Hace más de N días | Fecha anterior en más de N días a la de referencia"
         }
 
+def _format_condition_value(value) -> str:
+    """Texto de un valor de condición para la lista del constructor."""
+    if isinstance(value, float):
+        return f"{value:.2f}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ", ".join(_format_condition_value(v) for v in value) + "]"
+    return f"'{value}'"
+
+def _conditions_payload(groups: list) -> dict:
+    """
+    Condiciones de una regla para guardar: un solo grupo se guarda como la
+    lista plana 'conditions' (formato de siempre); varios, como
+    'condition_groups' (OR entre grupos, AND dentro de cada uno).
+    """
+    groups = [copy.deepcopy(g) for g in groups if g]
+    if len(groups) <= 1:
+        return {"conditions": groups[0] if groups else []}
+    return {"conditions": [], "condition_groups": groups}
+
+# Icono del diagnóstico de cada regla en el título de la lista
+STATUS_ICONS = {RULE_STATUS_DEAD: "💤", RULE_STATUS_SHADOWED: "🌓", RULE_STATUS_ALWAYS_TRUE: "♾️", RULE_STATUS_ERROR: "⚠️"}
+
+def _rule_stats() -> dict:
+    """
+    Coincidencias, filas ganadas y diagnóstico de cada regla activa sobre
+    df_staging (ver RuleMatchIndex.rule_stats), a partir del bitmap de
+    coincidencias de la sesión y sus máscaras cacheadas. Vacío sin datos.
+    """
+    index = get_rule_match_index()
+    return index.rule_stats() if index is not None else {}
+
+def _render_rule_profile(lang: str, profile: pd.DataFrame):
+    """Coste medido de una regla (fila 'rule' del perfil) y de cada una de sus condiciones."""
+    rule_row = profile[profile['level'] == PROFILE_LEVEL_RULE].iloc[0]
+    if rule_row['skipped']:
+        st.caption(get_text(lang, 'rule_profile_skipped'))
+        return
+    st.caption(get_text(lang, 'rule_profile_cap').format(
+        ms=rule_row['seconds'] * 1000, evaluated=rule_row['rows_evaluated'],
+        matched=rule_row['rows_matched'], won=rule_row['rows_won']
+    ))
+    for _, cond in profile[profile['level'] == PROFILE_LEVEL_CONDITION].iterrows():
+        st.text(get_text(lang, 'rule_profile_cond').format(
+            cond=cond['condition'], ms=cond['seconds'] * 1000,
+            evaluated=cond['rows_evaluated'], matched=cond['rows_matched']
+        ))
+    if rule_row['indexed']:
+        st.caption(get_text(lang, 'rule_profile_indexed'))
+
 def _reset_builder_state():
     """Resetea las variables temporales del formulario de creación de reglas."""
-    st.session_state.new_rule_conditions = []
+    # Grupos de condiciones (OR entre grupos); las nuevas se añaden al último
+    st.session_state.new_rule_groups = [[]]
     st.session_state.new_rule_name = ""
     st.session_state.new_rule_priority = "Alta"
     st.session_state.new_rule_order = 50
@@ -70,7 +153,7 @@ def render_rules_editor(cols, auto_opts):
         auto_opts (dict): Diccionario de valores para autocompletado en los inputs.
     """
     # Inicialización de estado local del editor
-    if "new_rule_conditions" not in st.session_state:
+    if "new_rule_groups" not in st.session_state:
         _reset_builder_state()
         
     if "priority_rules" not in st.session_state:
@@ -137,8 +220,11 @@ def render_rules_editor(cols, auto_opts):
             key="builder_op"
         )
         
-        # Input Inteligente de Valor (Numérico vs Texto vs Select)
+        # Input Inteligente de Valor (Numérico vs Rango vs Lista vs Texto vs Select)
         is_math_op = cond_op in [">", "<", ">=", "<="]
+        is_range_op = cond_op == "between"
+        is_list_op = cond_op in LIST_OPERATORS
+        is_date_op = cond_op in DATE_OPERATORS
         cond_val = None
         
         if is_math_op:
@@ -152,6 +238,51 @@ def render_rules_editor(cols, auto_opts):
                 help=get_text(lang, 'help_num_val'),
                 key="builder_val_num"
             )
+        elif cond_op in RELATIVE_DATE_OPERATORS:
+            # Modo Días: relativo a la fecha de referencia del motor
+            st.caption(f"⏳ {get_text(lang, 'rule_val_days_lbl')}:")
+            cond_val = int(st.number_input(
+                get_text(lang, 'rule_val_days_lbl'),
+                min_value=0,
+                value=7,
+                step=1,
+                label_visibility="collapsed",
+                help=get_text(lang, 'help_days_val'),
+                key="builder_val_days"
+            ))
+        elif is_date_op:
+            # Modo Fecha fija (se guarda en ISO)
+            st.caption(f"📅 {get_text(lang, 'rule_val_date_lbl')}:")
+            cond_val = st.date_input(
+                get_text(lang, 'rule_val_date_lbl'),
+                label_visibility="collapsed",
+                key="builder_val_date"
+            ).isoformat()
+        elif is_range_op:
+            # Modo Rango: dos límites numéricos (se guardan como [mínimo, máximo])
+            c_lo, c_hi = st.columns(2)
+            lo = c_lo.number_input(get_text(lang, 'rule_val_min_lbl'), value=0.0, format="%.2f", key="builder_val_lo")
+            hi = c_hi.number_input(get_text(lang, 'rule_val_max_lbl'), value=0.0, format="%.2f", key="builder_val_hi")
+            cond_val = [lo, hi]
+        elif is_list_op:
+            # Modo Lista: varios valores exactos (se guardan como lista)
+            current_opts = auto_opts.get(cond_col, [])
+            if current_opts:
+                st.caption(get_text(lang, 'rule_sel_multi_cap'))
+                cond_val = st.multiselect(
+                    get_text(lang, 'rule_val_lbl'),
+                    current_opts,
+                    label_visibility="collapsed",
+                    key="builder_val_multi"
+                )
+            else:
+                st.caption(get_text(lang, 'rule_write_list_cap'))
+                cond_val = parse_list_value(st.text_input(
+                    get_text(lang, 'rule_val_txt_lbl'),
+                    placeholder=get_text(lang, 'rule_ph_list'),
+                    label_visibility="collapsed",
+                    key="builder_val_list"
+                ))
         else:
             # Modo Texto/Lista
             current_opts = auto_opts.get(cond_col, [])
@@ -183,33 +314,49 @@ def render_rules_editor(cols, auto_opts):
         # Botón: Agregar Condición
         if st.button(get_text(lang, 'btn_add_cond'), use_container_width=True):
             valid = True
-            # Validación simple: texto no vacío
-            if not is_math_op and not str(cond_val).strip():
+            # Validación simple: texto no vacío, lista con valores y rango ordenado
+            if is_list_op:
+                valid = bool(cond_val)
+            elif is_range_op:
+                valid = cond_val[0] <= cond_val[1]
+            elif not is_math_op and not is_date_op and not str(cond_val).strip():
                 valid = False
                 
             if valid:
-                st.session_state.new_rule_conditions.append({
+                st.session_state.new_rule_groups[-1].append({
                     "column": cond_col,
                     "operator": cond_op,
-                    "value": cond_val
+                    "value": list(cond_val) if is_list_op else cond_val
                 })
             else:
                 st.warning(get_text(lang, 'warn_no_val'))
 
-        # 4. Lista de Condiciones Acumuladas (Staging)
-        if st.session_state.new_rule_conditions:
+        # 4. Lista de Condiciones Acumuladas (Staging): grupos Y unidos con O
+        groups = st.session_state.new_rule_groups
+        if any(groups):
             st.divider()
             st.markdown(f"**{get_text(lang, 'lbl_conds_added')}**")
-            for i, cond in enumerate(st.session_state.new_rule_conditions):
-                op_nice = op_labels.get(cond['operator'], cond['operator']).split("|")[0].strip()
-                val_disp = f"{cond['value']:.2f}" if isinstance(cond['value'], float) else f"'{cond['value']}'"
-                
-                c_txt, c_del = st.columns([0.85, 0.15])
-                c_txt.markdown(f"`{cond['column']}` {op_nice} {val_disp}")
-                if c_del.button("❌", key=f"del_{i}"):
-                    st.session_state.new_rule_conditions.pop(i)
-                    st.session_state.rules_open_trigger = True # Trigger para mantener abierto
-                    st.rerun()
+            for g, group in enumerate(groups):
+                if g > 0:
+                    st.markdown(f"**{get_text(lang, 'lbl_or_group')}**")
+                for i, cond in enumerate(group):
+                    op_nice = op_labels.get(cond['operator'], cond['operator']).split("|")[0].strip()
+                    val_disp = _format_condition_value(cond['value'])
+                    
+                    c_txt, c_del = st.columns([0.85, 0.15])
+                    c_txt.markdown(f"`{cond['column']}` {op_nice} {val_disp}")
+                    if c_del.button("❌", key=f"del_{g}_{i}"):
+                        group.pop(i)
+                        # Sin grupos vacíos intermedios (siempre queda uno para seguir añadiendo)
+                        st.session_state.new_rule_groups = [x for x in groups[:-1] if x] + [groups[-1]]
+                        st.session_state.rules_open_trigger = True # Trigger para mantener abierto
+                        st.rerun()
+            
+            # Botón: empezar un grupo alternativo (O)
+            if groups[-1] and st.button(get_text(lang, 'btn_add_or_group'), help=get_text(lang, 'help_or_group'), use_container_width=True):
+                groups.append([])
+                st.session_state.rules_open_trigger = True
+                st.rerun()
             
             st.divider()
             
@@ -229,7 +376,7 @@ def render_rules_editor(cols, auto_opts):
                         "order": r_order,
                         "priority": r_prio,
                         "reason": r_name,
-                        "conditions": copy.deepcopy(st.session_state.new_rule_conditions)
+                        **_conditions_payload(st.session_state.new_rule_groups)
                     }
                     
                     if is_editing:
@@ -250,8 +397,7 @@ def render_rules_editor(cols, auto_opts):
                         st.success(get_text(lang, 'success_saved'))
                     
                     # Recalcular inmediatamente
-                    if st.session_state.df_staging is not None:
-                        st.session_state.df_staging = apply_priority_rules(st.session_state.df_staging)
+                    _reapply_rules()
                     
                     _reset_builder_state()
                     st.session_state.rules_open_trigger = True # Mantener abierto para ver el resultado
@@ -265,25 +411,77 @@ def render_rules_editor(cols, auto_opts):
 
     # --- DERECHA: LISTA DE REGLAS ACTIVAS ---
     with col_list:
+        # Fecha de referencia de las reglas de fecha relativas (sin fijar = hoy)
+        today = pd.Timestamp.today().date()
+        as_of = st.date_input(
+            get_text(lang, 'rules_as_of_lbl'),
+            value=resolve_as_of(st.session_state.get('rules_as_of')).date(),
+            help=get_text(lang, 'help_rules_as_of'),
+            key="rules_as_of_input"
+        )
+        new_as_of = None if as_of == today else as_of.isoformat()
+        if new_as_of != st.session_state.get('rules_as_of'):
+            st.session_state.rules_as_of = new_as_of
+            _reapply_rules()
+
         st.markdown(f"#### {get_text(lang, 'rules_active_list')}")
         display_rules = sorted(st.session_state.priority_rules, key=lambda x: x.get('order', 0))
         
         if not display_rules: st.info(get_text(lang, 'info_no_rules'))
+
+        # Análisis de las reglas activas sobre los datos actuales
+        stats = _rule_stats()
+        findings = sum(1 for s in stats.values() if s['status'] != RULE_STATUS_OK)
+        if findings:
+            st.caption(get_text(lang, 'rules_findings_summary').format(n=findings))
+        reasons = {r['id']: r.get('reason', '') for r in st.session_state.priority_rules}
+
+        # Perfil de coste (a petición): tiempo y filas por regla y condición
+        refresh = st.session_state.df_staging is not None and st.button(
+            get_text(lang, 'btn_profile_rules'), help=get_text(lang, 'help_profile_rules'), use_container_width=True
+        )
+        profile = get_rules_profile(refresh=refresh)
+        if profile is not None:
+            with st.expander(get_text(lang, 'rules_profile_title')):
+                rule_rows = profile[profile['level'] == PROFILE_LEVEL_RULE].sort_values('seconds', ascending=False)
+                st.dataframe(rule_rows.drop(columns=['level', 'group', 'condition']), use_container_width=True, hide_index=True)
+                st.download_button(get_text(lang, 'btn_download_profile'), to_excel(profile), "perfil_reglas.xlsx")
         
         for i, rule in enumerate(display_rules):
             icon = "🟢" if rule.get('enabled', True) else "⚪"
             # Resalte visual si se está editando
             bg_style = "border: 2px solid #004A99;" if rule['id'] == st.session_state.editing_rule_id else ""
+            rule_stats = stats.get(rule['id']) if rule.get('enabled', True) else None
+            rule_profile = None
+            if profile is not None and rule.get('enabled', True):
+                rule_profile = profile[profile['rule_id'] == rule['id']]
             title = f"{icon} [{rule.get('order')}] {rule.get('reason', 'Sin Nombre')}"
+            if rule_stats:
+                title += f" · {rule_stats['wins']:,} {STATUS_ICONS.get(rule_stats['status'], '')}".rstrip()
+            if rule_profile is not None and not rule_profile.empty:
+                title += f" · ⏱️ {rule_profile['seconds'].iloc[0] * 1000:,.1f} ms"
             
             # Acordeón para cada regla
             with st.expander(title, expanded=(rule['id'] == st.session_state.editing_rule_id)):
                 st.markdown(f"**{get_text(lang, 'rule_prio_lbl')}:** `{rule.get('priority')}`")
+                if rule_stats:
+                    st.caption(get_text(lang, 'rule_stats_cap').format(matches=rule_stats['matches'], wins=rule_stats['wins']))
+                    if rule_stats['status'] != RULE_STATUS_OK:
+                        by = reasons.get(rule_stats['shadowed_by'], rule_stats['shadowed_by'])
+                        msg = get_text(lang, f"rule_status_{rule_stats['status']}")
+                        st.warning(msg.format(by=by) if rule_stats['status'] == RULE_STATUS_SHADOWED else msg)
                 
-                # Listar condiciones (Sólo lectura)
-                for c in rule.get('conditions', []):
-                    op_nice = op_labels.get(c['operator'], c['operator']).split("|")[0].strip()
-                    st.text(f"- {c['column']} {op_nice} {c['value']}")
+                # Listar condiciones (Sólo lectura), con los grupos separados por O
+                for g, group in enumerate(rule_condition_groups(rule)):
+                    if g > 0:
+                        st.text(get_text(lang, 'lbl_or_group'))
+                    for c in group:
+                        op_nice = op_labels.get(c['operator'], c['operator']).split("|")[0].strip()
+                        st.text(f"- {c['column']} {op_nice} {c['value']}")
+
+                # Coste medido (último perfil vigente)
+                if rule_profile is not None and not rule_profile.empty:
+                    _render_rule_profile(lang, rule_profile)
                 
                 # Acciones: Editar, Activar/Desactivar y Eliminar
                 c_edit, c_act, c_del = st.columns([0.3, 0.4, 0.3])
@@ -294,7 +492,7 @@ def render_rules_editor(cols, auto_opts):
                     st.session_state.new_rule_name = rule.get('reason', '')
                     st.session_state.new_rule_priority = rule.get('priority', 'Alta')
                     st.session_state.new_rule_order = rule.get('order', 50)
-                    st.session_state.new_rule_conditions = copy.deepcopy(rule.get('conditions', []))
+                    st.session_state.new_rule_groups = copy.deepcopy(rule_condition_groups(rule)) or [[]]
                     st.session_state.rules_open_trigger = True # Trigger
                     st.rerun()
 
@@ -303,8 +501,7 @@ def render_rules_editor(cols, auto_opts):
                 if c_act.button(label_toggle, key=f"tg_{rule['id']}", use_container_width=True):
                     rule['enabled'] = not rule.get('enabled', True)
                     log_rule_changes(f"Toggle: {rule['reason']}", rules_bkp, st.session_state.priority_rules)
-                    if st.session_state.df_staging is not None:
-                        st.session_state.df_staging = apply_priority_rules(st.session_state.df_staging)
+                    _reapply_rules()
                     st.session_state.rules_open_trigger = True # Trigger
                     st.rerun()
                 
@@ -314,8 +511,7 @@ def render_rules_editor(cols, auto_opts):
                     if st.session_state.editing_rule_id == rule['id']:
                         _reset_builder_state() # Si borramos la que editamos, limpiar
                     log_rule_changes(f"Borrar: {rule['reason']}", rules_bkp, st.session_state.priority_rules)
-                    if st.session_state.df_staging is not None:
-                        st.session_state.df_staging = apply_priority_rules(st.session_state.df_staging)
+                    _reapply_rules()
                     st.session_state.rules_open_trigger = True # Trigger
                     st.rerun()
 
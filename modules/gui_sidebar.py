@@ -10,10 +10,14 @@ Incluye la carga de archivos, la gestión de perfiles de usuario, la configuraci
 import streamlit as st
 import json
 import pandas as pd
-from modules.translator import get_text, translate_column
-from modules.utils import clear_state_and_prepare_reload
+from modules.translator import get_text, translate_column, COLUMN_TRANSLATIONS
+from modules.utils import clear_state_and_prepare_reload, append_files
 from modules.rules_service import get_default_rules, apply_priority_rules
 from modules.audit_service import get_audit_log_excel
+from modules.schema import enforce_schema
+from modules.merge_service import MERGE_POLICIES
+from modules.data_store import DataStore
+from modules.cache_service import content_hash
 
 def _callback_open_rules_editor():
     """Callback simple para activar la bandera que muestra el editor de reglas."""
@@ -60,19 +64,27 @@ def callback_process_config(file) -> bool:
         # Restauración de logs y reglas
         st.session_state.audit_log = d.get("audit_log", [])
         st.session_state.priority_rules = d.get("priority_rules", get_default_rules())
+        st.session_state.rules_as_of = d.get("rules_as_of")
         st.session_state.autocomplete_options = d.get("autocomplete_options", st.session_state.get("autocomplete_options", {}))
 
         # Restauración de los datos (DataFrame)
+        source_key = None
         if "df_staging_data" in d and d["df_staging_data"]:
             # Si el JSON contiene los datos, se reconstruye el DataFrame
-            st.session_state.df_staging = pd.DataFrame.from_records(json.loads(d["df_staging_data"]))
+            # Se restauran los tipos del esquema (el JSON guarda todo como texto/número)
+            st.session_state.df_staging = enforce_schema(pd.DataFrame.from_records(json.loads(d["df_staging_data"])))
+            source_key = content_hash(d["df_staging_data"].encode("utf-8"), "config")
         elif st.session_state.df_staging is not None:
             # Si no hay datos en el JSON pero ya hay datos cargados, reaplicamos las reglas importadas
-            st.session_state.df_staging = apply_priority_rules(st.session_state.df_staging.copy())
+            # (con las mismas reglas sobre los mismos datos, el motor reutiliza su resultado)
+            store = st.session_state.get('data_store')
+            st.session_state.df_staging = apply_priority_rules(
+                st.session_state.df_staging, data_version=store.data_version if store is not None else None
+            )
 
-        # Sincronización del DataFrame original si se cargaron datos nuevos
+        # El estado restaurado pasa a ser la versión estable (nuevo registro de cambios)
         if st.session_state.df_staging is not None:
-            st.session_state.df_original = st.session_state.df_staging.copy()
+            st.session_state.data_store = DataStore(st.session_state.df_staging, source_key=source_key)
         
         # Limpieza de cachés y forzado de actualización de UI
         _clear_rules_editor_cache()
@@ -160,10 +172,54 @@ def render_sidebar(lang: str, df_loaded: bool, cols_ui: list, map_en: dict, cols
         accept_multiple_files=True, 
         on_change=clear_state_and_prepare_reload
     )
+    
+    # --- Sección: Duplicados entre cargas (clave de factura y política de fusión) ---
+    with st.sidebar.expander(get_text(lang, 'merge_expander'), expanded=False):
+        key_options = list(cols_en) if cols_en else list(COLUMN_TRANSLATIONS.keys())
+        key_options += [c for c in st.session_state.merge_key_columns if c not in key_options]
+        st.multiselect(
+            get_text(lang, 'merge_keys_label'),
+            options=key_options,
+            format_func=lambda c: translate_column(lang, c),
+            key='merge_key_columns'
+        )
+        st.radio(
+            get_text(lang, 'merge_policy_label'),
+            options=MERGE_POLICIES,
+            format_func=lambda p: get_text(lang, f'merge_policy_{p}'),
+            key='merge_policy'
+        )
+        st.checkbox(get_text(lang, 'merge_changed_only_label'), key='merge_update_changed_only')
+    
+    # Resumen de la última carga/fusión (se muestra una sola vez)
+    if st.session_state.get('merge_report'):
+        st.toast(get_text(lang, 'merge_report').format(**st.session_state.merge_report))
+        st.session_state.merge_report = None
 
     # --- Lógica condicional: Solo si hay datos cargados ---
     if df_loaded:
         
+        # 0. Carga incremental: añadir archivos sin reemplazar los datos actuales
+        if not st.session_state.get('streaming_load'):
+            if 'append_uploader_ver' not in st.session_state:
+                st.session_state.append_uploader_ver = 0
+            with st.sidebar.expander(get_text(lang, 'append_files_expander'), expanded=False):
+                append_up = st.file_uploader(
+                    get_text(lang, 'append_files_label'),
+                    type=["xlsx"],
+                    accept_multiple_files=True,
+                    key=f"append_uploader_{st.session_state.append_uploader_ver}"
+                )
+                if st.button(get_text(lang, 'append_files_button'), disabled=not append_up):
+                    n_added = append_files(append_up, lang)
+                    if n_added:
+                        # Nueva clave => el uploader se vacía y no se vuelve a procesar
+                        st.session_state.append_uploader_ver += 1
+                        if 'editor_key_ver' in st.session_state:
+                            st.session_state.editor_key_ver += 1
+                        st.toast(get_text(lang, 'append_files_success').format(n=n_added))
+                        st.rerun()
+        
         # 1. Filtro Especial por Regla de Prioridad
         if 'Priority_Reason' in st.session_state.df_staging.columns:
             st.sidebar.markdown("### 🔍 Filtrar por Regla")
@@ -264,7 +320,8 @@ def render_sidebar(lang: str, df_loaded: bool, cols_ui: list, map_en: dict, cols
         st.sidebar.markdown(f"### {get_text(lang, 'config_header')}")
         
         # Serializamos el DataFrame a JSON para guardarlo en el archivo de config
-        df_json = st.session_state.df_staging.to_json(orient="records") if st.session_state.df_staging is not None else None
+        # Fechas en ISO 8601 para que se puedan volver a tipar al cargar la configuración
+        df_json = st.session_state.df_staging.to_json(orient="records", date_format="iso") if st.session_state.df_staging is not None else None
         
         config_data = {
             "filtros_activos": st.session_state.filtros_activos,
@@ -273,6 +330,7 @@ def render_sidebar(lang: str, df_loaded: bool, cols_ui: list, map_en: dict, cols
             "username": st.session_state.username,
             "audit_log": st.session_state.audit_log,
             "priority_rules": st.session_state.priority_rules,
+            "rules_as_of": st.session_state.get("rules_as_of"),
             "autocomplete_options": st.session_state.autocomplete_options,
             "df_staging_data": df_json # Guardamos los datos también
         }
@@ -14,9 +14,10 @@ import pandas as pd
 import json
 import numpy as np
 from modules.translator import get_text, translate_column
-from modules.utils import to_excel, recalculate_row_status
-from modules.rules_service import apply_priority_rules
+from modules.utils import to_excel, refresh_dirty_rows, finalize_streaming_load, get_data_store, get_rule_explain_index
 from modules.audit_service import log_general_change
+from modules.schema import enforce_schema, as_text, to_datetime_series, concat_frames
+from modules.filters import resumen_agrupado
 import streamlit_hotkeys as hotkeys
 
 # Límite para desactivar tooltips y mejorar rendimiento en tablas grandes
@@ -92,13 +93,14 @@ def modal_find_replace(col_map, lang):
         if not find_txt:
             st.error("Ingrese valor a buscar.")
         else:
-            df = st.session_state.df_staging.copy()
+            df = st.session_state.df_staging
             if col_en in df.columns:
                 # 1. Crear Máscara Principal (Búsqueda)
+                col_txt = as_text(df[col_en]) if pd.api.types.is_datetime64_any_dtype(df[col_en].dtype) else df[col_en].astype(str)
                 if mode == "Coincidencia Exacta":
-                    mask_main = (df[col_en].astype(str) == str(find_txt)) 
+                    mask_main = (col_txt == str(find_txt)) 
                 else:
-                    mask_main = (df[col_en].astype(str).str.contains(str(find_txt), case=False, na=False))
+                    mask_main = (col_txt.str.contains(str(find_txt), case=False, na=False))
                 
                 # 2. Aplicar Filtros Adicionales (AND)
                 mask_filters = pd.Series(True, index=df.index)
@@ -115,12 +117,15 @@ def modal_find_replace(col_map, lang):
                 if count > 0:
                     # 3. Ejecutar Reemplazo
                     final_val = replace_val
-                    # Intentar mantener tipo numérico si aplica
+                    # Intentar mantener tipo numérico / fecha si aplica
                     if pd.api.types.is_numeric_dtype(df[col_en].dtype):
                         try: final_val = pd.to_numeric(replace_val)
                         except: pass
+                    elif pd.api.types.is_datetime64_any_dtype(df[col_en].dtype):
+                        final_val = pd.to_datetime(replace_val, errors='coerce')
                     
-                    df.loc[final_mask, col_en] = final_val
+                    # Escritura registrada (permite revertir en O(cambios))
+                    get_data_store().write_cells(df, col_en, df.index[final_mask], final_val)
                     
                     # 4. Actualizar Autocompletado (Aprender nuevo valor)
                     if col_en in st.session_state.autocomplete_options:
@@ -133,8 +138,7 @@ def modal_find_replace(col_map, lang):
                     # 5. Auditoría y Recálculo
                     log_general_change("Find/Replace", "Bulk Replace", f"Editadas {count} filas en '{col_en}'")
                     
-                    df = apply_priority_rules(df)
-                    df = recalculate_row_status(df, lang) # Recalcular estado tras edición
+                    df = refresh_dirty_rows(df, lang) # Recalcular sólo las filas editadas
                     st.session_state.df_staging = df
                     
                     # Limpiar estado del editor para forzar refresco
@@ -185,20 +189,19 @@ def modal_bulk_edit(indices, col_map, lang):
     if st.button("Aplicar", type="primary"):
         if val is not None:
             try:
-                df = st.session_state.df_staging.copy()
+                df = st.session_state.df_staging
                 final = val
-                # Manejo de tipos numéricos
+                # Manejo de tipos numéricos y de fecha
                 if c_en in df.columns and pd.api.types.is_numeric_dtype(df[c_en].dtype):
                     try: final = pd.to_numeric(val)
                     except: pass
+                elif c_en in df.columns and pd.api.types.is_datetime64_any_dtype(df[c_en].dtype):
+                    final = pd.to_datetime(val, errors='coerce')
                 
-                # Aplicación de cambios fila por fila (seguro)
-                cnt = 0
-                for i in indices:
-                    if i in df.index: 
-                        df.at[i, c_en] = final; cnt+=1
-                    elif str(i) in df.index: 
-                        df.at[str(i), c_en] = final; cnt+=1
+                # Filas seleccionadas presentes (el índice de trabajo es texto)
+                labels = [str(i) for i in indices if str(i) in df.index]
+                cnt = len(labels)
+                get_data_store().write_cells(df, c_en, labels, final)
                 
                 if cnt > 0:
                     # Actualizar autocompletado
@@ -212,8 +215,7 @@ def modal_bulk_edit(indices, col_map, lang):
                     # Auditoría y Recálculo
                     log_general_change("Bulk", "Edit", f"{cnt} filas en {c_en}")
                     
-                    df = apply_priority_rules(df)
-                    df = recalculate_row_status(df, lang)
+                    df = refresh_dirty_rows(df, lang)
                     st.session_state.df_staging = df
                     
                     # Refresco de UI
@@ -256,6 +258,41 @@ def render_kpi_dashboard(lang, df):
     # Evitar división por cero
     c3.metric(get_text(lang, 'kpi_avg_amount'), f"${(tot/len(df) if len(df) else 0):,.2f}")
 
+# --- ESTADO DE CARGA EN STREAMING ---
+@st.fragment(run_every=1)
+def render_streaming_status(lang):
+    """
+    Muestra el avance de una carga en streaming y, cuando el hilo lector
+    termina, completa la carga y recarga la aplicación con todos los datos.
+    """
+    info = st.session_state.get('streaming_load')
+    if not info:
+        return
+    
+    job = info["job"]
+    if job.done:
+        finalize_streaming_load(lang)
+        st.rerun()
+    
+    st.info(get_text(lang, 'streaming_progress').format(name=job.name, n=job.rows_loaded))
+
+def _priority_tooltips(labels, reasons, lang) -> list:
+    """
+    Texto del tooltip de prioridad: el motivo final más las otras reglas que
+    también coinciden en la fila (consultadas en el bitmap de coincidencias).
+    """
+    index = get_rule_explain_index(labels)
+    if index is None:
+        return list(reasons)
+    tips = []
+    for label, reason in zip(labels, reasons):
+        info = index.explain(label)
+        if info and info['shadowed']:
+            others = ", ".join(r.get('reason', '') for r in info['shadowed'])
+            reason = f"{reason}\n{get_text(lang, 'tooltip_also_matched').format(rules=others)}"
+        tips.append(reason)
+    return tips
+
 # --- FRAGMENTO OPTIMIZADO (Lógica del Editor Principal) ---
 @st.fragment
 def render_editor_fragment(df_disp, col_map, lang, cc, h_data, original_staging_df):
@@ -301,7 +338,7 @@ def render_editor_fragment(df_disp, col_map, lang, cc, h_data, original_staging_
                         target_idxs = pd.to_numeric(clean_idxs, errors='coerce')
                     # Obtener razones de prioridad
                     reasons = master.reindex(target_idxs)['Priority_Reason'].fillna("Sin información")
-                    tt_df[col_prio_ui] = reasons.values
+                    tt_df[col_prio_ui] = _priority_tooltips(target_idxs, reasons.values, lang)
             styled_data = df_disp.style.set_tooltips(tt_df)
         except:
             # Fallback seguro si falla el estilado
@@ -336,7 +373,12 @@ def render_editor_fragment(df_disp, col_map, lang, cc, h_data, original_staging_
     def cb_add():
         """Añade una fila vacía al final."""
         idx = int(pd.to_numeric(st.session_state.df_staging.index, errors='coerce').max() + 1)
-        row = {c: False if c=="Seleccionar" else "" for c in st.session_state.editor_state.columns}
+        ed_state = st.session_state.editor_state
+        # Las columnas de fecha empiezan vacías (NaT) para conservar su tipo
+        row = {
+            c: False if c=="Seleccionar" else (None if pd.api.types.is_datetime64_any_dtype(ed_state[c].dtype) else "")
+            for c in ed_state.columns
+        }
         st.session_state.editor_state = pd.concat([pd.DataFrame([row], index=[str(idx)]), st.session_state.editor_state])
         st.session_state.editor_key_ver += 1
         log_general_change("UI", "Add Row", f"Fila {idx}")
@@ -345,7 +387,8 @@ def render_editor_fragment(df_disp, col_map, lang, cc, h_data, original_staging_
     def cb_del(idxs):
         """Borra las filas seleccionadas."""
         df = st.session_state.df_staging
-        drop = [str(i) for i in idxs if str(i) in df.index.astype(str)]
+        drop = [str(i) for i in idxs if str(i) in df.index]
+        get_data_store().record_delete(df, drop)
         st.session_state.df_staging = df.drop(drop, errors='ignore')
         log_general_change("UI", "Del Row", f"{len(drop)} filas")
         st.session_state.editor_state = None
@@ -363,17 +406,26 @@ def render_editor_fragment(df_disp, col_map, lang, cc, h_data, original_staging_
             # Restaurar nombres de columnas al inglés (Real)
             ed.columns = [col_map.get(c,c) for c in ed.columns]
             
-            st.session_state.df_staging.index = st.session_state.df_staging.index.astype(str)
-            st.session_state.df_staging.update(ed)
+            store = get_data_store()
+            for c in ed.columns:
+                # Las fechas editadas (date/texto) vuelven a datetime64
+                if c in st.session_state.df_staging.columns and pd.api.types.is_datetime64_any_dtype(st.session_state.df_staging[c].dtype):
+                    ed[c] = to_datetime_series(ed[c])
+            # Sólo se escriben (y registran) las celdas que cambian
+            store.apply_frame_edits(st.session_state.df_staging, ed)
             
             # Detectar filas nuevas añadidas en el editor
             new = ed.index.difference(st.session_state.df_staging.index)
             if not new.empty: 
-                st.session_state.df_staging = pd.concat([st.session_state.df_staging, ed.loc[new]])
+                store.record_insert(new)
+                # Sólo se tipan las filas nuevas; concat_frames une las categorías sin
+                # recodificar a texto las columnas categóricas de todo el conjunto.
+                staging = st.session_state.df_staging
+                new_rows = enforce_schema(ed.loc[new].reindex(columns=staging.columns.union(ed.columns, sort=False)))
+                st.session_state.df_staging = concat_frames([staging, new_rows], ignore_index=False)
             
-            # --- ACTUALIZACIÓN CRÍTICA ---
-            st.session_state.df_staging = apply_priority_rules(st.session_state.df_staging)
-            st.session_state.df_staging = recalculate_row_status(st.session_state.df_staging, lang)
+            # --- ACTUALIZACIÓN CRÍTICA (sólo filas editadas o nuevas) ---
+            st.session_state.df_staging = refresh_dirty_rows(st.session_state.df_staging, lang)
             
             log_general_change("UI", "Save", "Borrador guardado")
             st.session_state.editor_state = None; st.session_state.current_data_hash = None
@@ -382,14 +434,14 @@ def render_editor_fragment(df_disp, col_map, lang, cc, h_data, original_staging_
 
     def cb_rev():
         """Revierte cambios al último estado estable (Original/Commit)."""
-        st.session_state.df_staging = st.session_state.df_original.copy()
+        st.session_state.df_staging = get_data_store().revert(st.session_state.df_staging)
         st.session_state.editor_state = None; st.session_state.current_data_hash = None
         log_general_change("UI", "Revert", "Revertido")
         st.rerun()
 
     def cb_com():
         """Hace commit del estado actual como el nuevo punto de restauración."""
-        st.session_state.df_original = st.session_state.df_staging.copy()
+        get_data_store().commit(st.session_state.df_staging)
         log_general_change("UI", "Commit", "Estable guardado")
         st.success("Hecho.")
 
@@ -431,6 +483,14 @@ def render_detailed_view(lang, df_filtered, df_master, col_map, all_cols):
     cols_show = [c for c in st.session_state.columnas_visibles if c in df_filtered.columns]
     if not cols_show: st.warning(get_text(lang, 'warning_select_cols')); return 
 
+    # Durante una carga en streaming sólo se muestra la vista previa (sin edición)
+    if st.session_state.get('streaming_load'):
+        st.caption(get_text(lang, 'streaming_preview_info'))
+        df_prev = df_filtered[cols_show].copy()
+        df_prev.columns = [translate_column(lang, c) for c in df_prev.columns]
+        st.dataframe(df_prev, height=600, use_container_width=True)
+        return
+
     # Mapeo para ordenamiento
     prio_map = {"🚩 Maxima Prioridad": 4, "Maxima Prioridad": 4, "Alta": 3, "Media": 2, "Minima": 1}
     
@@ -451,6 +511,10 @@ def render_detailed_view(lang, df_filtered, df_master, col_map, all_cols):
 
     # Preparar columnas visibles
     df_v = df_v[cols_show].copy()
+    # Las columnas categóricas se editan como texto (admiten valores nuevos)
+    for c in df_v.columns:
+        if isinstance(df_v[c].dtype, pd.CategoricalDtype):
+            df_v[c] = df_v[c].astype(object)
     if "Seleccionar" not in df_v.columns: df_v.insert(0, "Seleccionar", False)
     
     # Traducir columnas para visualización
@@ -484,7 +548,14 @@ def render_detailed_view(lang, df_filtered, df_master, col_map, all_cols):
         # Si tiene autocompletado, usar Selectbox
         if cen in st.session_state.autocomplete_options:
             cc[cui] = st.column_config.SelectboxColumn(f"{cui} 🔽", options=sorted(st.session_state.autocomplete_options[cen]))
-        # Si parece fecha, forzar texto para evitar conversiones erróneas
+        # Fechas: se guardan como datetime64 y sólo se formatean al mostrarlas
+        elif pd.api.types.is_datetime64_any_dtype(df_disp[cui].dtype):
+            s_dt = df_disp[cui].dropna()
+            if (s_dt != s_dt.dt.normalize()).any():
+                cc[cui] = st.column_config.DatetimeColumn(f"{cui}", format="YYYY-MM-DD HH:mm:ss")
+            else:
+                cc[cui] = st.column_config.DateColumn(f"{cui}", format="YYYY-MM-DD")
+        # Si parece fecha pero no se pudo tipar, forzar texto para evitar conversiones erróneas
         elif "Date" in cen and "Age" not in cen:
             cc[cui] = st.column_config.TextColumn(f"{cui}", help="YYYY-MM-DD")
 
@@ -505,17 +576,8 @@ def render_grouped_view(lang, df, col_map, all_cols):
     gen = col_map.get(gui, gui)
     
     if gen:
-        d = df.copy()
-        # Asegurar tipos numéricos para agregación
-        for c in ['Total', 'Invoice Date Age']: 
-            if c in d: d[c] = pd.to_numeric(d[c], errors='coerce')
-            
-        agg = {'Total': ['sum','count','mean']}
-        if 'Invoice Date Age' in d: agg['Invoice Date Age'] = ['mean']
-        
-        # Crear agrupación
-        res = d.groupby(gen).agg(agg)
-        res.columns = ['_'.join(c).strip() for c in res.columns]
+        # Agregados por grupo (mismo cálculo que expone la API)
+        res = resumen_agrupado(df, gen)
         
         st.dataframe(res, use_container_width=True)
         st.download_button(get_text(lang, 'download_button_short'), to_excel(res), "agrupado.xlsx")
\ No newline at end of file
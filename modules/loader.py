@@ -3,10 +3,20 @@
 Módulo de Carga de Datos (Loader).
 
 Módulo encargado de la carga y validación de datos básica desde un archivo
-Excel que contiene las facturas.
+Excel que contiene las facturas. Incluye la lectura paralela de varios libros
+(un proceso por archivo/hoja) usada por la carga masiva de la aplicación y la
+lectura en streaming (por bloques, en segundo plano) de libros muy grandes.
 """
 
+import io
+import os
+import multiprocessing
+import threading
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import openpyxl
 import pandas as pd
+from modules.schema import get_column_kind, to_category, concat_frames, KIND_NUMERIC, KIND_DATE, KIND_CATEGORY, KIND_TEXT
 
 def cargar_datos(ruta_archivo: str) -> pd.DataFrame:
     """
@@ -40,4 +50,314 @@ def cargar_datos(ruta_archivo: str) -> pd.DataFrame:
     except Exception as e:
         # Esto capturará errores si el archivo no es un Excel válido
         print(f" Error al cargar el archivo Excel: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame()
+
+
+# --- LIMPIEZA Y TIPADO DE COLUMNAS ---
+
+# Versión de la lógica de limpieza. Se guarda junto a cada entrada de la caché
+# de ingesta (modules/cache_service.py): INCREMENTAR al cambiar
+# clean_invoice_frame para invalidar las entradas generadas con la lógica anterior.
+LOADER_VERSION = 3
+
+
+def clean_invoice_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Limpia y tipa un DataFrame de facturas recién leído (vectorizado).
+
+    El tipo de cada columna sale del esquema declarativo (modules/schema.py):
+    - 'numeric': a número, nulos a 0.
+    - 'date': datetime64 (fechas inválidas o vacías como NaT). El formato de
+      visualización se aplica en la capa de vistas.
+    - 'category': texto de baja cardinalidad como dtype 'category', nulos a "".
+    - 'text': texto, nulos a "".
+
+    La función es idempotente: aplicarla de nuevo sobre un resultado ya limpio
+    (p. ej. tras concatenar varios archivos) sólo rellena los huecos.
+
+    Args:
+        df (pd.DataFrame): Datos crudos.
+
+    Returns:
+        pd.DataFrame: Datos limpios y tipados.
+    """
+    df = df.copy()
+    # Limpieza de nombres de columna
+    df.columns = [str(col).strip() for col in df.columns]
+    columnas_originales = list(df.columns)
+
+    # Tipos de columna según el esquema declarativo
+    kinds = {col: get_column_kind(col) for col in columnas_originales}
+    numeric_cols = [col for col in columnas_originales if kinds[col] == KIND_NUMERIC]
+    date_cols = [col for col in columnas_originales if kinds[col] == KIND_DATE]
+    category_cols = [col for col in columnas_originales if kinds[col] == KIND_CATEGORY]
+    string_cols = [col for col in columnas_originales if kinds[col] == KIND_TEXT]
+
+    # Conversión de tipos Vectorizada (Más rápida que bucles)
+    if string_cols:
+        df[string_cols] = df[string_cols].fillna("").astype(str)
+    for col in category_cols:
+        df[col] = to_category(df[col])
+    if numeric_cols:
+        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
+    if date_cols:
+        df[date_cols] = df[date_cols].apply(pd.to_datetime, errors='coerce')
+
+    return df
+
+
+# --- LECTURA PARALELA DE VARIOS ARCHIVOS ---
+
+# Por debajo de este tamaño total (bytes) la lectura serial es más rápida que
+# arrancar el pool de procesos.
+PARALLEL_MIN_TOTAL_BYTES = 5 * 1024 * 1024
+# Número máximo de procesos lectores (openpyxl es CPU-bound y no libera el GIL).
+MAX_INGEST_WORKERS = min(8, os.cpu_count() or 1)
+# Si es True, se leen todas las hojas de cada libro; si no, sólo la primera
+# (comportamiento histórico de pd.read_excel).
+INGEST_ALL_SHEETS = False
+
+
+def list_excel_sheets(content: bytes) -> list:
+    """
+    Devuelve los nombres de las hojas de un libro Excel sin leer sus celdas.
+
+    Args:
+        content (bytes): Contenido binario del archivo .xlsx.
+
+    Returns:
+        list: Nombres de las hojas en el orden del libro.
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def read_excel_sheet(content: bytes, sheet_name=0) -> pd.DataFrame:
+    """
+    Lee una hoja de un libro Excel en memoria.
+
+    Es una función de módulo (no una lambda ni un método) para que pueda
+    enviarse a los procesos del pool.
+
+    Args:
+        content (bytes): Contenido binario del archivo .xlsx.
+        sheet_name (str | int): Hoja a leer (0 = primera hoja).
+
+    Returns:
+        pd.DataFrame: Datos crudos de la hoja.
+    """
+    return pd.read_excel(io.BytesIO(content), engine="openpyxl", header=0, sheet_name=sheet_name)
+
+
+def read_excel_sources(sources: list, all_sheets: bool = INGEST_ALL_SHEETS, on_progress=None) -> list:
+    """
+    Lee varios libros Excel (y opcionalmente todas sus hojas) en paralelo.
+
+    Cada par (archivo, hoja) es una tarea independiente del pool de procesos.
+    Si sólo hay una tarea o el volumen total es pequeño, se lee en serie para
+    no pagar el coste de arrancar los procesos.
+
+    Args:
+        sources (list): Lista de tuplas (nombre_archivo, contenido_bytes).
+        all_sheets (bool): Leer todas las hojas de cada libro (no sólo la primera).
+        on_progress (callable, optional): Función llamada como
+            on_progress(nombre_archivo, archivos_terminados, total_archivos)
+            cada vez que termina de leerse un archivo completo.
+
+    Returns:
+        list: Un DataFrame por archivo (sus hojas concatenadas), en el mismo
+              orden que 'sources'.
+    """
+    tasks = []
+    for file_idx, (name, content) in enumerate(sources):
+        sheets = list_excel_sheets(content) if all_sheets else [0]
+        for sheet in sheets:
+            tasks.append((file_idx, name, content, sheet))
+
+    if not tasks:
+        return []
+
+    pending_per_file = defaultdict(int)
+    for file_idx, _, _, _ in tasks:
+        pending_per_file[file_idx] += 1
+    files_done = 0
+
+    def _task_finished(file_idx, name):
+        nonlocal files_done
+        pending_per_file[file_idx] -= 1
+        if pending_per_file[file_idx] == 0:
+            files_done += 1
+            if on_progress:
+                on_progress(name, files_done, len(sources))
+
+    sheet_frames = [None] * len(tasks)
+    total_bytes = sum(len(content) for _, content in sources)
+    use_parallel = len(tasks) > 1 and total_bytes >= PARALLEL_MIN_TOTAL_BYTES and MAX_INGEST_WORKERS > 1
+
+    if not use_parallel:
+        for pos, (file_idx, name, content, sheet) in enumerate(tasks):
+            sheet_frames[pos] = read_excel_sheet(content, sheet)
+            _task_finished(file_idx, name)
+        return _group_frames_by_file(tasks, sheet_frames, len(sources))
+
+    # 'spawn' evita heredar hilos del servidor (Streamlit) al hacer fork.
+    ctx = multiprocessing.get_context("spawn")
+    workers = min(MAX_INGEST_WORKERS, len(tasks))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {
+            pool.submit(read_excel_sheet, content, sheet): (pos, file_idx, name)
+            for pos, (file_idx, name, content, sheet) in enumerate(tasks)
+        }
+        for fut in as_completed(futures):
+            pos, file_idx, name = futures[fut]
+            sheet_frames[pos] = fut.result()
+            _task_finished(file_idx, name)
+
+    return _group_frames_by_file(tasks, sheet_frames, len(sources))
+
+
+def _group_frames_by_file(tasks: list, sheet_frames: list, n_files: int) -> list:
+    """Une las hojas leídas de cada archivo en un único DataFrame por archivo."""
+    per_file = [[] for _ in range(n_files)]
+    for (file_idx, _, _, _), frame in zip(tasks, sheet_frames):
+        per_file[file_idx].append(frame)
+    return [frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True) for frames in per_file]
+
+
+# --- LECTURA EN STREAMING (openpyxl read_only) ---
+
+# Filas por bloque en la lectura en streaming. El primer bloque es la vista
+# previa que se muestra mientras se carga el resto.
+STREAM_CHUNK_ROWS = 5000
+# Tamaño mínimo (bytes) de un archivo para cargarlo en streaming.
+STREAM_MIN_BYTES = 20 * 1024 * 1024
+
+
+def _normalize_header(header: tuple) -> list:
+    """Nombra las columnas igual que pd.read_excel ('Unnamed: N', duplicados 'X.1')."""
+    columns = []
+    seen = defaultdict(int)
+    for i, value in enumerate(header):
+        name = f"Unnamed: {i}" if value is None or str(value).strip() == "" else value
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        columns.append(name)
+    return columns
+
+
+def iter_excel_chunks(content: bytes, chunk_size: int = STREAM_CHUNK_ROWS, sheet_name=None):
+    """
+    Recorre una hoja Excel fila a fila (modo read_only) y entrega bloques.
+
+    A diferencia de pd.read_excel, nunca se materializa la hoja completa como
+    DataFrame de tipo 'object': sólo el bloque en curso.
+
+    Args:
+        content (bytes): Contenido binario del archivo .xlsx.
+        chunk_size (int): Número de filas por bloque.
+        sheet_name (str, optional): Hoja a leer (por defecto la primera).
+
+    Yields:
+        pd.DataFrame: Bloques de datos crudos con la cabecera del archivo.
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name] if sheet_name is not None else wb.worksheets[0]
+        rows = ws.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _normalize_header(header)
+        n_cols = len(columns)
+
+        buffer = []
+        for row in rows:
+            # Igual que pd.read_excel: las filas totalmente vacías se omiten
+            if all(v is None for v in row):
+                continue
+            if len(row) != n_cols:
+                row = tuple(row[:n_cols]) + (None,) * (n_cols - len(row))
+            buffer.append(row)
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame.from_records(buffer, columns=columns)
+                buffer = []
+        if buffer:
+            yield pd.DataFrame.from_records(buffer, columns=columns)
+    finally:
+        wb.close()
+
+
+class StreamingLoad:
+    """
+    Carga en segundo plano (hilo) de un libro Excel grande por bloques.
+
+    Cada bloque se limpia con clean_invoice_frame en cuanto se lee, de modo que
+    la interfaz puede mostrar el primer bloque mientras se procesa el resto.
+    No usa Streamlit: la interfaz consulta su estado (rows_loaded, done, error).
+    """
+
+    def __init__(self, name: str, content: bytes, chunk_size: int = STREAM_CHUNK_ROWS):
+        self.name = name
+        self.chunk_size = chunk_size
+        self.frames = []
+        self.rows_loaded = 0
+        self.error = None
+        self.first_chunk_ready = threading.Event()
+        self._finished = threading.Event()
+        self._cancelled = threading.Event()
+        self._content = content
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self) -> "StreamingLoad":
+        """Arranca la lectura en segundo plano y devuelve la propia tarea."""
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            for chunk in iter_excel_chunks(self._content, self.chunk_size):
+                if self._cancelled.is_set():
+                    return
+                cleaned = clean_invoice_frame(chunk)
+                self.frames.append(cleaned)
+                self.rows_loaded += len(cleaned)
+                self.first_chunk_ready.set()
+        except Exception as e:
+            self.error = e
+        finally:
+            # Liberar el contenido binario en cuanto deja de ser necesario
+            self._content = None
+            self.first_chunk_ready.set()
+            self._finished.set()
+
+    def cancel(self):
+        """Solicita detener la lectura (se respeta entre bloques)."""
+        self._cancelled.set()
+
+    @property
+    def done(self) -> bool:
+        """True cuando la lectura terminó (con éxito, error o cancelación)."""
+        return self._finished.is_set()
+
+    def preview(self) -> pd.DataFrame:
+        """Devuelve el primer bloque limpio (vacío si aún no hay datos)."""
+        return self.frames[0] if self.frames else pd.DataFrame()
+
+    def result(self) -> pd.DataFrame:
+        """
+        Une todos los bloques leídos en un único DataFrame limpio.
+
+        Los bloques ya están limpios, así que sólo se concatenan (unificando
+        las categorías) y se liberan: el conjunto no queda duplicado en memoria
+        una vez unido. Se llama una sola vez, al terminar la lectura.
+        """
+        frames, self.frames = self.frames, []
+        if not frames:
+            return pd.DataFrame()
+        return concat_frames(frames)
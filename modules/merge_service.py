@@ -0,0 +1,256 @@
+# modules/merge_service.py
+"""
+Servicio de Fusión y Deduplicación (Merge Service).
+
+Evita que las exportaciones solapadas dupliquen facturas (e inflen los KPIs).
+Cada fila se identifica por una clave de negocio configurable (por defecto
+'Invoice #'); la clave se convierte en un hash de 64 bits por fila y la
+búsqueda de coincidencias se hace con un índice hash de pandas, de forma
+totalmente vectorizada (sin bucles por fila).
+
+Políticas:
+- 'keep_latest': la fila más reciente (la que llega después) actualiza a la
+  existente. Con 'update_changed_only' sólo se escriben las celdas distintas.
+- 'keep_first': se conserva la fila existente y se ignora la nueva (las
+  coincidencias con diferencias se cuentan como 'omitidas').
+
+Las ediciones pendientes (sin confirmar) nunca se sobrescriben: la fila nueva
+se compara con el valor confirmado de cada celda y, si el origen trae otro
+valor para una celda editada, se conserva la edición y la fila se cuenta
+como 'conflicto'.
+
+Las filas sin clave (vacía o 0) nunca se consideran duplicadas.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.util import hash_pandas_object
+from modules.schema import as_text, add_categories, values_equal, to_datetime_series
+
+MERGE_POLICY_KEEP_LATEST = "keep_latest"
+MERGE_POLICY_KEEP_FIRST = "keep_first"
+MERGE_POLICIES = [MERGE_POLICY_KEEP_LATEST, MERGE_POLICY_KEEP_FIRST]
+
+# Clave de negocio por defecto
+DEFAULT_MERGE_KEYS = ["Invoice #"]
+
+# Contadores del resumen de una fusión (ver merge_into)
+MERGE_REPORT_KEYS = ["inserted", "updated", "unchanged", "skipped", "conflicts", "duplicates_in_load"]
+
+# Columnas calculadas por la aplicación: no se comparan ni se copian al fusionar
+DERIVED_COLUMNS = ["Priority", "Priority_Reason", "Row Status", "Seleccionar"]
+
+
+def _key_frame(df: pd.DataFrame, key_columns: list) -> pd.DataFrame:
+    """Normaliza las columnas clave para que el hash no dependa del dtype de cada archivo."""
+    keys = {}
+    for col in key_columns:
+        series = df[col]
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            keys[col] = series.astype("float64")
+        else:
+            # Texto y categorías igual: 'ACME ' (category) == 'ACME' (object)
+            keys[col] = as_text(series).str.strip().astype(object)
+    return pd.DataFrame(keys, index=df.index)
+
+
+def _valid_keys(keys: pd.DataFrame) -> np.ndarray:
+    """Máscara de filas con clave válida (ninguna columna clave vacía o 0)."""
+    valid = np.ones(len(keys), dtype=bool)
+    for col in keys.columns:
+        series = keys[col]
+        if pd.api.types.is_numeric_dtype(series.dtype):
+            valid &= (series.fillna(0) != 0).to_numpy()
+        else:
+            valid &= (as_text(series) != "").to_numpy()
+    return valid
+
+
+def _key_hashes(df: pd.DataFrame, key_columns: list) -> tuple:
+    """
+    Calcula el hash de la clave de cada fila.
+
+    Returns:
+        tuple: (hashes uint64, máscara de filas con clave válida, claves normalizadas).
+    """
+    keys = _key_frame(df, key_columns)
+    hashes = hash_pandas_object(keys, index=False).to_numpy()
+    return hashes, _valid_keys(keys), keys
+
+
+def _committed_values(current: pd.Series, labels: pd.Index, pending: dict) -> tuple:
+    """
+    Valores confirmados de una columna para las filas coincidentes.
+
+    Args:
+        current (pd.Series): Valores actuales (por posición).
+        labels (pd.Index): Etiquetas de fila de esos valores.
+        pending (dict): Ediciones pendientes de la columna {fila: valor_anterior}.
+
+    Returns:
+        tuple: (serie con el valor confirmado de cada fila, máscara de celdas editadas).
+    """
+    edited = labels.isin(list(pending)) if pending else np.zeros(len(labels), dtype=bool)
+    if not edited.any():
+        return current, edited
+    values = current.astype(object).to_numpy().copy()
+    values[edited] = [pending[l] for l in labels[edited]]
+    committed = pd.Series(values).infer_objects()
+    if pd.api.types.is_datetime64_any_dtype(current.dtype):
+        committed = to_datetime_series(committed)
+    return committed, edited
+
+
+def has_merge_keys(df: pd.DataFrame, key_columns: list) -> bool:
+    """True si el DataFrame contiene todas las columnas clave."""
+    return bool(key_columns) and all(c in df.columns for c in key_columns)
+
+
+def deduplicate_frame(df: pd.DataFrame, key_columns: list, policy: str = MERGE_POLICY_KEEP_LATEST) -> tuple:
+    """
+    Elimina filas repetidas por clave dentro de un mismo DataFrame.
+
+    Args:
+        df (pd.DataFrame): Datos (p. ej. la concatenación de varios archivos, en orden de carga).
+        key_columns (list): Columnas que forman la clave de negocio.
+        policy (str): 'keep_latest' conserva la última aparición; 'keep_first' la primera.
+
+    Returns:
+        tuple: (DataFrame sin duplicados, número de filas eliminadas).
+    """
+    if df.empty or not has_merge_keys(df, key_columns):
+        return df, 0
+    # Se comparan los valores reales de la clave (no sólo su hash)
+    keys = _key_frame(df, key_columns)
+    keep = "last" if policy == MERGE_POLICY_KEEP_LATEST else "first"
+    dup = keys.duplicated(keep=keep).to_numpy() & _valid_keys(keys)
+    n_dup = int(dup.sum())
+    if n_dup == 0:
+        return df, 0
+    return df[~dup], n_dup
+
+
+def merge_into(base: pd.DataFrame, incoming: pd.DataFrame, key_columns: list,
+               policy: str = MERGE_POLICY_KEEP_LATEST, update_changed_only: bool = True,
+               pending: dict = None) -> dict:
+    """
+    Fusiona un lote nuevo sobre un DataFrame existente usando la clave de negocio.
+
+    'base' se modifica IN SITU con las actualizaciones (política keep_latest).
+    Las filas sin coincidencia se devuelven para que el llamador las procese
+    (reglas, estado de fila) y las añada.
+
+    Args:
+        base (pd.DataFrame): Datos existentes.
+        incoming (pd.DataFrame): Lote nuevo ya limpio.
+        key_columns (list): Columnas que forman la clave de negocio.
+        policy (str): 'keep_latest' o 'keep_first'.
+        update_changed_only (bool): Escribir sólo las celdas que cambian (True)
+                                    o todas las columnas comunes de la fila (False).
+        pending (dict, optional): Ediciones sin confirmar de 'base'
+                                  {columna: {fila: valor_confirmado}} (el registro
+                                  del DataStore). Esas celdas se comparan por su
+                                  valor confirmado y nunca se sobrescriben.
+
+    Returns:
+        dict: {
+            'inserted_rows': DataFrame con las filas nuevas,
+            'updated_index': índice (de 'base') de las filas actualizadas,
+            'matched_index': índice (de 'base') de todas las filas coincidentes,
+            'written_cells': {columna: índice (de 'base') de las celdas escritas},
+            'inserted', 'updated', 'unchanged', 'skipped', 'conflicts',
+            'duplicates_in_load': contadores ('skipped': coincidencias con
+            diferencias ignoradas por keep_first; 'conflicts': filas con
+            ediciones pendientes que el origen trae con otro valor)
+        }
+    """
+    pending = pending or {}
+    result = {
+        "inserted_rows": incoming,
+        "updated_index": base.index[:0],
+        "matched_index": base.index[:0],
+        "written_cells": {},
+        "inserted": len(incoming), "updated": 0, "unchanged": 0, "skipped": 0, "conflicts": 0,
+        "duplicates_in_load": 0,
+    }
+    if incoming.empty or not has_merge_keys(base, key_columns) or not has_merge_keys(incoming, key_columns):
+        return result
+
+    # 1. Duplicados dentro del propio lote
+    incoming, n_dup = deduplicate_frame(incoming, key_columns, policy)
+    result["duplicates_in_load"] = n_dup
+
+    # 2. Índice hash de la base (última aparición si la base ya tenía duplicados)
+    base_hashes, base_valid, base_keys = _key_hashes(base, key_columns)
+    inc_hashes, inc_valid, inc_keys = _key_hashes(incoming, key_columns)
+
+    lookup = pd.Series(np.flatnonzero(base_valid), index=base_hashes[base_valid])
+    lookup = lookup[~lookup.index.duplicated(keep="last")]
+    pos = lookup.reindex(inc_hashes).to_numpy()
+    matched = inc_valid & ~np.isnan(pos)
+
+    # 3. Verificación de la clave real (descarta colisiones de hash)
+    if matched.any():
+        m_inc = np.flatnonzero(matched)
+        m_base = pos[matched].astype(np.int64)
+        same_key = np.ones(len(m_inc), dtype=bool)
+        for col in key_columns:
+            same_key &= values_equal(base_keys[col].iloc[m_base].reset_index(drop=True),
+                                      inc_keys[col].iloc[m_inc].reset_index(drop=True))
+        matched[m_inc[~same_key]] = False
+
+    inserted_rows = incoming[~matched]
+    result["inserted_rows"] = inserted_rows
+    result["inserted"] = len(inserted_rows)
+
+    if not matched.any():
+        return result
+
+    m_inc = np.flatnonzero(matched)
+    m_base = pos[matched].astype(np.int64)
+    result["matched_index"] = base.index[m_base]
+
+    # 4. Comparación vectorizada columna a columna con el valor confirmado
+    #    (las celdas con ediciones pendientes no se escriben: se marcan como conflicto)
+    labels = result["matched_index"]
+    data_cols = [c for c in incoming.columns if c in base.columns and c not in DERIVED_COLUMNS]
+    changed_cells, edited_cells = {}, {}
+    row_changed = np.zeros(len(m_inc), dtype=bool)
+    row_conflict = np.zeros(len(m_inc), dtype=bool)
+    for col in data_cols:
+        old, edited = _committed_values(base[col].iloc[m_base].reset_index(drop=True), labels, pending.get(col))
+        new = incoming[col].iloc[m_inc].reset_index(drop=True)
+        diff = ~values_equal(old, new)
+        if edited.any():
+            edited_cells[col] = edited
+            row_conflict |= diff & edited
+            diff &= ~edited
+        if diff.any():
+            changed_cells[col] = diff
+            row_changed |= diff
+
+    if policy == MERGE_POLICY_KEEP_LATEST:
+        result["updated"] = int(row_changed.sum())
+        result["conflicts"] = int(row_conflict.sum())
+    else:
+        result["skipped"] = int((row_changed | row_conflict).sum())
+    result["unchanged"] = int((~(row_changed | row_conflict)).sum())
+
+    # 5. Escritura (sólo keep_latest): una asignación vectorizada por columna
+    if policy == MERGE_POLICY_KEEP_LATEST and row_changed.any():
+        for col in data_cols:
+            mask = changed_cells.get(col) if update_changed_only else row_changed
+            if mask is None or not mask.any():
+                continue
+            if col in edited_cells:
+                mask = mask & ~edited_cells[col]
+                if not mask.any():
+                    continue
+            values = incoming[col].iloc[m_inc[mask]]
+            add_categories(base, col, values)
+            base.iloc[m_base[mask], base.columns.get_loc(col)] = values.to_numpy()
+            result["written_cells"][col] = base.index[m_base[mask]]
+        result["updated_index"] = base.index[m_base[row_changed]]
+
+    return result
+
@@ -0,0 +1,1346 @@
+# modules/rules_engine.py
+"""
+Motor de Reglas Puro (Rules Engine).
+
+Núcleo de evaluación de las reglas de prioridad, sin dependencia de
+Streamlit: recibe (DataFrame, reglas) y devuelve arrays de prioridad y
+motivo, por lo que puede usarse desde la aplicación, la CLI, la API, los
+procesos del pool o los benchmarks. rules_service.py lo envuelve con las
+reglas del estado de sesión.
+
+Semántica (la de siempre): las reglas se aplican en orden INVERSO de su
+'order' y la de número más bajo gana; a igual 'order', gana la última de la
+lista. Las filas sin regla conservan una prioridad manual válida ("Ingreso
+Manual") o quedan como "Sin Regla Asignada".
+
+Los resultados (regla ganadora por fila) se memorizan por (versión de datos,
+huella canónica del plan): las re-ejecuciones, las recargas de configuración
+y las sesiones con las mismas reglas sobre los mismos datos no recalculan.
+"""
+
+import hashlib
+import json
+import multiprocessing
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import pandas as pd
+import numpy as np
+from modules.schema import as_text, to_datetime_series, parse_list_value, parse_range_value
+
+# Operadores que comparan la versión numérica de la columna
+# ('between' con los dos límites incluidos, en una sola pasada)
+NUMERIC_OPERATORS = [">", "<", ">=", "<=", "between"]
+# Operadores de pertenencia a una lista de valores (búsqueda en conjunto hash)
+LIST_OPERATORS = ["in", "not_in"]
+# Operadores de fecha sobre la columna como datetime64 (las fechas vacías no cumplen):
+# - before / after: anterior / posterior a una fecha fija.
+# - within_next_days: entre la fecha de referencia y N días después (incluidos).
+# - older_than_days: más de N días antes de la fecha de referencia.
+DATE_OPERATORS = ["before", "after", "within_next_days", "older_than_days"]
+RELATIVE_DATE_OPERATORS = ["within_next_days", "older_than_days"]
+
+# Modos de evaluación del motor (mismo resultado, distinto recorrido)
+EVAL_MODE_FIRST_MATCH = "first_match"  # orden ascendente, cada fila se decide una vez
+EVAL_MODE_OVERWRITE = "overwrite"      # orden descendente, cada regla sobre todas las filas
+
+# --- Evaluación paralela por tramos de filas ---
+# A partir de este número de filas las reglas se evalúan en un pool de procesos
+# (por debajo, arrancar los procesos cuesta más de lo que se gana).
+PARALLEL_RULES_MIN_ROWS = 2_000_000
+# Número máximo de procesos evaluadores.
+MAX_RULE_WORKERS = min(8, os.cpu_count() or 1)
+
+# --- Indexación de reglas ---
+# Operadores de igualdad / prefijo que se pueden resolver con un diccionario sobre los valores únicos
+INDEXABLE_OPERATORS = ["is", "in", "starts_with"]
+# Reglas de una sola condición indexable sobre la misma columna a partir de las cuales
+# se resuelven todas juntas con una búsqueda (por debajo, el recorrido regla a regla basta)
+RULE_INDEX_MIN_RULES = 8
+
+# --- Análisis de reglas ---
+# Saltar las reglas que no pueden cumplirse con los valores presentes en los datos
+# (columna inexistente, valor fuera del rango o del dominio de la columna)
+SKIP_DEAD_RULES = True
+# Diagnóstico de cada regla activa (ver RuleMatchIndex.rule_stats)
+RULE_STATUS_OK = "ok"
+RULE_STATUS_DEAD = "dead"                # no coincide con ninguna fila
+RULE_STATUS_SHADOWED = "shadowed"        # coincide, pero otras reglas le ganan todas sus filas
+RULE_STATUS_ALWAYS_TRUE = "always_true"  # coincide con todas las filas
+RULE_STATUS_ERROR = "error"              # no se pudo evaluar (p. ej. regex inválida)
+
+# --- Perfilador ---
+# Columnas del informe de profile_rules (una fila por regla y una por condición)
+PROFILE_COLUMNS = [
+    "rule_id", "reason", "level", "group", "condition", "seconds",
+    "rows_evaluated", "rows_matched", "rows_won", "indexed", "skipped", "error",
+]
+PROFILE_LEVEL_RULE = "rule"
+PROFILE_LEVEL_CONDITION = "condition"
+
+# Columnas que el propio motor reescribe: las máscaras que dependen de ellas no se cachean
+ENGINE_COLUMNS = {"Priority", "Priority_Reason", "Row Status"}
+
+
+class ColumnViews:
+    """
+    Vistas derivadas de las columnas de un DataFrame, calculadas una sola vez
+    por evaluación y compartidas por todas las condiciones que usan la misma
+    columna:
+
+    - numeric: la columna como número.
+    - dates: la columna como datetime64 (ya tipada por el esquema, o
+      interpretada una sola vez si llega como texto).
+    - encoded: la columna codificada como diccionario (códigos por fila +
+      valores únicos en texto). Los operadores de texto se evalúan sobre los
+      valores únicos y el resultado se difunde a las filas con los códigos,
+      de modo que una regex sobre 'Pay Group' se ejecuta unas decenas de veces
+      en lugar de una vez por fila. En columnas categóricas se reutilizan
+      directamente sus códigos y categorías.
+    - value_range / present_uniques: el dominio de valores de la columna
+      (mínimo y máximo, valores únicos que aparecen en alguna fila), para
+      descartar condiciones que no pueden cumplirse sin recorrer las filas.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.n_rows = len(df)
+        self._numeric = {}
+        self._dates = {}
+        self._encoded = {}
+        self._lower = {}
+        self._unique_masks = {}
+        self._ranges = {}
+        self._present = {}
+
+    def has_column(self, col: str) -> bool:
+        return col in self.df.columns
+
+    def numeric(self, col: str) -> np.ndarray:
+        """Columna como número (errores a 0; las fechas cuentan como 0)."""
+        if col not in self._numeric:
+            series = self.df[col]
+            if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                self._numeric[col] = np.zeros(len(self.df))
+            else:
+                self._numeric[col] = pd.to_numeric(series, errors='coerce').fillna(0).to_numpy(dtype=float)
+        return self._numeric[col]
+
+    def dates(self, col: str) -> np.ndarray:
+        """Columna como datetime64[ns] (vacíos y valores no interpretables como NaT)."""
+        if col not in self._dates:
+            series = self.df[col]
+            if pd.api.types.is_datetime64_any_dtype(series.dtype):
+                self._dates[col] = series.to_numpy(dtype="datetime64[ns]")
+            else:
+                # Texto: se interpretan sólo los valores únicos y se difunden con los códigos
+                codes, uniques = self.encoded(col)
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", UserWarning)  # formatos mezclados: dateutil
+                    parsed = to_datetime_series(uniques.replace("", None)).to_numpy(dtype="datetime64[ns]")
+                self._dates[col] = np.append(parsed, np.datetime64("NaT", "ns"))[codes]
+        return self._dates[col]
+
+    def encoded(self, col: str) -> tuple:
+        """
+        Columna como texto codificada en diccionario (nulos como "").
+
+        Returns:
+            tuple: (códigos np.ndarray por fila, pd.Series con los valores únicos).
+        """
+        if col not in self._encoded:
+            text = as_text(self.df[col])
+            if isinstance(text.dtype, pd.CategoricalDtype):
+                codes = text.cat.codes.to_numpy()
+                uniques = pd.Series(text.cat.categories, dtype=object)
+            else:
+                codes, uniques = pd.factorize(text)
+                uniques = pd.Series(uniques, dtype=object)
+            self._encoded[col] = (codes, uniques)
+        return self._encoded[col]
+
+    def unique_lower(self, col: str) -> pd.Series:
+        """Valores únicos de la columna en minúsculas."""
+        if col not in self._lower:
+            self._lower[col] = self.encoded(col)[1].str.lower()
+        return self._lower[col]
+
+    def unique_mask(self, key: tuple) -> np.ndarray:
+        """Resultado de una condición de texto sobre los valores únicos de su columna."""
+        if key not in self._unique_masks:
+            self._unique_masks[key] = _evaluate_text_uniques(self, key)
+        return self._unique_masks[key]
+
+    def index_winners(self, col: str, entries: list) -> np.ndarray:
+        """Regla indexada ganadora por valor único de la columna (ver _index_winners)."""
+        return _index_winners(self.unique_lower(col), entries)
+
+    def value_range(self, col: str, dates: bool = False):
+        """
+        (mínimo, máximo) de la versión numérica (o datetime64) de la columna.
+
+        Returns:
+            tuple | None: None si no hay ningún valor (sin filas o todo NaT).
+        """
+        if (col, dates) not in self._ranges:
+            values = self.dates(col) if dates else self.numeric(col)
+            if dates:
+                values = values[~np.isnat(values)]
+            self._ranges[(col, dates)] = (values.min(), values.max()) if values.size else None
+        return self._ranges[(col, dates)]
+
+    def present_uniques(self, col: str) -> np.ndarray:
+        """Valores únicos que aparecen en alguna fila (las categorías sin uso no cuentan)."""
+        if col not in self._present:
+            codes, uniques = self.encoded(col)
+            self._present[col] = np.bincount(codes[codes >= 0], minlength=len(uniques)) > 0
+        return self._present[col]
+
+
+def rule_condition_groups(rule: dict) -> list:
+    """
+    Grupos de condiciones de una regla (forma normal disyuntiva): AND dentro
+    de cada grupo y OR entre grupos.
+
+    'condition_groups' (lista de listas) tiene preferencia; una regla con la
+    lista plana 'conditions' es un único grupo. Los grupos vacíos se ignoran
+    (no significan "todas las filas").
+    """
+    groups = rule.get('condition_groups')
+    if not groups:
+        groups = [rule.get('conditions') or []]
+    return [list(g) for g in groups if g]
+
+
+def resolve_as_of(as_of=None) -> pd.Timestamp:
+    """Fecha de referencia de los operadores de fecha relativos (por defecto, hoy)."""
+    as_of = pd.Timestamp(as_of) if as_of not in (None, "") else pd.Timestamp.today()
+    return as_of.normalize()
+
+
+def condition_key(condition: dict, as_of=None) -> tuple:
+    """
+    Clave normalizada de una condición (columna, operador, valor), usada para
+    evaluar una sola vez las condiciones idénticas entre reglas.
+
+    En los operadores de fecha relativos el valor incluye la fecha de
+    referencia (as_of), de modo que las cachés por clave no sirvan
+    resultados de otro día. Un rango 'between' mal formado ('50-200',
+    '50,200') se normaliza a (inf, -inf), que no cumple ninguna fila
+    (igual que en los filtros).
+    """
+    col = condition.get("column")
+    op = condition.get("operator")
+    val = condition.get("value")
+    if op in RELATIVE_DATE_OPERATORS:
+        try:
+            days = float(val)
+        except (ValueError, TypeError):
+            days = 0.0
+        val = (days, resolve_as_of(as_of).isoformat())
+    elif op in DATE_OPERATORS:
+        # Fecha fija en ISO ("" si no se puede interpretar: no cumple ninguna fila)
+        date = pd.to_datetime(val, errors='coerce') if val not in (None, "") else pd.NaT
+        val = date.isoformat() if not pd.isna(date) else ""
+    elif op == "between":
+        try:
+            val = tuple(float(v) for v in parse_range_value(val))
+        except (ValueError, TypeError):
+            # Rango vacío: ningún valor es >= inf y <= -inf
+            val = (float("inf"), float("-inf"))
+    elif op in NUMERIC_OPERATORS:
+        try:
+            val = float(val)
+        except (ValueError, TypeError):
+            val = 0.0
+    elif op in LIST_OPERATORS:
+        # Orden canónico: la misma lista escrita en otro orden es la misma condición
+        val = tuple(sorted(parse_list_value(val)))
+    else:
+        val = str(val)
+    return (col, op, val)
+
+
+def _evaluate_text_uniques(views: ColumnViews, key: tuple) -> np.ndarray:
+    """
+    Evalúa un operador de texto sobre los valores únicos de la columna.
+
+    Returns:
+        np.ndarray: Máscara booleana alineada con los valores únicos.
+    """
+    col, op, val = key
+    uniques = views.encoded(col)[1]
+    if op == "contains":
+        # case=False hace que ignore mayúsculas/minúsculas
+        # regex=True es el default en pandas str.contains, permitiendo el uso de '|' y '\\s'
+        unique_mask = uniques.str.contains(val, case=False, na=False, regex=True)
+    elif op == "is":
+        # Comparación exacta insensible a mayúsculas
+        unique_mask = views.unique_lower(col) == val.lower()
+    elif op == "is_not":
+        unique_mask = views.unique_lower(col) != val.lower()
+    elif op == "starts_with":
+        unique_mask = views.unique_lower(col).str.startswith(val.lower())
+    elif op in LIST_OPERATORS:
+        # Pertenencia insensible a mayúsculas con un conjunto hash (sin regex)
+        unique_mask = views.unique_lower(col).isin({v.lower() for v in val})
+        if op == "not_in":
+            unique_mask = ~unique_mask
+    else:
+        unique_mask = np.zeros(len(uniques), dtype=bool)
+    return np.asarray(unique_mask, dtype=bool)
+
+
+def _index_winners(lower: pd.Series, entries: list) -> np.ndarray:
+    """
+    Resuelve de una vez un grupo de reglas indexadas sobre la misma columna.
+
+    Las igualdades ('is' / 'in') se vuelcan en un diccionario valor -> regla y
+    los prefijos ('starts_with') en un diccionario por longitud de prefijo
+    (un trie aplanado); cada valor único se busca una vez por diccionario, así
+    que el coste depende del número de valores únicos y de longitudes de
+    prefijo distintas, no del número de reglas.
+
+    Args:
+        lower (pd.Series): Valores únicos de la columna en minúsculas.
+        entries (list): (posición de la regla en el plan, clave de su condición).
+
+    Returns:
+        np.ndarray: Por valor único, la posición más alta (mayor precedencia)
+                    de las reglas que coinciden, o -1.
+    """
+    exact, prefixes = {}, {}
+    for pos, (_, op, val) in entries:
+        for v in ([val] if op != "in" else val):
+            v = v.lower()
+            table = prefixes.setdefault(len(v), {}) if op == "starts_with" else exact
+            table[v] = max(table.get(v, -1), pos)
+
+    best = np.full(len(lower), -1, dtype=np.int64)
+    if exact:
+        np.maximum(best, lower.map(exact).fillna(-1).to_numpy(dtype=np.int64), out=best)
+    for length, table in prefixes.items():
+        np.maximum(best, lower.str[:length].map(table).fillna(-1).to_numpy(dtype=np.int64), out=best)
+    return best
+
+
+def _key_domain_empty(views: ColumnViews, key: tuple) -> bool:
+    """
+    True si la condición no puede cumplirse en ninguna fila según el dominio
+    de su columna (columna inexistente, umbral fuera del rango [mínimo,
+    máximo], ningún valor único que cumpla el operador de texto), sin
+    recorrer las filas. Si la condición no se puede evaluar (p. ej. una regex
+    inválida) devuelve False: el error se informa al evaluar la regla.
+    """
+    col, op, val = key
+    if not views.has_column(col) or views.n_rows == 0:
+        return True
+    try:
+        if op in NUMERIC_OPERATORS:
+            bounds = views.value_range(col)
+            if bounds is None:
+                return True
+            lo, hi = bounds
+            if op == ">": return hi <= val
+            elif op == "<": return lo >= val
+            elif op == ">=": return hi < val
+            elif op == "<=": return lo > val
+            else: return val[0] > val[1] or hi < val[0] or lo > val[1]
+
+        if op in DATE_OPERATORS:
+            bounds = views.value_range(col, dates=True)
+            if bounds is None:
+                return True
+            lo, hi = bounds
+            if op in RELATIVE_DATE_OPERATORS:
+                days, as_of = val
+                as_of = np.datetime64(pd.Timestamp(as_of), "ns")
+                offset = np.timedelta64(int(round(days * 86400)), "s")
+                if op == "within_next_days":
+                    return hi < as_of or lo > as_of + offset
+                return lo >= as_of - offset
+            if not val:
+                return True
+            date = np.datetime64(pd.Timestamp(val), "ns")
+            return lo >= date if op == "before" else hi <= date
+
+        return not views.unique_mask(key)[views.present_uniques(col)].any()
+    except Exception:
+        return False
+
+
+def _evaluate_key(views: ColumnViews, key: tuple, rows: np.ndarray = None) -> np.ndarray:
+    """
+    Evalúa una condición normalizada (ver condition_key) de forma vectorizada.
+
+    Args:
+        views (ColumnViews): Vistas compartidas del DataFrame a evaluar.
+        key (tuple): (columna, operador, valor normalizado).
+        rows (np.ndarray, optional): Posiciones de las filas a evaluar
+                                     (por defecto, todas).
+
+    Returns:
+        np.ndarray: Máscara booleana (True donde se cumple la condición),
+                    alineada con 'rows' si se indica.
+    """
+    col, op, val = key
+    n_rows = views.n_rows if rows is None else len(rows)
+    if not views.has_column(col):
+        return np.zeros(n_rows, dtype=bool)
+
+    # --- Lógica Numérica (Operadores Matemáticos) ---
+    if op in NUMERIC_OPERATORS:
+        values = views.numeric(col)
+        if rows is not None:
+            values = values[rows]
+        if op == ">": return values > val
+        elif op == "<": return values < val
+        elif op == ">=": return values >= val
+        elif op == "<=": return values <= val
+        else: return (values >= val[0]) & (values <= val[1])
+
+    # --- Lógica de Fechas (datetime64; NaT nunca cumple) ---
+    if op in DATE_OPERATORS:
+        values = views.dates(col)
+        if rows is not None:
+            values = values[rows]
+        if op in RELATIVE_DATE_OPERATORS:
+            days, as_of = val
+            as_of = np.datetime64(pd.Timestamp(as_of), "ns")
+            offset = np.timedelta64(int(round(days * 86400)), "s")
+            if op == "within_next_days":
+                return (values >= as_of) & (values <= as_of + offset)
+            return values < as_of - offset
+        if not val:
+            return np.zeros(len(values), dtype=bool)
+        date = np.datetime64(pd.Timestamp(val), "ns")
+        return values < date if op == "before" else values > date
+
+    # --- Lógica de Texto (Operadores de String) ---
+    # Se evalúan sobre los valores únicos y se difunden con los códigos.
+    codes = views.encoded(col)[0]
+    return views.unique_mask(key)[codes if rows is None else codes[rows]]
+
+
+def _evaluate_condition(df: pd.DataFrame, condition: dict, as_of=None) -> pd.Series:
+    """
+    Evalúa una sola condición contra el DataFrame de forma vectorizada.
+    
+    Args:
+        df (pd.DataFrame): DataFrame a evaluar.
+        condition (dict): Diccionario con keys 'column', 'operator', 'value'.
+        as_of (optional): Fecha de referencia de los operadores de fecha
+                          relativos (por defecto, hoy).
+        
+    Returns:
+        pd.Series: Serie booleana (True donde se cumple la condición).
+    """
+    return pd.Series(_evaluate_key(ColumnViews(df), condition_key(condition, as_of)), index=df.index)
+
+
+class RulePlan:
+    """
+    Plan de ejecución compilado a partir de una lista de reglas.
+
+    - Las reglas activas con condiciones quedan en orden de aplicación
+      ('order' descendente: la de número más bajo se aplica al final y gana).
+    - Cada regla es una lista de grupos de condiciones (OR entre grupos, AND
+      dentro de cada grupo; ver rule_condition_groups).
+    - Las condiciones idénticas, entre reglas o entre grupos de una misma
+      regla, se deduplican por (columna, operador, valor): cada una se evalúa
+      una sola vez por ejecución.
+    - Las vistas derivadas de cada columna (numérica, texto codificado) se
+      calculan una vez y se comparten (ColumnViews).
+    - La fecha de referencia de los operadores de fecha relativos se fija al
+      compilar (as_of; por defecto, hoy).
+    - Las reglas de una sola condición de igualdad o prefijo sobre la misma
+      columna (p. ej. una regla por proveedor) se indexan si son al menos
+      RULE_INDEX_MIN_RULES: se resuelven juntas con una búsqueda por
+      diccionario sobre los valores únicos y una sola pasada por las filas.
+    - Con SKIP_DEAD_RULES, las reglas que no pueden cumplirse según el
+      dominio de sus columnas (ver _key_domain_empty) no se evalúan.
+    """
+
+    def __init__(self, rules: list, as_of=None):
+        self.as_of = resolve_as_of(as_of)
+        self.rules = sorted(
+            [r for r in rules if r.get('enabled', True) and rule_condition_groups(r)],
+            key=lambda x: x.get('order', 99),
+            reverse=True
+        )
+        self.conditions = []
+        # Por regla: lista de grupos, cada uno con las posiciones de sus condiciones en self.conditions
+        self.rule_groups = []
+        positions = {}
+        for rule in self.rules:
+            groups = []
+            for group in rule_condition_groups(rule):
+                idxs = []
+                for cond in group:
+                    key = condition_key(cond, self.as_of)
+                    if key not in positions:
+                        positions[key] = len(self.conditions)
+                        self.conditions.append(key)
+                    if positions[key] not in idxs:
+                        idxs.append(positions[key])
+                groups.append(idxs)
+            self.rule_groups.append(groups)
+
+        # Índice por columna: {columna: [(posición de la regla, clave)]}
+        candidates = {}
+        for pos, groups in enumerate(self.rule_groups):
+            if len(groups) == 1 and len(groups[0]) == 1:
+                key = self.conditions[groups[0][0]]
+                if key[1] in INDEXABLE_OPERATORS:
+                    candidates.setdefault(key[0], []).append((pos, key))
+        self.rule_index = {col: entries for col, entries in candidates.items() if len(entries) >= RULE_INDEX_MIN_RULES}
+        self.indexed = {pos for entries in self.rule_index.values() for pos, _ in entries}
+        # Condiciones que se evalúan regla a regla (las de las reglas no indexadas)
+        self.walked_conditions = {
+            c for pos, groups in enumerate(self.rule_groups) if pos not in self.indexed for g in groups for c in g
+        }
+
+    @property
+    def columns(self) -> list:
+        """Columnas referenciadas por el plan."""
+        return list(dict.fromkeys(key[0] for key in self.conditions))
+
+    @property
+    def reads_engine_columns(self) -> bool:
+        """True si alguna condición lee columnas que reescribe el propio motor."""
+        return any(key[0] in ENGINE_COLUMNS for key in self.conditions)
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Huella canónica del plan: los grupos de condiciones normalizadas de
+        cada regla en orden de aplicación. Dos listas de reglas con la misma huella dan
+        la misma regla ganadora por fila (los ids, las reglas desactivadas o
+        unos 'order' distintos con el mismo orden relativo no la cambian).
+        """
+        payload = json.dumps(
+            [[[self.conditions[i] for i in idxs] for idxs in groups] for groups in self.rule_groups], default=str
+        )
+        return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+    def rule_is_dead(self, views: "ColumnViews", pos: int, empty: dict = None) -> bool:
+        """
+        True si ningún grupo de la regla en la posición 'pos' puede cumplirse:
+        cada uno tiene alguna condición imposible según el dominio de los datos.
+
+        Args:
+            empty (dict, optional): Memo {posición de condición: bool} compartido
+                                    entre reglas de la misma evaluación.
+        """
+        empty = {} if empty is None else empty
+        for idxs in self.rule_groups[pos]:
+            for c in idxs:
+                if c not in empty:
+                    empty[c] = _key_domain_empty(views, self.conditions[c])
+            if not any(empty[c] for c in idxs):
+                return False
+        return True
+
+    def dead_rules(self, views: "ColumnViews") -> set:
+        """Posiciones de las reglas recorridas (no indexadas) que no pueden cumplirse."""
+        if not SKIP_DEAD_RULES:
+            return set()
+        empty = {}
+        return {pos for pos in range(len(self.rules)) if pos not in self.indexed and self.rule_is_dead(views, pos, empty)}
+
+    def rule_masks(self, df: pd.DataFrame, mask_cache: "RuleMaskCache" = None):
+        """
+        Genera (regla, máscara) en orden de aplicación.
+
+        La máscara es un np.ndarray booleano, o None si la regla no se pudo
+        evaluar (p. ej. una expresión regular inválida): esa regla se omite.
+        Con 'mask_cache' se reutilizan las máscaras ya calculadas para la
+        misma versión de datos y sólo se evalúan las reglas nuevas o editadas.
+        Las reglas imposibles según el dominio de los datos dan una máscara
+        vacía sin evaluarse.
+        """
+        views = ColumnViews(df)
+        # Máscara de cada condición deduplicada (columna, operador, valor) en esta ejecución
+        cache = {}
+        empty = {}
+        for pos, (rule, groups) in enumerate(zip(self.rules, self.rule_groups)):
+            signature = rule_signature(rule, self.as_of) if mask_cache is not None else None
+            if signature is not None:
+                cached = mask_cache.get(signature)
+                if cached is not None:
+                    yield rule, cached
+                    continue
+            try:
+                # OR entre grupos de la intersección (AND) de sus condiciones
+                mask = np.zeros(len(df), dtype=bool)
+                dead = SKIP_DEAD_RULES and self.rule_is_dead(views, pos, empty)
+                for idxs in ([] if dead else groups):
+                    group_mask = np.ones(len(df), dtype=bool)
+                    for i in idxs:
+                        if i not in cache:
+                            try:
+                                cache[i] = _evaluate_key(views, self.conditions[i])
+                            except Exception as e:
+                                cache[i] = e
+                        if isinstance(cache[i], Exception):
+                            raise cache[i]
+                        group_mask &= cache[i]
+                    mask |= group_mask
+                if signature is not None:
+                    mask_cache.put(signature, mask)
+                yield rule, mask
+            except Exception as e:
+                print(f"Error aplicando regla {rule.get('id')}: {e}")
+                yield rule, None
+
+    def first_match_winners(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Regla ganadora de cada fila recorriendo las reglas por precedencia
+        (el inverso del orden de aplicación: 'order' ascendente y, a igual
+        'order', la última de la lista primero). Cada regla sólo se evalúa
+        sobre las filas que ninguna regla anterior ha reclamado; cada grupo,
+        sólo sobre las que no han reclamado los grupos anteriores de la misma
+        regla, y dentro de un grupo cada condición sólo sobre las filas que
+        cumplen las previas.
+
+        Las reglas imposibles según el dominio de los datos se saltan (ver
+        dead_rules). Por encima de PARALLEL_RULES_MIN_ROWS filas se reparte
+        por tramos de filas en un pool de procesos (ver
+        parallel_first_match_winners).
+
+        Returns:
+            np.ndarray: Posición en self.rules de la regla ganadora (-1 = ninguna).
+        """
+        views = ColumnViews(df)
+        if use_parallel_rules(len(df)) and self.rules:
+            try:
+                return parallel_first_match_winners(self, views)
+            except Exception as e:
+                print(f"Error en evaluación paralela de reglas (se evalúa en serie): {e}")
+        return self.first_match_views(views)
+
+    def first_match_views(self, views: "ColumnViews", skip: set = None) -> np.ndarray:
+        """
+        first_match_winners sobre unas vistas ya construidas (todas sus filas).
+
+        Args:
+            skip (set, optional): Posiciones de reglas que no se evalúan (las
+                                  ya sabidas imposibles). Si no se indica, cada
+                                  regla se comprueba contra el dominio de los
+                                  datos justo antes de evaluarla.
+        """
+        empty = {}
+        winner = np.full(views.n_rows, -1, dtype=np.int64)
+        remaining = np.arange(views.n_rows)
+        claimed = np.zeros(views.n_rows, dtype=bool)
+        # Reglas indexadas: ganadora por fila en una sola pasada (-1 = ninguna)
+        indexed = self._indexed_winners(views)
+        for i in range(len(self.rules) - 1, -1, -1):
+            if i in self.indexed:
+                continue
+            if indexed is not None:
+                # Las filas que ya gana una regla indexada de mayor precedencia no se evalúan
+                remaining = remaining[indexed[remaining] < i]
+            if remaining.size == 0:
+                break
+            if skip is not None:
+                dead = i in skip
+            else:
+                dead = SKIP_DEAD_RULES and self.rule_is_dead(views, i, empty)
+            if dead:
+                continue
+            try:
+                hits = []
+                pending = remaining
+                for idxs in self.rule_groups[i]:
+                    # Todas las condiciones se evalúan (aunque no queden filas) para
+                    # que un error descarte la regla igual que en rule_masks.
+                    rows = pending
+                    for c in idxs:
+                        rows = rows[_evaluate_key(views, self.conditions[c], rows)]
+                    if rows.size:
+                        hits.append(rows)
+                        claimed[rows] = True
+                        pending = pending[~claimed[pending]]
+            except Exception as e:
+                print(f"Error aplicando regla {self.rules[i].get('id')}: {e}")
+                continue
+            finally:
+                for rows in hits:
+                    claimed[rows] = False
+            if hits:
+                winner[np.concatenate(hits)] = i
+                remaining = remaining[winner[remaining] < 0]
+        if indexed is not None:
+            np.maximum(winner, indexed, out=winner)
+        return winner
+
+    def _indexed_winners(self, views: "ColumnViews") -> np.ndarray:
+        """
+        Regla indexada de mayor precedencia que coincide con cada fila: una
+        búsqueda por valor único y columna, difundida con los códigos.
+
+        Returns:
+            np.ndarray | None: Posición en self.rules (-1 = ninguna), o None si
+                               el plan no tiene reglas indexadas.
+        """
+        if not self.rule_index:
+            return None
+        best = np.full(views.n_rows, -1, dtype=np.int64)
+        for col, entries in self.rule_index.items():
+            if views.has_column(col):
+                np.maximum(best, views.index_winners(col, entries)[views.encoded(col)[0]], out=best)
+        return best
+
+
+def use_parallel_rules(n_rows: int) -> bool:
+    """True si la evaluación debe repartirse en el pool de procesos."""
+    return n_rows >= PARALLEL_RULES_MIN_ROWS and MAX_RULE_WORKERS > 1
+
+
+class SharedColumns:
+    """
+    Datos que necesita un plan, publicados en memoria compartida para que los
+    procesos del pool los lean sin copiar ni serializar el DataFrame:
+
+    - La versión numérica de las columnas con operadores numéricos.
+    - La versión datetime64 de las columnas con operadores de fecha.
+    - Los códigos por fila de las columnas con operadores de texto.
+    - El resultado de cada condición de texto sobre los valores únicos (se
+      calcula una vez aquí; así los procesos no reciben los textos).
+    - La regla indexada ganadora por valor único de cada columna indexada.
+
+    Sólo viaja por pickle la descripción (nombres de bloque, dtype, forma).
+    Las condiciones que sólo usan reglas indexadas o saltadas ('skip') no
+    se publican.
+    """
+
+    def __init__(self, plan: "RulePlan", views: "ColumnViews", skip: set = frozenset()):
+        self._blocks = []
+        self.spec = {"n_rows": views.n_rows, "columns": [], "numeric": {}, "dates": {}, "codes": {},
+                     "unique_masks": {}, "index": {}, "errors": {}}
+        walked = {
+            c for pos, groups in enumerate(plan.rule_groups) if pos not in skip and pos not in plan.indexed
+            for g in groups for c in g
+        }
+        for c, key in enumerate(plan.conditions):
+            col, op, _ = key
+            if not views.has_column(col):
+                continue
+            if col not in self.spec["columns"]:
+                self.spec["columns"].append(col)
+            if op in NUMERIC_OPERATORS:
+                if col not in self.spec["numeric"]:
+                    self.spec["numeric"][col] = self._publish(views.numeric(col))
+                continue
+            if op in DATE_OPERATORS:
+                if col not in self.spec["dates"]:
+                    self.spec["dates"][col] = self._publish(views.dates(col))
+                continue
+            if col not in self.spec["codes"]:
+                self.spec["codes"][col] = self._publish(views.encoded(col)[0])
+            if c not in walked:
+                continue
+            try:
+                self.spec["unique_masks"][key] = self._publish(views.unique_mask(key))
+            except Exception as e:
+                self.spec["errors"][key] = str(e)
+        for col, entries in plan.rule_index.items():
+            if views.has_column(col):
+                self.spec["index"][col] = self._publish(views.index_winners(col, entries))
+
+    def _publish(self, array: np.ndarray) -> tuple:
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._blocks.append(block)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        return (block.name, array.dtype.str, array.shape)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+class PartitionViews(ColumnViews):
+    """Vistas de un tramo de filas [start, stop) leídas de la memoria compartida."""
+
+    def __init__(self, spec: dict, start: int, stop: int):
+        self.n_rows = stop - start
+        self._spec = spec
+        self._start, self._stop = start, stop
+        self._blocks = []
+
+    def _attach(self, entry: tuple, partition: bool = True) -> np.ndarray:
+        name, dtype, shape = entry
+        block = shared_memory.SharedMemory(name=name)
+        self._blocks.append(block)
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return array[self._start:self._stop] if partition else array
+
+    def has_column(self, col: str) -> bool:
+        return col in self._spec["columns"]
+
+    def numeric(self, col: str) -> np.ndarray:
+        return self._attach(self._spec["numeric"][col])
+
+    def dates(self, col: str) -> np.ndarray:
+        return self._attach(self._spec["dates"][col])
+
+    def encoded(self, col: str) -> tuple:
+        return self._attach(self._spec["codes"][col]), None
+
+    def index_winners(self, col: str, entries: list) -> np.ndarray:
+        return self._attach(self._spec["index"][col], partition=False)
+
+    def unique_mask(self, key: tuple) -> np.ndarray:
+        if key in self._spec["errors"]:
+            raise ValueError(self._spec["errors"][key])
+        return self._attach(self._spec["unique_masks"][key], partition=False)
+
+    def close(self):
+        for block in self._blocks:
+            block.close()
+        self._blocks = []
+
+
+def _evaluate_partition(rules: list, spec: dict, start: int, stop: int, as_of=None, skip: set = None) -> np.ndarray:
+    """
+    Tarea de un proceso del pool: regla ganadora (primera coincidencia) de
+    las filas [start, stop). Función de módulo para poder enviarla al pool.
+    Las reglas a saltar ('skip') se deciden en el proceso principal, con el
+    dominio de todas las filas.
+    """
+    views = PartitionViews(spec, start, stop)
+    try:
+        return RulePlan(rules, as_of).first_match_views(views, skip or set()).astype(np.int32)
+    finally:
+        views.close()
+
+
+_RULE_POOL = None
+
+
+def _get_rule_pool() -> ProcessPoolExecutor:
+    """Pool de procesos del motor (se crea una vez y se reutiliza entre ejecuciones)."""
+    global _RULE_POOL
+    if _RULE_POOL is None:
+        # 'spawn' evita heredar hilos del servidor (Streamlit) al hacer fork.
+        ctx = multiprocessing.get_context("spawn")
+        _RULE_POOL = ProcessPoolExecutor(max_workers=MAX_RULE_WORKERS, mp_context=ctx)
+    return _RULE_POOL
+
+
+def parallel_first_match_winners(plan: "RulePlan", views: "ColumnViews") -> np.ndarray:
+    """
+    Reparte la evaluación por primera coincidencia en tramos de filas y une
+    los resultados. Mismo resultado que plan.first_match_views(views).
+    """
+    global _RULE_POOL
+    n_rows = views.n_rows
+    bounds = np.linspace(0, n_rows, MAX_RULE_WORKERS + 1, dtype=np.int64)
+    skip = plan.dead_rules(views)
+    shared = SharedColumns(plan, views, skip)
+    try:
+        pool = _get_rule_pool()
+        futures = [
+            (start, stop, pool.submit(_evaluate_partition, plan.rules, shared.spec, int(start), int(stop), plan.as_of, skip))
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+        ]
+        winner = np.empty(n_rows, dtype=np.int64)
+        for start, stop, fut in futures:
+            winner[start:stop] = fut.result()
+        return winner
+    except Exception:
+        # Un pool roto no se reutiliza
+        if _RULE_POOL is not None:
+            _RULE_POOL.shutdown(wait=False, cancel_futures=True)
+            _RULE_POOL = None
+        raise
+    finally:
+        shared.close()
+
+
+def rule_signature(rule: dict, as_of=None):
+    """
+    Firma de las condiciones de una regla (la máscara sólo depende de ellas
+    y, en los operadores de fecha relativos, de la fecha de referencia:
+    activar/desactivar o cambiar prioridad, motivo u orden no la cambia).
+
+    Returns:
+        str | None: None si la regla depende de columnas que reescribe el motor.
+    """
+    groups = rule_condition_groups(rule)
+    if any(c.get('column') in ENGINE_COLUMNS for group in groups for c in group):
+        return None
+    return json.dumps([[condition_key(c, as_of) for c in group] for group in groups], default=str)
+
+
+class RuleMaskCache:
+    """
+    Máscaras de coincidencia por regla para UNA versión de los datos.
+
+    Al activar, desactivar, editar o borrar una regla en el editor, sólo se
+    evalúan las reglas cuya firma no está en la caché; la regla ganadora de
+    cada fila se vuelve a derivar de las máscaras guardadas. Las máscaras se
+    guardan empaquetadas en bits (1/8 de memoria). Cualquier cambio de datos
+    (otra versión o número de filas) vacía la caché.
+    """
+
+    def __init__(self):
+        self.data_version = None
+        self.n_rows = None
+        self._masks = {}
+        self._used = set()
+
+    def bind(self, data_version, n_rows: int) -> "RuleMaskCache":
+        """Asocia la caché a una versión de datos (se vacía si ha cambiado)."""
+        if data_version is None or data_version != self.data_version or n_rows != self.n_rows:
+            self._masks.clear()
+        self.data_version = data_version
+        self.n_rows = n_rows
+        self._used = set()
+        return self
+
+    def get(self, signature: str):
+        packed = self._masks.get(signature)
+        if packed is None:
+            return None
+        self._used.add(signature)
+        return np.unpackbits(packed, count=self.n_rows).view(bool)
+
+    def put(self, signature: str, mask: np.ndarray):
+        if self.n_rows == len(mask):
+            self._masks[signature] = np.packbits(mask)
+            self._used.add(signature)
+
+    def prune(self):
+        """Olvida las máscaras de reglas que ya no se han usado (borradas o editadas)."""
+        for signature in [s for s in self._masks if s not in self._used]:
+            del self._masks[signature]
+
+
+def rules_fingerprint(rules: list) -> str:
+    """Huella de una lista de reglas completa (cambia con cualquier edición)."""
+    return json.dumps(rules, sort_keys=True, default=str)
+
+
+class RuleMatchIndex:
+    """
+    Bitmap compacto de coincidencias por fila: un bit por regla del plan,
+    empaquetado en palabras uint64 (500 reglas = 8 palabras por fila).
+
+    Responde sin volver a ejecutar el motor:
+    - explain(fila): regla ganadora y resto de reglas que también coinciden.
+      Coste O(reglas / 64) por fila.
+    - rows_shadowed_by(regla): filas que gana la regla aunque otras también
+      coinciden (las reglas a las que "tapa").
+    - rows_overridden(regla): filas en las que la regla coincide pero gana otra.
+    - shadow_counts(regla): cuántas filas tapa a cada una de las demás reglas.
+    - rule_stats(): coincidencias, filas ganadas y diagnóstico de cada regla.
+
+    Las reglas se identifican por su 'id' (o por su posición en el plan).
+    """
+
+    def __init__(self, plan: RulePlan, index: pd.Index, masks: list):
+        self.rules = plan.rules
+        self.index = index
+        n_words = max(1, (len(self.rules) + 63) // 64)
+        self.bits = np.zeros((len(index), n_words), dtype=np.uint64)
+        # Ganadora = última regla coincidente en orden de aplicación (-1 = ninguna)
+        self.winner = np.full(len(index), -1, dtype=np.int64)
+        # Reglas que no se pudieron evaluar
+        self.failed = set()
+        for j, mask in enumerate(masks):
+            if mask is None:
+                self.failed.add(j)
+                continue
+            self.bits[:, j >> 6] |= mask.astype(np.uint64) << np.uint64(j & 63)
+            self.winner[mask] = j
+        self._ids = {}
+        for j, rule in enumerate(self.rules):
+            self._ids.setdefault(rule.get('id', j), j)
+
+    def _rule_pos(self, rule_id) -> int:
+        if rule_id not in self._ids:
+            raise KeyError(f"Regla no evaluada: {rule_id}")
+        return self._ids[rule_id]
+
+    def _row_rules(self, pos: int) -> list:
+        """Posiciones de las reglas coincidentes en una fila, por precedencia."""
+        matched = []
+        for w, word in enumerate(self.bits[pos]):
+            word = int(word)
+            while word:
+                low = word & -word
+                matched.append((w << 6) + low.bit_length() - 1)
+                word ^= low
+        return matched[::-1]
+
+    def explain(self, label) -> dict:
+        """
+        Por qué una fila tiene su prioridad.
+
+        Returns:
+            dict | None: {'winner': regla ganadora o None,
+                          'matched': reglas coincidentes por precedencia,
+                          'shadowed': coincidentes que no ganan}.
+                         None si la fila no está en el índice.
+        """
+        try:
+            pos = self.index.get_loc(label)
+        except KeyError:
+            return None
+        if not isinstance(pos, (int, np.integer)):
+            return None
+        matched = [self.rules[j] for j in self._row_rules(pos)]
+        return {
+            'winner': matched[0] if matched else None,
+            'matched': matched,
+            'shadowed': matched[1:],
+        }
+
+    def _mask(self, j: int) -> np.ndarray:
+        return ((self.bits[:, j >> 6] >> np.uint64(j & 63)) & np.uint64(1)).astype(bool)
+
+    def rule_mask(self, rule_id) -> np.ndarray:
+        """Filas en las que coincide la regla (máscara booleana)."""
+        return self._mask(self._rule_pos(rule_id))
+
+    def _other_matches(self, j: int) -> np.ndarray:
+        """Filas con alguna coincidencia distinta de la regla j."""
+        others = self.bits.copy()
+        others[:, j >> 6] &= ~(np.uint64(1) << np.uint64(j & 63))
+        return others.any(axis=1)
+
+    def rows_shadowed_by(self, rule_id) -> pd.Index:
+        """Filas que gana la regla y en las que otras reglas también coinciden."""
+        j = self._rule_pos(rule_id)
+        won = self.winner == j
+        return self.index[won & self._other_matches(j)]
+
+    def rows_overridden(self, rule_id) -> pd.Index:
+        """Filas en las que la regla coincide pero gana otra de mayor precedencia."""
+        j = self._rule_pos(rule_id)
+        return self.index[self.rule_mask(rule_id) & (self.winner != j)]
+
+    def shadow_counts(self, rule_id) -> dict:
+        """{id de regla: filas que la regla indicada le gana}."""
+        j = self._rule_pos(rule_id)
+        won = self.winner == j
+        counts = {}
+        for k, rule in enumerate(self.rules):
+            if k == j:
+                continue
+            n = int((won & ((self.bits[:, k >> 6] >> np.uint64(k & 63)) & np.uint64(1)).astype(bool)).sum())
+            if n:
+                counts[rule.get('id', k)] = n
+        return counts
+
+    def rule_stats(self) -> dict:
+        """
+        Análisis de cada regla del plan sobre los datos indexados.
+
+        Diagnósticos (por orden de preferencia):
+        - RULE_STATUS_ERROR: la regla no se pudo evaluar.
+        - RULE_STATUS_DEAD: no coincide con ninguna fila.
+        - RULE_STATUS_SHADOWED: coincide, pero todas sus filas las gana
+          otra regla de mayor precedencia ('shadowed_by': la que más le gana).
+        - RULE_STATUS_ALWAYS_TRUE: coincide con todas las filas (tapa a todas
+          las reglas de menor precedencia).
+        - RULE_STATUS_OK.
+
+        Returns:
+            dict: {id de regla: {'status', 'matches', 'wins', 'shadowed_by'}}.
+        """
+        n_rows = len(self.index)
+        wins = np.bincount(self.winner + 1, minlength=len(self.rules) + 1)[1:]
+        stats = {}
+        for j, rule in enumerate(self.rules):
+            mask = self._mask(j)
+            matches = int(mask.sum())
+            shadowed_by = None
+            if j in self.failed:
+                status = RULE_STATUS_ERROR
+            elif matches == 0:
+                status = RULE_STATUS_DEAD
+            elif wins[j] == 0:
+                status = RULE_STATUS_SHADOWED
+                shadowed_by = self.rules[int(np.bincount(self.winner[mask]).argmax())].get('id')
+            elif matches == n_rows:
+                status = RULE_STATUS_ALWAYS_TRUE
+            else:
+                status = RULE_STATUS_OK
+            stats.setdefault(rule.get('id', j), {
+                'status': status, 'matches': matches, 'wins': int(wins[j]), 'shadowed_by': shadowed_by,
+            })
+        return stats
+
+
+def build_match_index(df: pd.DataFrame, rules: list, mask_cache: RuleMaskCache = None, as_of=None) -> RuleMatchIndex:
+    """
+    Evalúa todas las reglas (con la caché de máscaras si se indica) y
+    devuelve su bitmap de coincidencias por fila.
+    """
+    plan = compile_rules(rules, as_of)
+    masks = [mask for _, mask in plan.rule_masks(df, mask_cache)]
+    return RuleMatchIndex(plan, df.index, masks)
+
+
+def analyze_rules(df: pd.DataFrame, rules: list, mask_cache: RuleMaskCache = None, as_of=None) -> dict:
+    """
+    Análisis estático de un conjunto de reglas sobre unos datos: reglas que
+    nunca coinciden, totalmente tapadas por otras o que coinciden con todo,
+    con sus coincidencias y filas ganadas (ver RuleMatchIndex.rule_stats).
+    Con 'mask_cache' se reutilizan las máscaras ya calculadas.
+    """
+    return build_match_index(df, rules, mask_cache, as_of).rule_stats()
+
+
+def _describe_key(key: tuple) -> str:
+    """Texto legible de una condición normalizada ('Total > 10000.0')."""
+    col, op, val = key
+    if op in RELATIVE_DATE_OPERATORS:
+        val = val[0]
+    elif isinstance(val, tuple):
+        val = "|".join(str(v) for v in val)
+    return f"{col} {op} {val}"
+
+
+def profile_rules(df: pd.DataFrame, rules: list, as_of=None) -> pd.DataFrame:
+    """
+    Perfil de coste de cada regla activa y de cada una de sus condiciones.
+
+    Cada regla se evalúa sobre todas las filas (como en rule_masks) y, dentro
+    de cada grupo, cada condición sólo sobre las filas que cumplen las
+    anteriores; así una regex catastrófica destaca aunque en la evaluación
+    normal otras reglas le quiten filas. Se ejecuta en serie, sin caché de
+    máscaras ni memoización.
+
+    - seconds: tiempo de reloj. La conversión de una columna (número, fecha,
+      codificación del texto) se cuenta en la primera condición que la usa.
+      Como en rule_masks, la máscara de cada condición evaluada sobre todas
+      las filas se guarda en una caché por ejecución: si se repite, sólo
+      cuesta la primera vez. Las evaluadas sobre un subconjunto de filas (no
+      primeras de su grupo) no se guardan y se miden cada vez.
+    - rows_evaluated / rows_matched: filas que recibe y que cumple.
+    - rows_won: filas en las que la regla es la ganadora (sólo en las filas
+      de regla).
+    - indexed: la regla se resuelve con el índice de reglas en la evaluación
+      normal (su coste real es menor). skipped: regla imposible con los datos
+      actuales, que el motor no evalúa (ver SKIP_DEAD_RULES).
+
+    Returns:
+        pd.DataFrame: Columnas PROFILE_COLUMNS; las reglas por precedencia,
+                      cada una seguida de sus condiciones.
+    """
+    plan = compile_rules(rules, as_of)
+    views = ColumnViews(df)
+    n_rows = len(df)
+    winner = np.full(n_rows, -1, dtype=np.int64)
+    # Máscara (sobre todas las filas) de cada condición deduplicada en esta ejecución
+    cache = {}
+    empty = {}
+    profiled = []
+    for pos, (rule, groups) in enumerate(zip(plan.rules, plan.rule_groups)):
+        start = time.perf_counter()
+        skipped = SKIP_DEAD_RULES and plan.rule_is_dead(views, pos, empty)
+        mask = np.zeros(n_rows, dtype=bool)
+        conditions, error = [], ""
+        try:
+            for g, idxs in enumerate([] if skipped else groups, start=1):
+                rows = None
+                for c in idxs:
+                    entry = {"level": PROFILE_LEVEL_CONDITION, "group": g, "condition": _describe_key(plan.conditions[c]),
+                             "rows_evaluated": n_rows if rows is None else len(rows)}
+                    conditions.append(entry)
+                    t0 = time.perf_counter()
+                    try:
+                        if c not in cache and rows is None:
+                            try:
+                                cache[c] = _evaluate_key(views, plan.conditions[c])
+                            except Exception as e:
+                                cache[c] = e
+                        if isinstance(cache.get(c), Exception):
+                            raise cache[c]
+                        if c in cache:
+                            hit = cache[c] if rows is None else cache[c][rows]
+                        else:
+                            hit = _evaluate_key(views, plan.conditions[c], rows)
+                    finally:
+                        entry["seconds"] = time.perf_counter() - t0
+                    rows = np.flatnonzero(hit) if rows is None else rows[hit]
+                    entry["rows_matched"] = len(rows)
+                mask[rows] = True
+        except Exception as e:
+            error, mask = str(e), None
+        if mask is not None:
+            winner[mask] = pos
+        profiled.append((rule, time.perf_counter() - start, mask, conditions, skipped, error))
+
+    wins = np.bincount(winner + 1, minlength=len(plan.rules) + 1)[1:]
+    records = []
+    for pos in range(len(plan.rules) - 1, -1, -1):
+        rule, seconds, mask, conditions, skipped, error = profiled[pos]
+        common = {"rule_id": rule.get('id', pos), "reason": rule.get('reason', ''),
+                  "indexed": pos in plan.indexed, "skipped": skipped}
+        records.append({
+            **common, "level": PROFILE_LEVEL_RULE, "group": None, "condition": "", "seconds": seconds,
+            "rows_evaluated": 0 if skipped else n_rows, "rows_matched": int(mask.sum()) if mask is not None else 0,
+            "rows_won": int(wins[pos]), "error": error,
+        })
+        for entry in conditions:
+            records.append({**common, "rows_won": None, "error": "", "rows_matched": 0, **entry})
+        if error and conditions:
+            # La evaluación se detiene en la condición que falla (la última medida)
+            records[-1]["error"] = error
+    return pd.DataFrame(records, columns=PROFILE_COLUMNS).astype({"group": "Int64", "rows_won": "Int64"})
+
+
+def compile_rules(rules: list, as_of=None) -> RulePlan:
+    """Compila la lista de reglas en un plan de ejecución (ver RulePlan)."""
+    return RulePlan(rules, as_of)
+
+
+def build_rule_mask(df: pd.DataFrame, rule: dict, as_of=None) -> pd.Series:
+    """
+    Máscara de las filas que cumplen la regla: TODAS las condiciones de
+    alguno de sus grupos.
+
+    Args:
+        df (pd.DataFrame): Datos a evaluar (no se modifican).
+        rule (dict): Regla con su lista de 'conditions' o sus 'condition_groups'.
+        as_of (optional): Fecha de referencia de los operadores de fecha relativos.
+
+    Returns:
+        pd.Series: Máscara booleana (todo False si la regla no tiene condiciones).
+    """
+    # Unión (OR) de la intersección (AND) de cada grupo, con vistas compartidas
+    views = ColumnViews(df)
+    cache = {}
+    final_mask = np.zeros(len(df), dtype=bool)
+    for group in rule_condition_groups(rule):
+        group_mask = np.ones(len(df), dtype=bool)
+        for cond in group:
+            key = condition_key(cond, as_of)
+            if key not in cache:
+                cache[key] = _evaluate_key(views, key)
+            group_mask &= cache[key]
+        final_mask |= group_mask
+    return pd.Series(final_mask, index=df.index)
+
+
+# --- Resultado final: prioridad y motivo ---
+
+NO_RULE_REASON = "Sin Regla Asignada"
+MANUAL_REASON = "Ingreso Manual"
+# Prioridades que el usuario puede haber puesto a mano (se conservan si ninguna regla aplica)
+MANUAL_PRIORITIES = [
+    "Minima", "Media", "Alta", "🚩 Maxima Prioridad",  # Español
+    "Low", "Medium", "High", "🚩 Max Priority"         # Inglés
+]
+
+# Memoización de la regla ganadora por fila: {(versión de datos, filas, huella del plan): np.ndarray}.
+# Es del proceso, así que la comparten todas las sesiones de Streamlit.
+WINNER_MEMO_SIZE = 8
+_WINNER_MEMO = OrderedDict()
+_WINNER_MEMO_LOCK = threading.Lock()
+
+
+def clear_rules_memo():
+    """Vacía la memoización de resultados."""
+    with _WINNER_MEMO_LOCK:
+        _WINNER_MEMO.clear()
+
+
+def rule_winners(df: pd.DataFrame, plan: RulePlan, data_version=None, mask_cache: RuleMaskCache = None,
+                 mode: str = EVAL_MODE_FIRST_MATCH) -> np.ndarray:
+    """
+    Posición en plan.rules de la regla ganadora de cada fila (-1 = ninguna).
+
+    Args:
+        df (pd.DataFrame): Datos a evaluar (no se modifican).
+        plan (RulePlan): Reglas compiladas.
+        data_version (optional): Identificador de la versión de los datos
+                                 (p. ej. DataStore.data_version). Si se indica,
+                                 el resultado se memoriza y se reutiliza.
+        mask_cache (RuleMaskCache, optional): Caché de máscaras por regla ya
+                                 asociada a la versión de los datos. Necesita
+                                 las máscaras completas, así que fuerza el
+                                 modo 'overwrite'.
+        mode (str): EVAL_MODE_FIRST_MATCH (por defecto) u EVAL_MODE_OVERWRITE.
+                    Ambos dan el mismo resultado.
+    """
+    memo_key = None
+    if data_version is not None and not plan.reads_engine_columns:
+        memo_key = (data_version, len(df), plan.fingerprint)
+        with _WINNER_MEMO_LOCK:
+            cached = _WINNER_MEMO.get(memo_key)
+            if cached is not None:
+                _WINNER_MEMO.move_to_end(memo_key)
+                return cached
+
+    if mode == EVAL_MODE_FIRST_MATCH and mask_cache is None:
+        # Por precedencia: la primera regla que coincide decide la fila
+        winner = plan.first_match_winners(df)
+    else:
+        # Cada coincidencia sobrescribe a las de las reglas anteriores,
+        # igual que asignar regla a regla.
+        winner = np.full(len(df), -1, dtype=np.int64)
+        for i, (rule, final_mask) in enumerate(plan.rule_masks(df, mask_cache)):
+            if final_mask is not None:
+                winner[final_mask] = i
+        if mask_cache is not None:
+            mask_cache.prune()
+
+    if memo_key is not None:
+        winner = winner.astype(np.int32)
+        winner.setflags(write=False)
+        with _WINNER_MEMO_LOCK:
+            _WINNER_MEMO[memo_key] = winner
+            while len(_WINNER_MEMO) > WINNER_MEMO_SIZE:
+                _WINNER_MEMO.popitem(last=False)
+    return winner
+
+
+def evaluate_rules(df: pd.DataFrame, rules: list, data_version=None, mask_cache: RuleMaskCache = None,
+                   mode: str = EVAL_MODE_FIRST_MATCH, as_of=None) -> tuple:
+    """
+    Punto de entrada puro del motor.
+
+    Args:
+        df (pd.DataFrame): Datos a evaluar (no se modifican). Su columna
+                           'Priority' actual decide los ingresos manuales.
+        rules (list): Reglas a aplicar.
+        data_version, mask_cache, mode: Ver rule_winners.
+        as_of (optional): Fecha de referencia de los operadores de fecha
+                          relativos (por defecto, hoy). Forma parte de la
+                          huella del plan, así que cambiarla invalida la
+                          memoización.
+
+    Returns:
+        tuple: (np.ndarray de prioridades, np.ndarray de motivos), alineados con df.
+    """
+    plan = compile_rules(rules, as_of)
+    winner = rule_winners(df, plan, data_version, mask_cache, mode)
+
+    # Una sola escritura: prioridad y motivo de la regla ganadora
+    # (la última posición corresponde a "sin regla")
+    priorities = np.array([r.get('priority', 'Media') for r in plan.rules] + [NO_RULE_REASON], dtype=object)
+    reasons = np.array([r.get('reason', 'Regla Personalizada') for r in plan.rules] + [NO_RULE_REASON], dtype=object)
+    priority_calculated = priorities[winner]
+    priority_reason = reasons[winner]
+
+    # Preservar ingresos manuales (Override del Usuario)
+    # Si el motor NO asignó regla, pero el usuario tenía un valor manual válido, restaurarlo.
+    if 'Priority' in df.columns:
+        mask_restore_manual = (priority_reason == NO_RULE_REASON) & df['Priority'].isin(MANUAL_PRIORITIES).to_numpy()
+        if mask_restore_manual.any():
+            priority_calculated[mask_restore_manual] = df['Priority'].to_numpy()[mask_restore_manual]
+            priority_reason[mask_restore_manual] = MANUAL_REASON
+
+    return priority_calculated, priority_reason
@@ -12,11 +12,24 @@ el sistema ahora aplica las reglas en orden INVERSO de su número de 'Orden'.
 - Primero se ejecutan las reglas de orden alto (ej. 100).
 - Al final se ejecutan las reglas de orden bajo (ej. 1).
 De esta forma, la regla con el número más pequeño es la que "gana" al final.
+
+La evaluación vive en rules_engine.py (sin Streamlit); este módulo añade las
+reglas del estado de sesión y la escritura en el DataFrame.
 """
 
 import streamlit as st
+from streamlit import runtime
 import pandas as pd
-import numpy as np
+from modules.rules_engine import (
+    NUMERIC_OPERATORS, LIST_OPERATORS, DATE_OPERATORS, RELATIVE_DATE_OPERATORS, EVAL_MODE_FIRST_MATCH, EVAL_MODE_OVERWRITE, ENGINE_COLUMNS,
+    ColumnViews, RulePlan, RuleMaskCache, RuleMatchIndex,
+    condition_key, compile_rules, build_rule_mask, rules_fingerprint, rule_signature, resolve_as_of,
+    rule_condition_groups,
+    RULE_STATUS_OK, RULE_STATUS_DEAD, RULE_STATUS_SHADOWED, RULE_STATUS_ALWAYS_TRUE, RULE_STATUS_ERROR,
+    PROFILE_COLUMNS, PROFILE_LEVEL_RULE, PROFILE_LEVEL_CONDITION,
+    evaluate_rules, clear_rules_memo, _evaluate_condition,
+)
+from modules import rules_engine
 
 def get_default_rules():
     """
@@ -64,66 +77,71 @@ def get_default_rules():
         }
     ]
 
-def _evaluate_condition(df: pd.DataFrame, condition: dict) -> pd.Series:
+def _resolve_rules(rules: list = None) -> list:
+    """Reglas indicadas, o las del estado de sesión (o las de por defecto)."""
+    if rules is None:
+        rules = st.session_state.get('priority_rules')
+        if not rules or not isinstance(rules, list):
+            rules = get_default_rules()
+            st.session_state.priority_rules = rules
+    return rules
+
+def _resolve_as_of(as_of=None):
     """
-    Evalúa una sola condición contra el DataFrame de forma vectorizada.
-    
-    Args:
-        df (pd.DataFrame): DataFrame a evaluar.
-        condition (dict): Diccionario con keys 'column', 'operator', 'value'.
-        
-    Returns:
-        pd.Series: Serie booleana (True donde se cumple la condición).
+    Fecha de referencia indicada, o la configurada en la sesión
+    ('rules_as_of'; None = hoy). Fuera de Streamlit (CLI, API) no se consulta
+    la sesión.
     """
-    col = condition.get("column")
-    op = condition.get("operator")
-    val = condition.get("value")
+    if as_of is None and runtime.exists():
+        as_of = st.session_state.get('rules_as_of')
+    return as_of
 
-    if col not in df.columns:
-        return pd.Series(False, index=df.index)
+def build_match_index(df: pd.DataFrame, rules: list = None, mask_cache: RuleMaskCache = None,
+                      as_of=None) -> RuleMatchIndex:
+    """
+    Evalúa todas las reglas (por defecto, las de sesión) y devuelve su bitmap
+    de coincidencias por fila (ver rules_engine.build_match_index).
+    """
+    return rules_engine.build_match_index(df, _resolve_rules(rules), mask_cache, _resolve_as_of(as_of))
 
-    # Normalización de la columna base
-    series = df[col]
-    
-    # --- Lógica Numérica (Operadores Matemáticos) ---
-    if op in [">", "<", ">=", "<="]:
-        # Convertir columna a número forzosamente, errores a 0
-        series_numeric = pd.to_numeric(series, errors='coerce').fillna(0)
-        try:
-            val_numeric = float(val)
-        except (ValueError, TypeError):
-            val_numeric = 0.0
-            
-        if op == ">": return series_numeric > val_numeric
-        if op == "<": return series_numeric < val_numeric
-        if op == ">=": return series_numeric >= val_numeric
-        if op == "<=": return series_numeric <= val_numeric
-
-    # --- Lógica de Texto (Operadores de String) ---
-    # Convertir todo a string para evitar errores de tipo
-    series_str = series.fillna("").astype(str)
-    val_str = str(val)
-
-    if op == "contains":
-        # case=False hace que ignore mayúsculas/minúsculas
-        # regex=True es el default en pandas str.contains, permitiendo el uso de '|' y '\s'
-        return series_str.str.contains(val_str, case=False, na=False, regex=True)
-    elif op == "is":
-        # Comparación exacta insensible a mayúsculas
-        return series_str.str.lower() == val_str.lower()
-    elif op == "is_not":
-        return series_str.str.lower() != val_str.lower()
-    elif op == "starts_with":
-        return series_str.str.lower().str.startswith(val_str.lower())
-    
-    return pd.Series(False, index=df.index)
+def analyze_rules(df: pd.DataFrame, rules: list = None, mask_cache: RuleMaskCache = None, as_of=None) -> dict:
+    """
+    Diagnóstico de las reglas (por defecto, las de sesión) sobre los datos:
+    reglas muertas, tapadas o que coinciden con todo, con sus coincidencias
+    y filas ganadas (ver rules_engine.analyze_rules).
+    """
+    return rules_engine.analyze_rules(df, _resolve_rules(rules), mask_cache, _resolve_as_of(as_of))
+
+def profile_rules(df: pd.DataFrame, rules: list = None, as_of=None) -> pd.DataFrame:
+    """
+    Tiempo, filas evaluadas, coincidencias y filas ganadas de cada regla
+    (por defecto, las de sesión) y de cada condición (ver rules_engine.profile_rules).
+    """
+    return rules_engine.profile_rules(df, _resolve_rules(rules), _resolve_as_of(as_of))
 
-def apply_priority_rules(df: pd.DataFrame) -> pd.DataFrame:
+def apply_priority_rules(df: pd.DataFrame, rules: list = None, mask_cache: RuleMaskCache = None,
+                         mode: str = EVAL_MODE_FIRST_MATCH, data_version=None, as_of=None) -> pd.DataFrame:
     """
     Aplica el motor de reglas multi-condición al DataFrame.
     
     Args:
         df (pd.DataFrame): DataFrame de entrada.
+        rules (list, optional): Reglas a aplicar. Si no se indican se usan las
+                                del estado de sesión (o las de por defecto).
+                                Permite usar el motor fuera de Streamlit (CLI).
+        mask_cache (RuleMaskCache, optional): Caché de máscaras ya asociada a la
+                                versión actual de los datos (editor de reglas).
+                                Necesita las máscaras completas, así que fuerza
+                                el modo 'overwrite'.
+        mode (str): EVAL_MODE_FIRST_MATCH (por defecto) u EVAL_MODE_OVERWRITE.
+                    Ambos dan el mismo resultado.
+        data_version (optional): Versión de los datos (DataStore.data_version).
+                                Si se indica, la regla ganadora por fila se
+                                memoriza y se reutiliza mientras los datos y
+                                el plan de reglas no cambien.
+        as_of (optional): Fecha de referencia de los operadores de fecha
+                                relativos. Por defecto, la de la sesión
+                                ('rules_as_of') o, si no hay, hoy.
         
     Returns:
         pd.DataFrame: DataFrame con las columnas 'Priority' y 'Priority_Reason' actualizadas.
@@ -131,70 +149,44 @@ def apply_priority_rules(df: pd.DataFrame) -> pd.DataFrame:
     if 'Priority' not in df.columns:
         return df
 
-    # 1. Obtener reglas del estado o cargar defaults
-    rules = st.session_state.get('priority_rules')
-    if not rules or not isinstance(rules, list):
-        rules = get_default_rules()
-        st.session_state.priority_rules = rules
-        
-    # --- CORRECCIÓN CRÍTICA: ORDEN INVERSO ---
-    # Ordenar por campo 'order'. Usamos reverse=True para que las reglas con
-    # números ALTOS se ejecuten primero, y las de números BAJOS (más importantes)
-    # se ejecuten al final, sobrescribiendo el resultado.
-    active_rules = sorted(
-        [r for r in rules if r.get('enabled', True)],
-        key=lambda x: x.get('order', 99),
-        reverse=True 
-    )
-    
-    # 2. Inicializar columnas temporales de cálculo
-    df['Priority_Calculated'] = "Sin Regla Asignada"
-    df['Priority_Reason'] = "Sin Regla Asignada"
-    
-    # 3. Procesar cada regla
-    for rule in active_rules:
-        conditions = rule.get('conditions', [])
-        if not conditions:
-            continue
-            
-        try:
-            # Comenzar con una máscara donde TODO es True (para lógica AND)
-            final_mask = pd.Series(True, index=df.index)
-            
-            # Intersección de máscaras (AND) de cada condición
-            for cond in conditions:
-                cond_mask = _evaluate_condition(df, cond)
-                final_mask = final_mask & cond_mask
-            
-            # Aplicar cambios si hay coincidencias
-            if final_mask.any():
-                r_prio = rule.get('priority', 'Media')
-                r_reason = rule.get('reason', 'Regla Personalizada')
-                
-                df.loc[final_mask, 'Priority_Calculated'] = r_prio
-                df.loc[final_mask, 'Priority_Reason'] = r_reason
-                
-        except Exception as e:
-            print(f"Error aplicando regla {rule.get('id')}: {e}")
-            continue
-
-    # 4. Preservar ingresos manuales (Override del Usuario)
-    # Si el motor NO asignó regla, pero el usuario tenía un valor manual válido, restaurarlo.
-    manual_priorities = [
-        "Minima", "Media", "Alta", "🚩 Maxima Prioridad",  # Español
-        "Low", "Medium", "High", "🚩 Max Priority"         # Inglés
-    ]
-    
-    mask_no_rule_applied = (df['Priority_Reason'] == "Sin Regla Asignada")
-    mask_had_manual_value = df['Priority'].isin(manual_priorities) & (df['Priority'] != "")
-    
-    mask_restore_manual = mask_no_rule_applied & mask_had_manual_value
-    
-    if mask_restore_manual.any():
-        df.loc[mask_restore_manual, 'Priority_Calculated'] = df.loc[mask_restore_manual, 'Priority']
-        df.loc[mask_restore_manual, 'Priority_Reason'] = "Ingreso Manual"
-    
-    # 5. Finalizar y limpiar
-    df['Priority'] = df['Priority_Calculated']
-    
-    return df.drop(columns=['Priority_Calculated'], errors='ignore')
\ No newline at end of file
+    # Reglas del estado o por defecto; el motor respeta el orden INVERSO de 'order'
+    priority, reason = evaluate_rules(df, _resolve_rules(rules), data_version, mask_cache, mode, _resolve_as_of(as_of))
+    df['Priority'] = priority
+    df['Priority_Reason'] = reason
+    return df
+
+
+def apply_priority_rules_to_rows(df: pd.DataFrame, labels, rules: list = None, as_of=None) -> pd.DataFrame:
+    """
+    Reevalúa las reglas sólo en las filas indicadas (p. ej. las editadas).
+
+    Cada condición depende únicamente de los valores de su propia fila, así
+    que el resultado es idéntico a ejecutar apply_priority_rules sobre todo
+    el DataFrame, pero el coste es proporcional a las filas modificadas.
+
+    Args:
+        df (pd.DataFrame): DataFrame completo (se modifica in situ).
+        labels: Etiquetas de las filas a reevaluar.
+        rules (list, optional): Reglas a aplicar (por defecto, las de sesión).
+        as_of (optional): Fecha de referencia (ver apply_priority_rules).
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame con 'Priority' y 'Priority_Reason'
+                      actualizadas en esas filas.
+    """
+    if 'Priority' not in df.columns:
+        return df
+    if 'Priority_Reason' not in df.columns:
+        return apply_priority_rules(df, rules, as_of=as_of)
+
+    rows = df.index.intersection(pd.Index(labels), sort=False)
+    if rows.empty:
+        return df
+
+    rules = _resolve_rules(rules)
+    columns = [c for c in compile_rules(rules).columns if c in df.columns and c != 'Priority']
+    subset = apply_priority_rules(df.loc[rows, columns + ['Priority']], rules, as_of=as_of)
+
+    df.loc[rows, 'Priority'] = subset['Priority'].to_numpy()
+    df.loc[rows, 'Priority_Reason'] = subset['Priority_Reason'].to_numpy()
+    return df
@@ -0,0 +1,241 @@
+# modules/schema.py
+"""
+Esquema de Columnas (Schema).
+
+Define de forma declarativa el tipo de dato de cada columna conocida del
+archivo de facturas (a partir de COLUMN_TRANSLATIONS en translator.py), en
+lugar de adivinarlo por subcadenas del nombre.
+
+Tipos ('kinds') soportados:
+- 'numeric':  Montos, antigüedades e identificadores numéricos.
+- 'date':     Fechas, como datetime64 (NaT si están vacías o son inválidas).
+- 'category': Texto de baja cardinalidad (proveedor, estado, grupo de pago,
+              moneda, emails...). Se guarda como dtype 'category' de pandas:
+              cada valor distinto se almacena una sola vez y las comparaciones
+              (==, contains) se resuelven sobre las categorías.
+- 'text':     Texto libre o de alta cardinalidad (descripciones, nº de factura).
+
+Las columnas no declaradas (archivos con columnas nuevas) usan la heurística
+histórica basada en el nombre.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from modules.translator import COLUMN_TRANSLATIONS
+
+KIND_NUMERIC = "numeric"
+KIND_DATE = "date"
+KIND_CATEGORY = "category"
+KIND_TEXT = "text"
+
+# Columnas de texto con pocos valores distintos (se codifican como 'category')
+CATEGORY_COLUMNS = {
+    "Status", "Assignee", "Vendor Name", "Operating Unit Name", "Pay Group",
+    "Pay Status", "WEC Email Inbox", "Sender Email", "Document Type",
+    "Vendor Site Name", "Title", "Currency Code", "Acquired By", "Requesters",
+    "Buyers", "Payment Method", "Payment Terms", "Vendor Type", "Matching Status",
+}
+
+# Columnas de texto libre o calculadas por la aplicación (se mantienen como 'object')
+TEXT_COLUMNS = {
+    "Invoice #", "System Invoice #", "PO", "Description",
+    "Priority", "Priority_Reason", "Row Status",
+}
+
+
+def infer_kind(column: str) -> str:
+    """
+    Heurística por nombre para columnas no declaradas en el esquema.
+
+    Args:
+        column (str): Nombre de la columna (ya sin espacios).
+
+    Returns:
+        str: Uno de KIND_NUMERIC, KIND_DATE o KIND_TEXT.
+    """
+    if ('Total' in column or 'Amount' in column or 'Age' in column or 'Number' in column or 'ID' in column) \
+            and 'Assignee' not in column:
+        return KIND_NUMERIC
+    if 'Date' in column:
+        return KIND_DATE
+    return KIND_TEXT
+
+
+def _declared_kind(column: str) -> str:
+    if column in CATEGORY_COLUMNS:
+        return KIND_CATEGORY
+    if column in TEXT_COLUMNS:
+        return KIND_TEXT
+    return infer_kind(column)
+
+
+# Esquema declarativo: {columna: tipo}
+COLUMN_SCHEMA = {column: _declared_kind(column) for column in COLUMN_TRANSLATIONS}
+
+
+def get_column_kind(column: str) -> str:
+    """Devuelve el tipo declarado de una columna (o el inferido si no está declarada)."""
+    return COLUMN_SCHEMA.get(column) or infer_kind(column)
+
+
+def to_category(series: pd.Series) -> pd.Series:
+    """
+    Convierte una serie de texto a 'category' con los nulos como "".
+
+    Si ya es categórica sólo rellena los nulos (sin recodificar).
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        if series.isna().any():
+            if "" not in series.cat.categories:
+                series = series.cat.add_categories([""])
+            series = series.fillna("")
+        return series
+    return series.fillna("").astype(str).astype("category")
+
+
+def as_text(series: pd.Series) -> pd.Series:
+    """
+    Vista de texto de una serie para comparaciones (nulos como "").
+
+    Las series categóricas se devuelven tal cual (sin expandir a 'object'),
+    de modo que las operaciones .str y == trabajen sobre las categorías.
+    Las fechas se formatean como texto ISO ('2025-05-19') y NaT como "".
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return to_category(series)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return series.astype(str).replace("NaT", "")
+    return series.fillna("").astype(str)
+
+
+def add_categories(df: pd.DataFrame, column: str, values) -> None:
+    """
+    Añade (in situ) a una columna categórica las categorías nuevas de 'values'.
+
+    Debe llamarse antes de asignar valores nuevos a celdas de una columna
+    categórica; en columnas no categóricas no hace nada.
+
+    Args:
+        df (pd.DataFrame): DataFrame a modificar.
+        column (str): Columna destino.
+        values: Valor escalar o iterable de valores que se van a escribir.
+    """
+    if column not in df.columns or not isinstance(df[column].dtype, pd.CategoricalDtype):
+        return
+    if isinstance(values, (str, bytes)) or not hasattr(values, '__iter__'):
+        values = [values]
+    current = df[column].cat.categories
+    new = pd.Index(pd.unique(pd.Series(list(values), dtype=object).dropna().astype(str)))
+    new = new.difference(current)
+    if len(new):
+        df[column] = df[column].cat.add_categories(new)
+
+
+def enforce_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Restaura los tipos 'category' y de fecha de las columnas declaradas que
+    los hayan perdido (p. ej. tras un concat con filas nuevas del editor o al
+    reconstruir los datos desde un JSON de configuración).
+
+    Args:
+        df (pd.DataFrame): DataFrame a revisar (se modifica in situ).
+
+    Returns:
+        pd.DataFrame: El mismo DataFrame.
+    """
+    for column in df.columns:
+        kind = get_column_kind(column)
+        if kind == KIND_CATEGORY and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = to_category(df[column])
+        elif kind == KIND_DATE and not pd.api.types.is_datetime64_any_dtype(df[column].dtype):
+            df[column] = to_datetime_series(df[column])
+    return df
+
+
+def values_equal(a: pd.Series, b: pd.Series) -> np.ndarray:
+    """
+    Igualdad elemento a elemento de dos series de igual longitud (por posición),
+    tratando nulo == nulo como igual. Números y fechas se comparan por valor;
+    el resto como texto (las categorías con distintas categorías son comparables).
+    """
+    if pd.api.types.is_numeric_dtype(a.dtype) and pd.api.types.is_numeric_dtype(b.dtype):
+        av, bv = a.to_numpy(dtype="float64"), b.to_numpy(dtype="float64")
+        return (av == bv) | (np.isnan(av) & np.isnan(bv))
+    if pd.api.types.is_datetime64_any_dtype(a.dtype) and pd.api.types.is_datetime64_any_dtype(b.dtype):
+        return (a.to_numpy() == b.to_numpy()) | (a.isna().to_numpy() & b.isna().to_numpy())
+    return as_text(a).astype(object).to_numpy() == as_text(b).astype(object).to_numpy()
+
+
+def to_datetime_series(values) -> pd.Series:
+    """
+    Convierte valores de fecha (texto, date, Timestamp) a datetime64.
+
+    Los vacíos y los valores no interpretables quedan como NaT.
+    """
+    series = pd.Series(values) if not isinstance(values, pd.Series) else values
+    return pd.to_datetime(series, errors='coerce')
+
+
+def parse_list_value(value) -> list:
+    """
+    Valores de un operador de lista ('in' / 'not_in').
+
+    Acepta una lista (o tupla/conjunto) o un texto separado por '|'
+    ('ACME|Globex'). Descarta vacíos y duplicados conservando el orden.
+    """
+    if isinstance(value, (list, tuple, set)):
+        items = value
+    else:
+        items = str(value).split("|") if value is not None else []
+    return list(dict.fromkeys(str(v).strip() for v in items if str(v).strip()))
+
+
+def parse_range_value(value) -> tuple:
+    """
+    Límites (mínimo, máximo) del operador 'between', ambos incluidos.
+
+    Acepta una lista de dos valores o un texto 'mínimo|máximo'.
+
+    Raises:
+        ValueError: Si no hay exactamente dos límites.
+    """
+    items = list(value) if isinstance(value, (list, tuple)) else str(value).split("|")
+    if len(items) != 2:
+        raise ValueError(f"'between' necesita dos límites: {value!r}")
+    return items[0], items[1]
+
+
+def concat_frames(frames: list, ignore_index: bool = True) -> pd.DataFrame:
+    """
+    Concatena DataFrames conservando el tipo 'category'.
+
+    pd.concat convierte a 'object' las columnas categóricas cuyas categorías
+    difieren entre archivos; aquí se unifican antes (union_categoricals).
+
+    Args:
+        frames (list): DataFrames a unir.
+        ignore_index (bool): Generar un índice nuevo (True) o conservar el
+                             de cada DataFrame (False).
+
+    Returns:
+        pd.DataFrame: Resultado de la concatenación.
+    """
+    frames = [f for f in frames if f is not None]
+    if len(frames) <= 1:
+        if not frames:
+            return pd.DataFrame()
+        return frames[0].reset_index(drop=True) if ignore_index else frames[0]
+
+    columns = set().union(*(f.columns for f in frames))
+    cat_columns = [
+        c for c in columns
+        if all(c in f.columns and isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames)
+    ]
+    if cat_columns:
+        frames = [f.copy(deep=False) for f in frames]
+        for c in cat_columns:
+            categories = union_categoricals([f[c] for f in frames], ignore_order=True).categories
+            for f in frames:
+                f[c] = f[c].cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=ignore_index)
@@ -104,6 +104,20 @@ LANGUAGES = {
         "info_upload": "Por favor, cargue un archivo .xlsx para comenzar.",
         "error_critical": "Error Crítico al procesar el archivo: {e}",
         "error_corrupt": "El archivo puede estar corrupto o tener un formato inesperado.",
+        "loading_files_progress": "Leyendo archivos ({done}/{total}) {name}",
+        "streaming_progress": "⏳ Cargando {name}: {n:,} filas leídas...",
+        "append_files_expander": "➕ Añadir archivos",
+        "append_files_label": "Archivos a añadir a los datos actuales",
+        "append_files_button": "Añadir filas",
+        "append_files_success": "✅ {n} filas añadidas o actualizadas.",
+        "merge_expander": "🔁 Duplicados entre cargas",
+        "merge_keys_label": "Columnas clave de factura",
+        "merge_policy_label": "Si la factura ya existe",
+        "merge_policy_keep_latest": "Actualizar con la versión más reciente",
+        "merge_policy_keep_first": "Conservar la versión existente",
+        "merge_changed_only_label": "Actualizar sólo los campos que cambian",
+        "merge_report": "Insertadas: {inserted} | Actualizadas: {updated} | Sin cambios: {unchanged} | Omitidas: {skipped} | En conflicto con ediciones: {conflicts} | Duplicadas en la carga: {duplicates_in_load}",
+        "streaming_preview_info": "Vista previa: se muestran las primeras filas mientras se carga el resto del archivo. La edición se habilita al terminar la carga.",
         "hotkey_loading_warning": "⚠️ **Atención:** Por favor, no use atajos de teclado (ej. Ctrl+S) mientras se esté cargando el editor de datos.",
 
         # --- 2. FILTROS Y BÚSQUEDA ---
@@ -153,6 +167,7 @@ LANGUAGES = {
         "sort_opt_max_min": "🔼 Max-Min",
         "sort_opt_min_max": "🔽 Min-Max",
         "perf_mode_tooltips_off": "🚀 Modo Rendimiento: Tooltips desactivados (> {n} filas).",
+        "tooltip_also_matched": "También coinciden: {rules}",
         "select_all_btn": "☑️ Todos",
         "deselect_all_btn": "⬜ Ninguno",
 
@@ -264,6 +279,33 @@ LANGUAGES = {
         "rule_val_num_lbl": "Valor Numérico",
         "help_num_val": "Escriba solo el número. El sistema se encarga de la comparación matemática.",
         "rule_sel_list_cap": "📋 Seleccione de la lista:",
+        "rule_sel_multi_cap": "📋 Seleccione uno o varios valores:",
+        "rule_write_list_cap": "✍️ Escriba los valores separados por '|':",
+        "rule_ph_list": "Ej. ACME|Globex|Initech",
+        "rule_val_min_lbl": "Mínimo",
+        "rule_val_max_lbl": "Máximo",
+        "lbl_or_group": "— O —",
+        "btn_add_or_group": "➕ Añadir grupo alternativo (O)",
+        "help_or_group": "Las condiciones de un grupo deben cumplirse todas (Y); la regla aplica si se cumple cualquiera de los grupos (O).",
+        "rule_val_days_lbl": "Número de días",
+        "help_days_val": "Días contados desde la fecha de referencia de las reglas.",
+        "rule_val_date_lbl": "Fecha",
+        "rules_as_of_lbl": "📅 Fecha de referencia",
+        "help_rules_as_of": "Fecha con la que se calculan 'En los próximos N días' y 'Hace más de N días'. Por defecto, hoy.",
+        "rule_stats_cap": "📊 Coincide con {matches:,} filas · gana {wins:,}",
+        "rule_status_dead": "💤 No coincide con ninguna fila de los datos actuales.",
+        "rule_status_shadowed": "🌓 Tapada: todas sus filas las gana otra regla (sobre todo '{by}').",
+        "rule_status_always_true": "♾️ Coincide con todas las filas: tapa a las reglas de menor precedencia.",
+        "rule_status_error": "⚠️ No se pudo evaluar (revise sus condiciones).",
+        "rules_findings_summary": "🔎 {n} regla(s) activa(s) sin efecto o a revisar.",
+        "btn_profile_rules": "⏱️ Medir coste de las reglas",
+        "help_profile_rules": "Evalúa cada regla activa sobre todas las filas y mide el tiempo, las filas evaluadas, las coincidencias y las filas ganadas de cada regla y condición.",
+        "rules_profile_title": "⏱️ Perfil de reglas (más lentas primero)",
+        "btn_download_profile": "⬇️ Exportar perfil (Excel)",
+        "rule_profile_cap": "⏱️ {ms:,.1f} ms · evalúa {evaluated:,} filas · cumple {matched:,} · gana {won:,}",
+        "rule_profile_cond": "{cond}: {ms:,.1f} ms · {evaluated:,} → {matched:,} filas",
+        "rule_profile_skipped": "⏭️ No se evalúa: ninguna fila puede cumplirla.",
+        "rule_profile_indexed": "🗂️ En la evaluación normal se resuelve con el índice de reglas (coste menor).",
         "rule_val_lbl": "Valor",
         "rule_ph_contains": "Ej. 'Servicios' (Buscará texto parcial)",
         "rule_ph_starts": "Ej. 'INV-' (Debe empezar así)",
@@ -373,6 +415,20 @@ LANGUAGES = {
         "info_upload": "Please upload an .xlsx file to start.",
         "error_critical": "Critical Error processing file: {e}",
         "error_corrupt": "File may be corrupt or have an unexpected format.",
+        "loading_files_progress": "Reading files ({done}/{total}) {name}",
+        "streaming_progress": "⏳ Loading {name}: {n:,} rows read...",
+        "append_files_expander": "➕ Append files",
+        "append_files_label": "Files to append to the current data",
+        "append_files_button": "Append rows",
+        "append_files_success": "✅ {n} rows appended or updated.",
+        "merge_expander": "🔁 Duplicates across loads",
+        "merge_keys_label": "Invoice key columns",
+        "merge_policy_label": "If the invoice already exists",
+        "merge_policy_keep_latest": "Update with the latest version",
+        "merge_policy_keep_first": "Keep the existing version",
+        "merge_changed_only_label": "Update changed fields only",
+        "merge_report": "Inserted: {inserted} | Updated: {updated} | Unchanged: {unchanged} | Skipped: {skipped} | Conflicting with edits: {conflicts} | Duplicates in load: {duplicates_in_load}",
+        "streaming_preview_info": "Preview: showing the first rows while the rest of the file loads. Editing is enabled once loading finishes.",
         "hotkey_loading_warning": "⚠️ **Attention:** Please do not use keyboard shortcuts (e.g. Ctrl+S) while the data editor is loading.",
 
         # --- 2. FILTERS AND SEARCH ---
@@ -422,6 +478,7 @@ LANGUAGES = {
         "sort_opt_max_min": "🔼 Max-Min",
         "sort_opt_min_max": "🔽 Min-Max",
         "perf_mode_tooltips_off": "🚀 Performance Mode: Tooltips disabled (> {n} rows).",
+        "tooltip_also_matched": "Also matched: {rules}",
         "select_all_btn": "☑️ All",
         "deselect_all_btn": "⬜ None",
 
@@ -533,6 +590,33 @@ LANGUAGES = {
         "rule_val_num_lbl": "Numeric Value",
         "help_num_val": "Type only the number. The system handles mathematical comparison.",
         "rule_sel_list_cap": "📋 Select from list:",
+        "rule_sel_multi_cap": "📋 Select one or more values:",
+        "rule_write_list_cap": "✍️ Type the values separated by '|':",
+        "rule_ph_list": "e.g. ACME|Globex|Initech",
+        "rule_val_min_lbl": "Minimum",
+        "rule_val_max_lbl": "Maximum",
+        "lbl_or_group": "— OR —",
+        "btn_add_or_group": "➕ Add alternative group (OR)",
+        "help_or_group": "All conditions in a group must match (AND); the rule applies when any group matches (OR).",
+        "rule_val_days_lbl": "Number of days",
+        "help_days_val": "Days counted from the rules reference date.",
+        "rule_val_date_lbl": "Date",
+        "rules_as_of_lbl": "📅 Reference date",
+        "help_rules_as_of": "Date used by 'Within the next N days' and 'Older than N days'. Defaults to today.",
+        "rule_stats_cap": "📊 Matches {matches:,} rows · wins {wins:,}",
+        "rule_status_dead": "💤 Does not match any row of the current data.",
+        "rule_status_shadowed": "🌓 Shadowed: every matching row is won by another rule (mostly '{by}').",
+        "rule_status_always_true": "♾️ Matches every row: shadows all lower-precedence rules.",
+        "rule_status_error": "⚠️ Could not be evaluated (check its conditions).",
+        "rules_findings_summary": "🔎 {n} active rule(s) with no effect or to review.",
+        "btn_profile_rules": "⏱️ Measure rule cost",
+        "help_profile_rules": "Evaluates every active rule over all rows and measures time, rows evaluated, rows matched and rows won for each rule and condition.",
+        "rules_profile_title": "⏱️ Rule profile (slowest first)",
+        "btn_download_profile": "⬇️ Export profile (Excel)",
+        "rule_profile_cap": "⏱️ {ms:,.1f} ms · evaluates {evaluated:,} rows · matches {matched:,} · wins {won:,}",
+        "rule_profile_cond": "{cond}: {ms:,.1f} ms · {evaluated:,} → {matched:,} rows",
+        "rule_profile_skipped": "⏭️ Not evaluated: no row can match it.",
+        "rule_profile_indexed": "🗂️ Resolved by the rule index in normal evaluation (lower cost).",
         "rule_val_lbl": "Value",
         "rule_ph_contains": "e.g. 'Services' (Partial search)",
         "rule_ph_starts": "e.g. 'INV-' (Must start with)",
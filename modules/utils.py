@@ -13,10 +13,24 @@ incluyendo:
 import streamlit as st
 import pandas as pd
 import io
+import json
 import numpy as np 
 from modules.translator import get_text
+from modules.loader import (
+    read_excel_sources, clean_invoice_frame, StreamingLoad, INGEST_ALL_SHEETS, STREAM_MIN_BYTES
+)
+from modules.schema import concat_frames
+from modules.cache_service import content_hash, load_cached_frame, store_cached_frame
+from modules.merge_service import (
+    deduplicate_frame, merge_into, DEFAULT_MERGE_KEYS, MERGE_POLICY_KEEP_LATEST, MERGE_REPORT_KEYS
+)
+from modules.data_store import DataStore
 # --- CAMBIO: Importamos el motor de reglas para usarlo en la carga inicial ---
-from modules.rules_service import get_default_rules, apply_priority_rules 
+from modules.rules_service import (
+    get_default_rules, apply_priority_rules, apply_priority_rules_to_rows, RuleMaskCache,
+    RuleMatchIndex, build_match_index, rules_fingerprint, resolve_as_of, profile_rules, compile_rules
+)
+from modules.audit_service import log_general_change
 
 # --- 1. Inicializar el 'Session State' ---
 def initialize_session_state():
@@ -42,12 +56,36 @@ def initialize_session_state():
     if 'current_lang_hash' not in st.session_state:
         st.session_state.current_lang_hash = None 
     
-    if 'df_pristine' not in st.session_state:
-        st.session_state.df_pristine = None 
-    if 'df_original' not in st.session_state:
-        st.session_state.df_original = None 
+    # Una sola copia de trabajo (staging) + registro de cambios desde el último commit
     if 'df_staging' not in st.session_state:
         st.session_state.df_staging = None 
+    if 'data_store' not in st.session_state:
+        st.session_state.data_store = None
+    if 'rule_mask_cache' not in st.session_state:
+        st.session_state.rule_mask_cache = RuleMaskCache()
+    if 'rule_match_index' not in st.session_state:
+        st.session_state.rule_match_index = None
+    # Bitmap de coincidencias de las filas visibles (tooltips de prioridad)
+    if 'rule_explain_index' not in st.session_state:
+        st.session_state.rule_explain_index = None
+    # Último perfil de coste de las reglas (se calcula a petición en el editor)
+    if 'rules_profile' not in st.session_state:
+        st.session_state.rules_profile = None
+    # Fecha de referencia de las reglas de fecha relativas (None = hoy)
+    if 'rules_as_of' not in st.session_state:
+        st.session_state.rules_as_of = None
+    if 'streaming_load' not in st.session_state:
+        st.session_state.streaming_load = None
+    
+    # Deduplicación / fusión por clave de negocio entre cargas
+    if 'merge_key_columns' not in st.session_state:
+        st.session_state.merge_key_columns = list(DEFAULT_MERGE_KEYS)
+    if 'merge_policy' not in st.session_state:
+        st.session_state.merge_policy = MERGE_POLICY_KEEP_LATEST
+    if 'merge_update_changed_only' not in st.session_state:
+        st.session_state.merge_update_changed_only = True
+    if 'merge_report' not in st.session_state:
+        st.session_state.merge_report = None
         
     if 'autocomplete_options' not in st.session_state:
         st.session_state.autocomplete_options = {} 
@@ -210,12 +248,13 @@ def to_excel(df: pd.DataFrame) -> bytes:
     return output.getvalue()
 
 # --- 4. FUNCIÓN NUEVA: RECALCULAR ESTADO DE FILA ---
-def recalculate_row_status(df: pd.DataFrame, lang: str) -> pd.DataFrame:
+def recalculate_row_status(df: pd.DataFrame, lang: str, labels=None) -> pd.DataFrame:
     """Recalcula la columna 'Row Status' basada en si la fila tiene celdas vacías.
 
     Args:
         df (pd.DataFrame): El DataFrame a evaluar.
         lang (str): Idioma actual para los textos de estado.
+        labels (optional): Recalcular sólo estas filas (el resto no cambia).
 
     Returns:
         pd.DataFrame: El DataFrame con la columna 'Row Status' actualizada.
@@ -229,150 +268,569 @@ def recalculate_row_status(df: pd.DataFrame, lang: str) -> pd.DataFrame:
     
     if not cols_to_check:
         return df
+
+    rows = None
+    if labels is not None and 'Row Status' in df.columns:
+        rows = df.index.intersection(pd.Index(labels), sort=False)
+        if rows.empty:
+            return df
     
     # Crear copia temporal para validación, tratando NaT/NaN como string vacío
-    df_check = df[cols_to_check].astype(str).replace(['NaT', 'nan', 'None', '<NA>'], '')
+    df_check = (df[cols_to_check] if rows is None else df.loc[rows, cols_to_check])
+    df_check = df_check.astype(str).replace(['NaT', 'nan', 'None', '<NA>'], '')
     
     # Máscara de incompletitud: Vacío ("") o Cero ("0") se consideran incompletos
     blank_mask = (df_check == "") | (df_check == "0")
     incomplete_rows = blank_mask.any(axis=1)
     
     # Asignación vectorizada del estado
-    df['Row Status'] = np.where(
+    status = np.where(
         incomplete_rows,
         get_text(lang, 'status_incomplete'),
         get_text(lang, 'status_complete')
     )
+    if rows is None:
+        df['Row Status'] = status
+    else:
+        df.loc[rows, 'Row Status'] = status
     
     return df
 
+def refresh_dirty_rows(df: pd.DataFrame, lang: str) -> pd.DataFrame:
+    """
+    Reprioriza y recalcula el estado de fila sólo en las filas editadas o
+    insertadas desde el último recálculo (las 'sucias' del DataStore).
+
+    Returns:
+        pd.DataFrame: df actualizado in situ.
+    """
+    store = get_data_store()
+    labels = store.take_dirty() if store is not None else []
+    if not labels:
+        return df
+    df = apply_priority_rules_to_rows(df, labels)
+    return recalculate_row_status(df, lang, labels)
+
 # --- 5. FUNCIÓN DE CARGA Y PROCESAMIENTO DE DATOS ---
+def build_autocomplete_options(df: pd.DataFrame) -> dict:
+    """
+    Genera las listas de autocompletado a partir de los valores del DataFrame.
+
+    Args:
+        df (pd.DataFrame): Datos ya limpios.
+
+    Returns:
+        dict: {columna: [opciones ordenadas]} para las columnas categóricas conocidas.
+    """
+    autocomplete_options = {}
+    columnas_autocompletar_en = [
+        "Vendor Name", "Status", "Assignee", 
+        "Operating Unit Name", "Pay Status", "Document Type",
+        "Currency Code", "Vendor Type", "Payment Method", 
+        "Priority", "Pay Group"
+    ]
+    
+    for col_en in columnas_autocompletar_en:
+        if col_en in df.columns:
+            try:
+                # Valores distintos primero (en columnas categóricas son las categorías)
+                series_cleaned = pd.Series(df[col_en].unique()).astype(str).str.strip().drop_duplicates()
+                
+                # Lógica específica para listas predefinidas + valores encontrados
+                if col_en == "Priority":
+                    base_options = ["", "Zero", "Low", "Medium", "High"]
+                    custom_options = ["Maxima Prioridad", "Baja Prioridad"]
+                    unique_vals = series_cleaned.unique().tolist()
+                    opciones = sorted(list(set(base_options + custom_options + unique_vals)))
+                elif col_en == "Status":
+                    base_status_opts = [
+                        "Imported to ERP", "Requester Approval", "Routed", "Fully Paid",
+                        "Terminated", "AP Rejection", "AP Post Routing", 
+                        "Imported to OIT", "Imported to ERP Failure"
+                    ]
+                    unique_vals = series_cleaned.unique().tolist()
+                    opciones = sorted(list(set(unique_vals + base_status_opts)))
+                else:
+                    # Por defecto: solo valores únicos encontrados
+                    unique_vals = series_cleaned.unique().tolist()
+                    opciones = sorted(unique_vals)
+                
+                # Limpieza de opciones vacías
+                opciones = [o for o in opciones if o.strip() != "" and o.strip() != "nan"]    
+                autocomplete_options[col_en] = opciones
+            except Exception:
+                autocomplete_options[col_en] = [] 
+    
+    return autocomplete_options
+
+def extend_autocomplete_options(options: dict, df_new: pd.DataFrame) -> dict:
+    """
+    Añade a las listas de autocompletado existentes los valores nuevos de un
+    lote de filas, sin recalcular sobre el conjunto completo.
+
+    Args:
+        options (dict): Listas actuales {columna: [opciones]}.
+        df_new (pd.DataFrame): Filas recién añadidas.
+
+    Returns:
+        dict: Listas actualizadas (las columnas sin cambios se conservan).
+    """
+    merged = dict(options)
+    for col_en, new_opts in build_autocomplete_options(df_new).items():
+        current = merged.get(col_en, [])
+        known = set(current)
+        extra = [o for o in new_opts if o not in known]
+        if extra or col_en not in merged:
+            merged[col_en] = sorted(current + extra)
+    return merged
+
+def _source_key(cache_keys: list) -> str:
+    """
+    Huella de una carga: archivos (claves de la caché de ingesta) más la
+    clave y la política de fusión. Misma huella = mismos datos cargados.
+    """
+    return content_hash(json.dumps([
+        cache_keys, st.session_state.merge_key_columns, st.session_state.merge_policy
+    ], default=str).encode("utf-8"), "load")
+
+def _prepare_loaded_frame(df_processed: pd.DataFrame, lang: str, source_key: str = None) -> pd.DataFrame:
+    """Aplica el motor de reglas y el estado de fila a un DataFrame recién cargado."""
+    # --- CORRECCIÓN: Aplicar Motor de Reglas en la carga inicial ---
+    # Esto asegura que Priority_Reason se cree desde el principio y el filtro del sidebar no "parpadee".
+    # Con la huella de la carga, recargar los mismos archivos reutiliza el resultado memorizado.
+    data_version = (source_key, 0) if source_key is not None else None
+    df_processed = apply_priority_rules(df_processed, data_version=data_version)
+    
+    # Cálculo inicial de estado de fila
+    return recalculate_row_status(df_processed, lang)
+
+def _deduplicate_loaded_frame(df_processed: pd.DataFrame) -> pd.DataFrame:
+    """
+    Elimina las facturas repetidas entre los archivos de una carga (según la
+    clave y la política configuradas) y deja el resumen en 'merge_report'.
+    """
+    df_processed, n_dup = deduplicate_frame(
+        df_processed, st.session_state.merge_key_columns, st.session_state.merge_policy
+    )
+    if n_dup:
+        df_processed = df_processed.reset_index(drop=True)
+    st.session_state.merge_report = dict.fromkeys(MERGE_REPORT_KEYS, 0)
+    st.session_state.merge_report.update(inserted=len(df_processed), duplicates_in_load=n_dup)
+    return df_processed
+
+def _store_loaded_frame(df_processed: pd.DataFrame, source_key: str = None):
+    """Inicializa los datos de trabajo, su registro de cambios, el autocompletado y las columnas visibles."""
+    # Trabajo activo (Draft). La versión estable (Commit) no se copia: el
+    # DataStore la reconstruye deshaciendo los cambios registrados.
+    st.session_state.data_store = DataStore(df_processed, source_key=source_key)
+    st.session_state.df_staging = df_processed
+    
+    # Generación de Opciones de Autocompletado
+    st.session_state.autocomplete_options = build_autocomplete_options(df_processed)
+    columnas_iniciales = list(df_processed.columns)
+    
+    # Inicialización de columnas visibles (todas por defecto)
+    st.session_state.columnas_visibles = columnas_iniciales.copy()
+    st.session_state.columnas_visibles_estable = columnas_iniciales.copy()
+
+def get_data_store() -> DataStore:
+    """
+    Devuelve el registro de cambios de df_staging (lo crea si los datos se
+    cargaron por otra vía, p. ej. una configuración JSON).
+    """
+    if st.session_state.get('data_store') is None and st.session_state.df_staging is not None:
+        st.session_state.data_store = DataStore(st.session_state.df_staging)
+    return st.session_state.get('data_store')
+
+def get_rule_mask_cache() -> RuleMaskCache:
+    """
+    Caché de máscaras por regla de la sesión, asociada a la versión actual de
+    df_staging (se vacía sola si los datos han cambiado).
+    """
+    if st.session_state.get('rule_mask_cache') is None:
+        st.session_state.rule_mask_cache = RuleMaskCache()
+    store = get_data_store()
+    df = st.session_state.df_staging
+    return st.session_state.rule_mask_cache.bind(
+        store.data_version if store is not None else None,
+        len(df) if df is not None else 0
+    )
+
+def get_rule_match_index() -> RuleMatchIndex:
+    """
+    Bitmap de coincidencias de las reglas actuales sobre df_staging.
+
+    Se reconstruye sólo si cambian los datos, las reglas o la fecha de
+    referencia, y reutiliza las máscaras cacheadas del editor de reglas.
+
+    Returns:
+        RuleMatchIndex | None: None si no hay datos cargados.
+    """
+    df = st.session_state.df_staging
+    if df is None or 'Priority' not in df.columns:
+        return None
+    mask_cache = get_rule_mask_cache()
+    key = _rules_state_key(mask_cache.data_version)
+    held = st.session_state.get('rule_match_index')
+    if held is None or held[0] != key:
+        held = (key, build_match_index(df, mask_cache=mask_cache))
+        st.session_state.rule_match_index = held
+    return held[1]
+
+def get_rule_explain_index(labels) -> RuleMatchIndex:
+    """
+    Bitmap de coincidencias de las reglas actuales sólo sobre las filas
+    indicadas (las visibles en la tabla, para los tooltips de prioridad).
+
+    Se evalúa sobre df_staging.loc[filas, columnas usadas por las reglas],
+    así que el coste depende de las filas mostradas y no del tamaño de los
+    datos: tras cada guardado (nueva versión de datos) no se reevalúa todo.
+    Se reconstruye sólo si cambian los datos, las reglas, la fecha de
+    referencia o las filas mostradas.
+
+    Returns:
+        RuleMatchIndex | None: None si no hay datos cargados.
+    """
+    df = st.session_state.df_staging
+    if df is None or 'Priority' not in df.columns:
+        return None
+    store = get_data_store()
+    rows = df.index.intersection(pd.Index(labels), sort=False)
+    key = _rules_state_key(store.data_version if store is not None else None) + (tuple(rows),)
+    held = st.session_state.get('rule_explain_index')
+    if held is None or held[0] != key:
+        rules = st.session_state.get('priority_rules') or get_default_rules()
+        columns = [c for c in compile_rules(rules).columns if c in df.columns]
+        held = (key, build_match_index(df.loc[rows, columns], rules))
+        st.session_state.rule_explain_index = held
+    return held[1]
+
+def _rules_state_key(data_version) -> tuple:
+    """Versión de los datos, reglas y fecha de referencia de las que depende un resultado de reglas."""
+    return (
+        data_version,
+        rules_fingerprint(st.session_state.get('priority_rules') or []),
+        resolve_as_of(st.session_state.get('rules_as_of')),
+    )
+
+def get_rules_profile(refresh: bool = False) -> pd.DataFrame:
+    """
+    Perfil de coste de las reglas actuales sobre df_staging (ver
+    rules_engine.profile_rules).
+
+    Es costoso (evalúa cada regla sobre todas las filas, sin cachés), así
+    que sólo se calcula a petición (refresh=True); el último perfil se
+    conserva mientras no cambien los datos, las reglas ni la fecha de
+    referencia.
+
+    Returns:
+        pd.DataFrame | None: None si no hay datos o perfil vigente.
+    """
+    df = st.session_state.df_staging
+    if df is None:
+        return None
+    store = get_data_store()
+    key = _rules_state_key(store.data_version if store is not None else None)
+    held = st.session_state.get('rules_profile')
+    if refresh:
+        held = (key, profile_rules(df))
+        st.session_state.rules_profile = held
+    if held is None or held[0] != key:
+        return None
+    return held[1]
+
+def _lookup_cached_sources(sources: list) -> tuple:
+    """
+    Busca en la caché de ingesta cada archivo (nombre, bytes).
+
+    Returns:
+        tuple: (claves de caché, lista de DataFrames o None, posiciones sin caché).
+    """
+    cache_variant = "all_sheets" if INGEST_ALL_SHEETS else ""
+    cache_keys = [content_hash(content, cache_variant) for _, content in sources]
+    frames = [load_cached_frame(key) for key in cache_keys]
+    missing = [i for i, df in enumerate(frames) if df is None]
+    return cache_keys, frames, missing
+
+def _read_missing_sources(sources: list, cache_keys: list, frames: list, missing: list, lang: str):
+    """
+    Lee y limpia los archivos que no estaban en caché (con barra de progreso)
+    y los guarda en ella. Completa 'frames' in situ.
+    """
+    if not missing:
+        return
+    progress = st.progress(0.0, text=get_text(lang, 'loading_files_progress').format(done=0, total=len(missing), name=""))
+    
+    def _on_file_read(name, done, total):
+        progress.progress(done / total, text=get_text(lang, 'loading_files_progress').format(done=done, total=total, name=name))
+    
+    raw_frames = read_excel_sources([sources[i] for i in missing], on_progress=_on_file_read)
+    progress.empty()
+    
+    for i, df_raw in zip(missing, raw_frames):
+        df_clean = clean_invoice_frame(df_raw)
+        store_cached_frame(cache_keys[i], df_clean)
+        frames[i] = df_clean
+
 def load_and_process_files(uploaded_files, lang):
     """
     Toma los archivos cargados, los combina, limpia (usando vectorización), 
-    guarda las 3 copias (pristine, original, staging) y pre-calcula las 
-    opciones de autocompletar.
+    crea la copia de trabajo con su registro de cambios (DataStore) y
+    pre-calcula las opciones de autocompletar.
+    
+    Las facturas repetidas entre archivos (misma clave de negocio) se
+    eliminan según la política de fusión configurada.
+    
+    Si falta por leer un único archivo grande (>= STREAM_MIN_BYTES), se lee en
+    streaming: el primer bloque se publica como vista previa en df_staging y el
+    resto se procesa en segundo plano (ver finalize_streaming_load).
     
     Args:
         uploaded_files: Un archivo o lista de archivos (UploadedFile).
         lang (str): Idioma actual.
     """
     try:
-        lista_de_dataframes = []
         # Normalizar entrada a lista
         files_to_process = uploaded_files if isinstance(uploaded_files, list) else [uploaded_files]
+        sources = [(file.name, file.getvalue()) for file in files_to_process]
         
-        for file in files_to_process:
-            with st.spinner(f"Cargando {file.name}..."):
-                # Lectura directa
-                df = pd.read_excel(file, engine="openpyxl", header=0)
-            lista_de_dataframes.append(df)
+        # 1. Caché de ingesta: los archivos ya vistos (mismo contenido) se cargan
+        # desde Parquet sin volver a parsear el Excel.
+        cache_keys, lista_de_dataframes, missing = _lookup_cached_sources(sources)
         
-        with st.spinner("Combinando y limpiando archivos (vectorizado)..."):
-            # Concatenación de todos los Excels
-            df_processed = pd.concat(lista_de_dataframes, ignore_index=True)
+        # 2a. Un único archivo grande pendiente: lectura en streaming con vista previa
+        if len(missing) == 1 and not INGEST_ALL_SHEETS and len(sources[missing[0]][1]) >= STREAM_MIN_BYTES:
+            pos = missing[0]
+            name, content = sources[pos]
+            with st.spinner(f"Cargando {name}..."):
+                job = StreamingLoad(name, content).start()
+                job.first_chunk_ready.wait()
+            if job.error is not None:
+                raise job.error
             
-            # Limpieza de nombres de columna
-            df_processed.columns = [col.strip() for col in df_processed.columns]
-            columnas_originales = list(df_processed.columns)
+            frames_preview = [df for df in lista_de_dataframes if df is not None] + [job.preview()]
+            df_preview = clean_invoice_frame(concat_frames(frames_preview))
+            df_preview = _prepare_loaded_frame(_deduplicate_loaded_frame(df_preview), lang)
             
-            # Detección automática de tipos de columna basada en nombre
-            numeric_cols = [col for col in columnas_originales if 
-                            ('Total' in col or 'Amount' in col or 'Age' in col or 'Number' in col or 'ID' in col) 
-                            and 'Assignee' not in col]
+            # Sólo el borrador: el registro de cambios se crea al terminar la carga
+            st.session_state.df_staging = df_preview
+            st.session_state.autocomplete_options = build_autocomplete_options(df_preview)
+            st.session_state.columnas_visibles = list(df_preview.columns)
+            st.session_state.columnas_visibles_estable = list(df_preview.columns)
+            st.session_state.streaming_load = {
+                "job": job,
+                "frames": lista_de_dataframes,
+                "position": pos,
+                "cache_key": cache_keys[pos],
+                "source_key": _source_key(cache_keys),
+            }
+            return
+        
+        # 2b. Lectura del resto (paralela si hay varios archivos/hojas; serial si es uno pequeño)
+        _read_missing_sources(sources, cache_keys, lista_de_dataframes, missing, lang)
+        
+        with st.spinner("Combinando y limpiando archivos (vectorizado)..."):
+            # Concatenación de todos los Excels. La limpieza es idempotente: aquí
+            # sólo rellena columnas que faltaban en alguno de los archivos.
+            df_processed = clean_invoice_frame(concat_frames(lista_de_dataframes))
+            source_key = _source_key(cache_keys)
+            df_processed = _prepare_loaded_frame(_deduplicate_loaded_frame(df_processed), lang, source_key)
+            _store_loaded_frame(df_processed, source_key)
+
+    except Exception as e:
+        st.error(get_text(lang, 'error_critical').format(e=e))
+        st.warning(get_text(lang, 'error_corrupt'))
+        st.session_state.df_staging = None
+
+def finalize_streaming_load(lang) -> bool:
+    """
+    Completa una carga en streaming cuando el hilo lector ha terminado.
+
+    Une todos los bloques, guarda el resultado en la caché de ingesta y
+    sustituye la vista previa por el conjunto completo.
+
+    Args:
+        lang (str): Idioma actual.
+
+    Returns:
+        bool: True si la carga terminó (con éxito o error) y el estado cambió.
+    """
+    info = st.session_state.get('streaming_load')
+    if not info or not info["job"].done:
+        return False
+    
+    job = info["job"]
+    st.session_state.streaming_load = None
+    try:
+        if job.error is not None:
+            raise job.error
+        df_file = job.result()
+        store_cached_frame(info["cache_key"], df_file)
+        
+        frames = list(info.pop("frames"))
+        frames[info["position"]] = df_file
+        if len(frames) == 1:
+            # Un solo archivo: los bloques ya están limpios, sin otra copia completa
+            df_processed = df_file
+        else:
+            df_processed = clean_invoice_frame(concat_frames(frames))
+        del frames, df_file
+        df_processed = _prepare_loaded_frame(_deduplicate_loaded_frame(df_processed), lang, info["source_key"])
+        _store_loaded_frame(df_processed, info["source_key"])
+        
+        # Forzar refresco del editor (la vista previa tenía otras filas)
+        st.session_state.editor_state = None
+        st.session_state.current_data_hash = None
+    except Exception as e:
+        st.error(get_text(lang, 'error_critical').format(e=e))
+        st.warning(get_text(lang, 'error_corrupt'))
+        st.session_state.df_staging = None
+    return True
+
+def _next_row_labels(index: pd.Index, n: int) -> pd.Index:
+    """Genera 'n' etiquetas de fila consecutivas tras la mayor existente (mismo tipo de índice)."""
+    numeric = pd.to_numeric(pd.Series(index), errors='coerce')
+    start = int(numeric.max()) + 1 if numeric.notna().any() else 0
+    labels = pd.RangeIndex(start, start + n)
+    if pd.api.types.is_numeric_dtype(index.dtype):
+        return pd.Index(labels)
+    return pd.Index(labels.astype(str))
+
+def _align_new_rows(df_base: pd.DataFrame, df_new: pd.DataFrame) -> tuple:
+    """
+    Alinea las columnas de un lote nuevo con las del conjunto existente.
+
+    Las columnas que falten en cualquiera de los dos lados se crean vacías
+    (según su tipo en el esquema). Sólo se toca el conjunto existente si el
+    lote trae columnas nuevas.
+
+    Returns:
+        tuple: (df_base alineado, df_new alineado con las columnas de df_base primero).
+    """
+    extra_cols = [c for c in df_new.columns if c not in df_base.columns]
+    if extra_cols:
+        df_base = clean_invoice_frame(df_base.reindex(columns=list(df_base.columns) + extra_cols))
+    df_new = clean_invoice_frame(df_new.reindex(columns=df_base.columns))
+    return df_base, df_new
+
+def _refresh_merged_rows(df: pd.DataFrame, row_index: pd.Index, lang: str):
+    """Recalcula reglas y estado de fila (in situ) sólo en las filas actualizadas por una fusión."""
+    if len(row_index) == 0:
+        return
+    df_rows = _prepare_loaded_frame(df.loc[row_index].copy(), lang)
+    for col in ['Priority', 'Priority_Reason', 'Row Status']:
+        if col in df_rows.columns:
+            if col not in df.columns:
+                df[col] = ""
+            df.loc[row_index, col] = df_rows[col]
+
+def append_files(uploaded_files, lang):
+    """
+    Añade archivos nuevos a una sesión ya cargada (carga incremental).
+
+    Las filas se fusionan por la clave de negocio configurada (merge_service):
+    las facturas ya existentes se actualizan o se ignoran según la política
+    ('keep_latest' / 'keep_first') y sólo las realmente nuevas se añaden.
+    El motor de reglas y el estado de fila se calculan únicamente sobre las
+    filas insertadas o actualizadas, y las opciones de autocompletado se
+    amplían con sus valores. Los cambios de origen pasan también a la versión
+    estable del DataStore. Las ediciones pendientes se conservan siempre: el
+    origen se compara con el valor confirmado de cada celda y, si trae otro
+    valor para una celda editada, la fila se cuenta como conflicto (sin
+    sobrescribir la edición). El resumen queda en 'merge_report'.
+
+    Args:
+        uploaded_files: Un archivo o lista de archivos (UploadedFile).
+        lang (str): Idioma actual.
+
+    Returns:
+        int: Número de filas añadidas o actualizadas (0 si hubo error o no había cambios).
+    """
+    if st.session_state.df_staging is None:
+        return 0
+    try:
+        files_to_process = uploaded_files if isinstance(uploaded_files, list) else [uploaded_files]
+        sources = [(file.name, file.getvalue()) for file in files_to_process]
+        if not sources:
+            return 0
+        
+        cache_keys, frames, missing = _lookup_cached_sources(sources)
+        _read_missing_sources(sources, cache_keys, frames, missing, lang)
+        
+        with st.spinner("Añadiendo filas nuevas..."):
+            df_new = clean_invoice_frame(concat_frames(frames))
+            if df_new.empty:
+                return 0
             
-            date_cols = [col for col in columnas_originales if 'Date' in col and col not in numeric_cols]
-            string_cols = [col for col in columnas_originales if col not in numeric_cols and col not in date_cols]
-
-            # Conversión de tipos Vectorizada (Más rápida que bucles)
-            if string_cols:
-                df_processed[string_cols] = df_processed[string_cols].fillna("").astype(str)
-            if numeric_cols:
-                df_processed[numeric_cols] = df_processed[numeric_cols].apply(pd.to_numeric, errors='coerce').fillna(0)
-            if date_cols:
-                df_processed[date_cols] = df_processed[date_cols].apply(pd.to_datetime, errors='coerce')
-
-            # Limpieza adicional para columnas de fecha que fallaron conversión
-            df_check = df_processed.astype(str).replace('NaT', '').replace('nan', '')
-            if date_cols:
-                for col in date_cols: df_processed[col] = df_check[col]
-
-            # --- CORRECCIÓN: Aplicar Motor de Reglas en la carga inicial ---
-            # Esto asegura que Priority_Reason se cree desde el principio y el filtro del sidebar no "parpadee"
-            df_processed = apply_priority_rules(df_processed)
+            key_columns = st.session_state.merge_key_columns
+            policy = st.session_state.merge_policy
+            changed_only = st.session_state.merge_update_changed_only
             
-            # 5. Cálculo inicial de estado de fila
-            df_processed = recalculate_row_status(df_processed, lang)
-
-            # 6. Inicialización de los 3 estados de datos
-            st.session_state.df_pristine = df_processed.copy() # Intocable (Backup carga)
-            st.session_state.df_original = df_processed.copy() # Punto de control (Commit)
-            st.session_state.df_staging = df_processed.copy()  # Trabajo activo (Draft)
+            # 1. Fusión con el borrador (staging): actualiza coincidencias y separa las filas nuevas
+            #    (comparando con los valores confirmados, sin pisar ediciones pendientes)
+            store = st.session_state.data_store
+            pending = store.pending_edits() if store is not None else None
+            df_staging, _ = _align_new_rows(st.session_state.df_staging, df_new)
+            report = merge_into(df_staging, df_new, key_columns, policy, changed_only, pending)
+            _refresh_merged_rows(df_staging, report["updated_index"], lang)
             
-            # 7. Generación de Opciones de Autocompletado
-            autocomplete_options = {}
-            columnas_autocompletar_en = [
-                "Vendor Name", "Status", "Assignee", 
-                "Operating Unit Name", "Pay Status", "Document Type",
-                "Currency Code", "Vendor Type", "Payment Method", 
-                "Priority", "Pay Group"
-            ]
+            # 2. Procesar SOLO las filas insertadas
+            _, df_inserted = _align_new_rows(df_staging, report["inserted_rows"])
+            df_inserted = _prepare_loaded_frame(df_inserted, lang)
+            df_inserted.index = _next_row_labels(df_staging.index, len(df_inserted))
+            st.session_state.df_staging = concat_frames([df_staging, df_inserted], ignore_index=False)
             
-            for col_en in columnas_autocompletar_en:
-                if col_en in df_processed.columns:
-                    try:
-                        series_cleaned = df_processed[col_en].astype(str).str.strip()
-                        
-                        # Lógica específica para listas predefinidas + valores encontrados
-                        if col_en == "Priority":
-                            base_options = ["", "Zero", "Low", "Medium", "High"]
-                            custom_options = ["Maxima Prioridad", "Baja Prioridad"]
-                            unique_vals = series_cleaned.unique().tolist()
-                            opciones = sorted(list(set(base_options + custom_options + unique_vals)))
-                        elif col_en == "Status":
-                            base_status_opts = [
-                                "Imported to ERP", "Requester Approval", "Routed", "Fully Paid",
-                                "Terminated", "AP Rejection", "AP Post Routing", 
-                                "Imported to OIT", "Imported to ERP Failure"
-                            ]
-                            unique_vals = series_cleaned.unique().tolist()
-                            opciones = sorted(list(set(unique_vals + base_status_opts)))
-                        else:
-                            # Por defecto: solo valores únicos encontrados
-                            unique_vals = series_cleaned.unique().tolist()
-                            opciones = sorted(unique_vals)
-                        
-                        # Limpieza de opciones vacías
-                        opciones = [o for o in opciones if o.strip() != "" and o.strip() != "nan"]    
-                        autocomplete_options[col_en] = opciones
-                    except Exception:
-                        autocomplete_options[col_en] = [] 
+            # 3. Los datos de origen forman parte de la versión estable
+            if store is not None:
+                if policy == MERGE_POLICY_KEEP_LATEST:
+                    store.absorb_source_updates(
+                        st.session_state.df_staging, report["written_cells"], report["updated_index"]
+                    )
+                store.absorb_source_rows(df_inserted)
             
-            st.session_state.autocomplete_options = autocomplete_options
-            columnas_iniciales = list(df_processed.columns)
+            # Autocompletado incremental y columnas nuevas visibles
+            st.session_state.autocomplete_options = extend_autocomplete_options(
+                st.session_state.autocomplete_options, df_new
+            )
+            for key in ['columnas_visibles', 'columnas_visibles_estable']:
+                if st.session_state.get(key) is not None:
+                    st.session_state[key] = st.session_state[key] + [
+                        c for c in df_new.columns if c not in st.session_state[key]
+                    ]
             
-            # Inicialización de columnas visibles (todas por defecto)
-            st.session_state.columnas_visibles = columnas_iniciales.copy()
-            st.session_state.columnas_visibles_estable = columnas_iniciales.copy()
-
+            # Forzar refresco del editor
+            st.session_state.editor_state = None
+            st.session_state.current_data_hash = None
+        
+        st.session_state.merge_report = {k: report[k] for k in MERGE_REPORT_KEYS}
+        log_general_change(
+            "Carga", "Append Files",
+            f"{report['inserted']} filas añadidas y {report['updated']} actualizadas desde {len(sources)} archivo(s)"
+        )
+        return report["inserted"] + report["updated"]
+    
     except Exception as e:
         st.error(get_text(lang, 'error_critical').format(e=e))
         st.warning(get_text(lang, 'error_corrupt'))
-        st.session_state.df_staging = None
+        return 0
 
 # --- 6. LIMPIEZA DE ESTADO ---
 def clear_state_and_prepare_reload():
     """
     Resetea el estado de la sesión al cargar nuevos archivos.
-    Limpia las tres copias del DataFrame y configuraciones de vista.
+    Limpia los datos (y su registro de cambios) y configuraciones de vista.
     """
+    # Detener una carga en streaming que siga en curso
+    if st.session_state.get('streaming_load'):
+        st.session_state.streaming_load["job"].cancel()
+    st.session_state.streaming_load = None
+    
     st.session_state.filtros_activos = []
     st.session_state.columnas_visibles = None
     st.session_state.columnas_visibles_estable = None
     st.session_state.editor_state = None 
     st.session_state.current_data_hash = None
     st.session_state.current_lang_hash = None
-    st.session_state.df_pristine = None
-    st.session_state.df_original = None
+    st.session_state.data_store = None
     st.session_state.df_staging = None
     st.session_state.autocomplete_options = {}
\ No newline at end of file
@@ -0,0 +1,79 @@
+# tests/test_merge_service.py
+"""Fusión por clave de negocio (merge_service) junto al registro de cambios (DataStore)."""
+
+import pandas as pd
+
+from modules.data_store import DataStore
+from modules.merge_service import (
+    merge_into, deduplicate_frame, MERGE_POLICY_KEEP_LATEST, MERGE_POLICY_KEEP_FIRST
+)
+
+KEYS = ["Invoice #"]
+
+
+def _source():
+    return pd.DataFrame({
+        "Invoice #": ["A1", "A2"],
+        "Status": pd.Series(["open", "open"], dtype="category"),
+        "Total": [100.0, 200.0],
+    })
+
+
+def test_reappend_unchanged_file_keeps_pending_edit():
+    df = _source()
+    store = DataStore(df)
+    store.write_cells(df, "Status", ["0"], "paid")
+
+    report = merge_into(df, _source(), KEYS, MERGE_POLICY_KEEP_LATEST, pending=store.pending_edits())
+    store.absorb_source_updates(df, report["written_cells"], report["updated_index"])
+
+    assert (report["updated"], report["unchanged"], report["conflicts"]) == (0, 2, 0)
+    assert df.loc["0", "Status"] == "paid"
+    df = store.revert(df)
+    assert df.loc["0", "Status"] == "open"
+
+
+def test_source_change_on_edited_cell_is_a_conflict():
+    df = _source()
+    store = DataStore(df)
+    store.write_cells(df, "Status", ["0"], "paid")
+    incoming = pd.DataFrame({"Invoice #": ["A1"], "Status": ["void"], "Total": [150.0]})
+
+    report = merge_into(df, incoming, KEYS, MERGE_POLICY_KEEP_LATEST, pending=store.pending_edits())
+    store.absorb_source_updates(df, report["written_cells"], report["updated_index"])
+
+    assert (report["updated"], report["conflicts"]) == (1, 1)
+    assert df.loc["0", "Status"] == "paid"
+    assert df.loc["0", "Total"] == 150.0
+    # El total de origen pasa a la versión estable; la edición sigue pendiente
+    df = store.revert(df)
+    assert (df.loc["0", "Status"], df.loc["0", "Total"]) == ("open", 150.0)
+
+
+def test_keep_first_reports_differences_as_skipped():
+    df = _source()
+    incoming = _source()
+    incoming.loc[1, "Total"] = 999.0
+
+    report = merge_into(df, incoming, KEYS, MERGE_POLICY_KEEP_FIRST)
+
+    assert (report["updated"], report["unchanged"], report["skipped"]) == (0, 1, 1)
+    assert df.loc[1, "Total"] == 200.0
+
+
+def test_categorical_keys_are_stripped_like_text_keys():
+    base = pd.DataFrame({"Invoice #": pd.Series(["ACME "], dtype="category"), "Total": [1.0]})
+    incoming = pd.DataFrame({"Invoice #": ["ACME"], "Total": [2.0]})
+
+    report = merge_into(base, incoming, KEYS)
+
+    assert (report["inserted"], report["updated"]) == (0, 1)
+
+
+def test_deduplicate_compares_key_values():
+    df = pd.DataFrame({"Invoice #": ["A1", " A1", "B2", ""], "Total": [1.0, 2.0, 3.0, 4.0]})
+
+    out, n_dup = deduplicate_frame(df, KEYS)
+
+    assert n_dup == 1
+    assert out["Total"].tolist() == [2.0, 3.0, 4.0]